@@ -0,0 +1,161 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""CIDR prefix trie Class."""
+
+import ipaddress
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def parse_cidr(cidr):
+    """Parse a cidr block (host bits are ignored).
+
+    returns the (version, network address as int, prefix length) of the
+    block, or None if it is not a valid ipv4 / ipv6 cidr block.
+    parsed blocks are cached, so each distinct block is parsed once.
+    """
+    try:
+        network = ipaddress.ip_network(cidr, strict=False)
+    except (TypeError, ValueError):
+        return None
+
+    return network.version, int(network.network_address), network.prefixlen
+
+
+class CidrTrie():
+    """CIDR prefix trie Class.
+
+    Binary radix trie of ipv4 and ipv6 cidr prefixes. a lookup walks
+    the bits of a block once (at most 32 / 128 steps) whatever the
+    number of prefixes, to find the prefixes containing the block.
+    values can be attached to the prefixes, to find the values of the
+    prefixes containing (or contained by) a block.
+    nodes are [zero_child, one_child, values] lists, 'values' being
+    None if the node is not a prefix.
+    """
+
+    BITS = {4: 32, 6: 128}
+
+    def __init__(self, cidrs=()):
+        """Initialize the trie with cidr blocks."""
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.count = 0
+        for cidr in cidrs:
+            self.add(cidr)
+
+    def __len__(self):
+        """Get the number of prefixes in the trie."""
+        return self.count
+
+    def add(self, cidr, value=None):
+        """Add a cidr prefix (and a value attached to it) to the trie.
+
+        returns False if 'cidr' is not a valid cidr block.
+        """
+        parsed = parse_cidr(cidr)
+        if not parsed:
+            return False
+
+        version, address, prefixlen = parsed
+        bits = self.BITS[version]
+        node = self.roots[version]
+        for index in range(prefixlen):
+            bit = (address >> (bits - 1 - index)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+
+        if node[2] is None:
+            node[2] = []
+            self.count += 1
+        node[2].append(value)
+
+        return True
+
+    def walk(self, cidr):
+        """Iterate over the nodes on the path of a cidr block.
+
+        yields the nodes of the prefixes containing the block (from the
+        shortest one) and then the node of the block itself, if any.
+        """
+        parsed = parse_cidr(cidr)
+        if not parsed:
+            return
+
+        version, address, prefixlen = parsed
+        bits = self.BITS[version]
+        node = self.roots[version]
+        for index in range(prefixlen):
+            yield node
+            node = node[(address >> (bits - 1 - index)) & 1]
+            if node is None:
+                return
+
+        yield node
+
+    def contains(self, cidr):
+        """Determine if a prefix of the trie contains the cidr block.
+
+        a block is contained by a prefix if it is the same block or
+        one of its subnets (0.0.0.0/0 contains all ipv4 blocks).
+        """
+        return any(node[2] is not None for node in self.walk(cidr))
+
+    def __contains__(self, cidr):
+        """Determine if a prefix of the trie contains the cidr block."""
+        return self.contains(cidr)
+
+    def get_containing(self, cidr):
+        """Get the values of the prefixes containing the cidr block."""
+        return [value for node in self.walk(cidr) if node[2]
+                for value in node[2]]
+
+    def find_node(self, cidr):
+        """Get the node of a cidr block (None if it is not in the trie)."""
+        parsed = parse_cidr(cidr)
+        if not parsed:
+            return None
+
+        version, address, prefixlen = parsed
+        bits = self.BITS[version]
+        node = self.roots[version]
+        for index in range(prefixlen):
+            node = node[(address >> (bits - 1 - index)) & 1]
+            if node is None:
+                return None
+
+        return node
+
+    def get_contained(self, cidr, strict=False):
+        """Get the values of the prefixes contained by the cidr block.
+
+        if 'strict' is set, the values of the block itself are left out.
+        """
+        node = self.find_node(cidr)
+        if node is None:
+            return []
+
+        values = []
+        stack = [node[0], node[1]] if strict else [node]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if node[2]:
+                values.extend(node[2])
+            stack.extend((node[0], node[1]))
+
+        return values
+
+    def get_overlapping(self, cidr):
+        """Get the values of the prefixes overlapping the cidr block.
+
+        two blocks overlap if one of them contains the other.
+        """
+        return self.get_containing(cidr) + \
+            self.get_contained(cidr, strict=True)
+
+
+if __name__ == '__main__':
+    pass
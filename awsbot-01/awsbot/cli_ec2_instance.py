@@ -60,15 +60,24 @@ def list_instances(session, instances, project_name,
               help='start all ec2 instances for all projects')
 @click.option('--project-name', default=None,
               help='start all instances for project tag:Project:<name>')
+@click.option('--wait', is_flag=True,
+              help='wait for the instances to be running')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=5,
+              help='seconds between instance state checks (with --wait)')
+@click.option('--timeout', type=click.IntRange(min=1), default=600,
+              help='seconds each instance is given to be running '
+                   '(with --wait)')
 @cli_context
-def start_instances(session, instances, force, project_name):
+def start_instances(session, instances, force, project_name,
+                    wait, poll_interval, timeout):
     """Start EC2 instances."""
     if not force and project_name is None:
         print('Please Specify Project Name associated with Instances')
         return
 
     _, err = EC2InstanceManager(session.get_ec2_session()).\
-        start_instances(instances, project_name)
+        start_instances(instances, project_name, wait=wait,
+                        poll_interval=poll_interval, timeout=timeout)
 
     print()
     print(err)
@@ -82,15 +91,24 @@ def start_instances(session, instances, force, project_name):
               help='stop all ec2 instances for all projects')
 @click.option('--project-name', default=None,
               help='stop all instances for project tag:Project:<name>')
+@click.option('--wait', is_flag=True,
+              help='wait for the instances to be stopped')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=5,
+              help='seconds between instance state checks (with --wait)')
+@click.option('--timeout', type=click.IntRange(min=1), default=600,
+              help='seconds each instance is given to be stopped '
+                   '(with --wait)')
 @cli_context
-def stop_instances(session, instances, force, project_name):
+def stop_instances(session, instances, force, project_name,
+                   wait, poll_interval, timeout):
     """Stop EC2 instances."""
     if not force and project_name is None:
         print('Please Specify Project Name associated with Instances')
         return
 
     _, err = EC2InstanceManager(session.get_ec2_session()).\
-        stop_instances(instances, project_name)
+        stop_instances(instances, project_name, wait=wait,
+                       poll_interval=poll_interval, timeout=timeout)
 
     print()
     print(err)
@@ -104,15 +122,28 @@ def stop_instances(session, instances, force, project_name):
               help='reboot all ec2 instances for all projects')
 @click.option('--project-name', default=None,
               help='reboot all instances for project tag:Project:<name>')
+@click.option('--max-in-flight', type=click.IntRange(min=1), default=None,
+              help='maximum number of instances being stopped at a time '
+                   '(default all)')
+@click.option('--rolling', type=click.IntRange(min=1), default=None,
+              help='rolling reboot, at most this many instances are '
+                   'down at a time')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=5,
+              help='seconds between instance state checks')
+@click.option('--timeout', type=click.IntRange(min=1), default=600,
+              help='seconds each instance is given to stop (or start)')
 @cli_context
-def reboot_instances(session, instances, force, project_name):
+def reboot_instances(session, instances, force, project_name,
+                     max_in_flight, rolling, poll_interval, timeout):
     """Reboot EC2 instances."""
     if not force and project_name is None:
         print('Please Specify Project Name associated with Instances')
         return
 
     _, err = EC2InstanceManager(session.get_ec2_session()).\
-        reboot_instances(instances, project_name)
+        reboot_instances(instances, project_name,
+                         max_in_flight=max_in_flight, rolling=rolling,
+                         poll_interval=poll_interval, timeout=timeout)
 
     print()
     print(err)
@@ -131,21 +162,44 @@ def reboot_instances(session, instances, force, project_name):
               help='vpc to launch instance into')
 @click.option('--user-data', is_flag=True,
               help='use the specified script to initialize instance')
-@click.option('--user-data-file',
-              default='resources/templates/script/www_script.sh',
-              help='script to run after launching instance')
+@click.option('--user-data-file', default=None,
+              help='script to run after launching instance (default: ' +
+              'resources/templates/script/www_script.sh, or ' +
+              'www_fleet_script.sh for a fleet)')
 @click.option('--project-name', default=None,
               help='create all instances with tag:Project:<name>')
 @click.option('--instance-name', default=None,
               help='name of the instance')
 @click.option('--iam-instance-profile-arn', default=None,
               help='iam instance profile arn')
+@click.option('--count', type=click.IntRange(min=1), default=None,
+              help='(fleet) number of instances to create')
+@click.option('--name-pattern', default=None,
+              help='(fleet) instance name pattern, {index} and {project} '
+                   'are replaced, e.g. web-{index:03d}')
+@click.option('--instance-names', default=None,
+              help='(fleet) names of the instances to create '
+                   '(separated by commas)')
+@click.option('--subnet-ids', default=None,
+              help='(fleet) subnets to spread the instances over '
+                   '(separated by commas)')
+@click.option('--wait', is_flag=True, default=False,
+              help='(fleet) wait for the instances to be running')
+@click.option('--parallelism', type=click.IntRange(min=1), default=4,
+              help='(fleet) number of concurrent launch requests')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=5,
+              help='seconds between instance state checks (with --wait)')
+@click.option('--timeout', type=click.IntRange(min=1), default=600,
+              help='seconds each instance is given to be running '
+                   '(with --wait)')
 @cli_context
 def create_instances(session, image_name, instance_type,
                      security_groups, key_name, min_count,
                      max_count, subnet_id, user_data,
                      user_data_file, project_name, instance_name,
-                     iam_instance_profile_arn):
+                     iam_instance_profile_arn, count, name_pattern,
+                     instance_names, subnet_ids, wait, parallelism,
+                     poll_interval, timeout):
     """Create one or more EC2 instances.
 
     image-name - name of the image.
@@ -153,13 +207,28 @@ def create_instances(session, image_name, instance_type,
     key-name - a valid key-name to login to the ec2 isntances.
     Note : image-names are the same across regions bu the
            images ids differ from region to region.
+
+    the (fleet) options launch a fleet of named instances: each
+    instance is named from --instance-names or --name-pattern. its user
+    data can read its name from the instance metadata tags at boot
+    (see www_fleet_script.sh).
     """
-    _, status = EC2InstanceManager(session.get_ec2_session()).\
-        create_instances(image_name, instance_type, security_groups,
-                         key_name, min_count, max_count, subnet_id,
-                         user_data, user_data_file,
-                         project_name, instance_name,
-                         iam_instance_profile_arn)
+    if count or name_pattern or instance_names or subnet_ids:
+        _, status = EC2InstanceManager(session.get_ec2_session()).\
+            create_fleet(image_name, instance_type, security_groups,
+                         key_name, count, name_pattern, instance_names,
+                         subnet_ids or subnet_id, user_data,
+                         user_data_file, project_name,
+                         iam_instance_profile_arn, wait=wait,
+                         parallelism=parallelism,
+                         poll_interval=poll_interval, timeout=timeout)
+    else:
+        _, status = EC2InstanceManager(session.get_ec2_session()).\
+            create_instances(image_name, instance_type, security_groups,
+                             key_name, min_count, max_count, subnet_id,
+                             user_data, user_data_file,
+                             project_name, instance_name,
+                             iam_instance_profile_arn)
 
     print()
     print(status)
@@ -205,19 +274,28 @@ def terminate_instances(session, instances, project_name):
               help='iam instance profile arn to attach')
 @click.option('--attach-iam-role/--detach-iam-role', default=None,
               help='attach new iam role or detach the existing iam role')
+@click.option('--parallelism', type=click.IntRange(min=1), default=4,
+              help='number of instances modified concurrently')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=5,
+              help='seconds between instance state checks')
+@click.option('--timeout', type=click.IntRange(min=1), default=600,
+              help='seconds each instance is given to stop (or start) '
+                   'when its user data changes')
 @cli_context
 def modify_instances(session, instances, security_groups,
                      enable_source_dest_check, user_data,
                      user_data_file, project_name,
                      instance_names, iam_instance_profile_arn,
-                     attach_iam_role):
+                     attach_iam_role, parallelism, poll_interval, timeout):
     """Modify EC2 instances."""
     _, err = EC2InstanceManager(session.get_ec2_session()).\
         modify_instances(instances, security_groups,
                          enable_source_dest_check,
                          user_data, user_data_file,
                          project_name, instance_names,
-                         iam_instance_profile_arn, attach_iam_role)
+                         iam_instance_profile_arn, attach_iam_role,
+                         parallelism=parallelism,
+                         poll_interval=poll_interval, timeout=timeout)
 
     print()
     print(err)
@@ -50,6 +50,48 @@ def list_security_groups(session, groups, long):
         print(err)
 
 
+@cli_ec2_security_group.command('analyze')
+@click.option('--groups', default=None,
+              help='analyze the selected (comma separated) groups. ' +
+              'can be group ids or group names of a mix of both')
+@click.option('--vpc-id', default=None,
+              help='analyze the groups of this vpc only')
+@cli_context
+def analyze_security_groups(session, groups, vpc_id):
+    """Analyze Security group rules.
+
+    Finds redundant, shadowed (by an open cidr), overlapping and
+    duplicate rules, and cidr blocks that can be aggregated.
+    """
+    _, status = EC2SecurityGroupManager(session.get_ec2_session()).\
+        analyze_security_groups(groups, vpc_id)
+
+    print()
+    print(status)
+
+
+@cli_ec2_security_group.command('apply')
+@click.argument('desired-state-file')
+@click.option('--dry-run', is_flag=True,
+              help='print the planned rule changes only')
+@click.option('--parallelism', type=click.IntRange(min=1), default=4,
+              help='number of groups synced concurrently')
+@cli_context
+def apply_security_groups(session, desired_state_file, dry_run,
+                          parallelism):
+    """Apply a desired state file to Security groups.
+
+    The rules of the groups listed in the (yaml or json) file are
+    synced with the file : missing rules are added and rules not in
+    the file are removed. Yaml files need PyYAML.
+    """
+    _, status = EC2SecurityGroupManager(session.get_ec2_session()).\
+        apply_security_groups(desired_state_file, dry_run, parallelism)
+
+    print()
+    print(status)
+
+
 @cli_ec2_security_group.command('create')
 @click.argument('group-names')
 @click.argument('vpc-ids')
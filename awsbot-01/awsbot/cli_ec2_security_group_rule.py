@@ -68,13 +68,15 @@ def cli_ec2_security_group_rule(session=None):
 @click.option('--icmp-code', default='any',
               help='applicable if protocol is icmp or icmpv6. ' +
               'specify the icmp code to allow')
+@click.option('--parallelism', type=click.IntRange(min=1), default=4,
+              help='number of groups updated concurrently')
 @cli_context
 def create_rule(session, groups, egress_rule,
                 ip_protocol, port_range,
                 ipv4_cidr, ipv4_descriptions,
                 ipv6_cidr, ipv6_descriptions,
                 security_groups, security_group_descriptions,
-                icmp_type, icmp_code):
+                icmp_type, icmp_code, parallelism):
     """Create Security Group Rules."""
     aok, from_port, to_port = util.str_range_to_int(port_range)
 
@@ -89,7 +91,7 @@ def create_rule(session, groups, egress_rule,
                     to_port, ipv4_cidr, ipv4_descriptions,
                     ipv6_cidr, ipv6_descriptions,
                     security_groups, security_group_descriptions,
-                    icmp_type, icmp_code)
+                    icmp_type, icmp_code, parallelism=parallelism)
 
     print()
     print(status)
@@ -106,11 +108,23 @@ def create_rule(session, groups, egress_rule,
 @click.option('--port-range', default='ignore',
               help='port ranges(or a single port) to allow. ' +
               'Port ranges specified as <fromPort>-<toPort>.' +
-              'Use "any" to specify all ports')
+              'Use "any" to specify all ports. A port range matches ' +
+              'the rules whose port range contains it, e.g. 443 ' +
+              'matches 400-500 (see --exact-port)')
+@click.option('--exact-port', is_flag=True, default=False,
+              help='only match the rules whose port range is equal to ' +
+              '--port-range')
 @click.option('--ipv4-cidr', default='ignore',
-              help='ipv4 address(comma separated cidr blocks) to allow')
+              help='ipv4 address(comma separated cidr blocks) to match. ' +
+              'A block matches the rule blocks it contains, e.g. ' +
+              '10.0.0.0/8 matches 10.1.0.0/16 (see --exact-cidr)')
 @click.option('--ipv6-cidr', default='ignore',
-              help='ipv4 address(comma separated cidr blocks) to allow')
+              help='ipv6 address(comma separated cidr blocks) to match. ' +
+              'A block matches the rule blocks it contains, e.g. ' +
+              '2001:db8::/32 matches 2001:db8:1::/48 (see --exact-cidr)')
+@click.option('--exact-cidr', is_flag=True, default=False,
+              help='only match the rule cidr blocks equal to the ' +
+              '--ipv4-cidr / --ipv6-cidr blocks')
 @click.option('--security-groups', default='ignore',
               help='security-groups(comma separated) to allow. ' +
               'If this is defined, then ip (v4/v6) cidr blocks ' +
@@ -124,8 +138,8 @@ def create_rule(session, groups, egress_rule,
               'specify the icmp code to allow')
 @cli_context
 def delete_rule(session, groups, egress_rule,
-                ip_protocol, port_range,
-                ipv4_cidr, ipv6_cidr,
+                ip_protocol, port_range, exact_port,
+                ipv4_cidr, ipv6_cidr, exact_cidr,
                 security_groups, icmp_type, icmp_code):
     """Delete Security Group Rules.
 
@@ -152,7 +166,7 @@ def delete_rule(session, groups, egress_rule,
                     ip_protocol, from_port,
                     to_port, ipv4_cidr,
                     ipv6_cidr, security_groups,
-                    icmp_type, icmp_code)
+                    icmp_type, icmp_code, exact_cidr, exact_port)
 
     print()
     print(status)
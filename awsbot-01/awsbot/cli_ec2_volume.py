@@ -41,11 +41,15 @@ def cli_ec2_volume(session=None):
 @click.option('--project-name', default=None,
               help='list volumes for all instances '
                    'for project tag:Project:<name>')
+@click.option('--unattached', is_flag=True,
+              help='also list the volumes that are not attached to an '
+                   'instance (tagged with tag:Project:<name> '
+                   'if --project-name is set)')
 @cli_context
-def list_volumes(session, instances, project_name):
+def list_volumes(session, instances, project_name, unattached):
     """List volumes associated with all instances."""
     aok, err = EC2VolumeManager(session.get_ec2_session()).\
-        list_volumes(instances, project_name)
+        list_volumes(instances, project_name, unattached=unattached)
 
     if not aok:
         print(err)
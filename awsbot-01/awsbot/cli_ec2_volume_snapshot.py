@@ -57,11 +57,68 @@ def list_volume_snapshots(session, instances, project_name, list_all):
 @click.option('--age', default=None, type=int,
               help='age value (in days) to determine if '
                    'volume snapshot can be created')
+@click.option('--stop/--no-stop', default=True,
+              help='stop running instances while their volumes are '
+                   'snapshotted (default: --stop)')
+@click.option('--crash-consistent', default=False, is_flag=True,
+              help='snapshot all volumes of an instance at the same '
+                   'point in time, without stopping it')
+@click.option('--parallelism', default=4, type=click.IntRange(min=1),
+              help='number of instances snapshotted concurrently '
+                   '(default: 4)')
 @cli_context
-def create_volume_snapshots(session, instances, project_name, age):
+def create_volume_snapshots(session, instances, project_name, age,
+                            stop, crash_consistent, parallelism):
     """Create volume snapshots associated with selected instances."""
     aok, err = EC2SnapshotManager(session.get_ec2_session()).\
-        create_volume_snapshots(instances, project_name, age)
+        create_volume_snapshots(instances, project_name, age,
+                                stop=stop,
+                                crash_consistent=crash_consistent,
+                                parallelism=parallelism)
+
+    if not aok:
+        print(err)
+
+
+@cli_ec2_volume_snapshot.command('prune')
+@click.option('--instances', default=None,
+              help='prune volume snapshots for the selected '
+                   'instances (instance-ids separated by commas)')
+@click.option('--project-name', default=None,
+              help='prune volume snapshots for all instances '
+                   'for project tag:Project:<name>')
+@click.option('--all-snapshots', default=False, is_flag=True,
+              help='prune all the snapshots owned by this account, '
+                   'not only those of the instances volumes')
+@click.option('--keep-last', default=None, type=click.IntRange(min=0),
+              help='keep the newest <n> snapshots of each volume')
+@click.option('--daily', default=None, type=click.IntRange(min=0),
+              help='keep the newest snapshot of each day, for the '
+                   '<n> newest days with snapshots')
+@click.option('--weekly', default=None, type=click.IntRange(min=0),
+              help='keep the newest snapshot of each week, for the '
+                   '<n> newest weeks with snapshots')
+@click.option('--monthly', default=None, type=click.IntRange(min=0),
+              help='keep the newest snapshot of each month, for the '
+                   '<n> newest months with snapshots')
+@click.option('--max-age', default=None, type=click.IntRange(min=0),
+              help='(days) do not keep snapshots older than that, '
+                   'except the --keep-last ones (needs a keep rule)')
+@click.option('--dry-run', default=False, is_flag=True,
+              help='report the snapshots to delete, without deleting')
+@click.option('--parallelism', default=4, type=click.IntRange(min=1),
+              help='number of concurrent deletions (default: 4)')
+@click.option('--rate', default=None, type=click.FloatRange(min=0),
+              help='max number of deletions a second (default: no limit)')
+@cli_context
+def prune_volume_snapshots(session, instances, project_name, all_snapshots,
+                           keep_last, daily, weekly, monthly, max_age, dry_run,
+                           parallelism, rate):
+    """Delete volume snapshots expired by retention rules."""
+    aok, err = EC2SnapshotManager(session.get_ec2_session()).\
+        prune_volume_snapshots(instances, project_name, all_snapshots,
+                               keep_last, daily, weekly, monthly, max_age,
+                               dry_run, parallelism, rate)
 
     if not aok:
         print(err)
@@ -0,0 +1,72 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Lazily loaded click command group."""
+
+import importlib
+
+import click
+
+
+class LazyGroup(click.Group):
+    """Click group whose subcommands are imported on first use.
+
+    'lazy_commands' maps a subcommand name to a tuple of
+    (module name, command name, init function name, short help).
+    the module is imported (and its init function called) only when
+    the subcommand is invoked. the short help is used to list the
+    subcommands without importing them.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        """Initialize the lazy group class."""
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    @staticmethod
+    def import_cli_module(module_name):
+        """Import a cli module (part of the awsbot package if possible)."""
+        if __package__:
+            return importlib.import_module(f'{__package__}.{module_name}')
+
+        return importlib.import_module(module_name)
+
+    def list_commands(self, ctx):
+        """List the loaded and the lazy subcommands."""
+        return sorted(set(super().list_commands(ctx)) |
+                      set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        """Get a subcommand, importing it if required."""
+        if cmd_name not in self.commands and \
+                cmd_name in self.lazy_commands:
+            module_name, command_name, init_name, _ = \
+                self.lazy_commands[cmd_name]
+            module = self.import_cli_module(module_name)
+            if init_name:
+                getattr(module, init_name)()
+            self.add_command(getattr(module, command_name), cmd_name)
+
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """Write the subcommand list without importing lazy subcommands."""
+        names = self.list_commands(ctx)
+        if not names:
+            return
+
+        limit = formatter.width - 6 - max(len(name) for name in names)
+        rows = []
+        for name in names:
+            command = self.commands.get(name)
+            if command is None:
+                rows.append((name, self.lazy_commands[name][3]))
+            elif not command.hidden:
+                rows.append((name, command.get_short_help_str(limit)))
+
+        with formatter.section('Commands'):
+            formatter.write_dl(rows)
+
+
+if __name__ == '__main__':
+    pass
@@ -8,78 +8,98 @@ import click
 try:
     from awsbot.s3_region import S3RegionConfig
     from awsbot.cli_context import cli_context
-    from awsbot.cli_s3 import cli_s3
-    from awsbot.cli_s3 import cli_s3_init
-    from awsbot.cli_r53 import cli_r53
-    from awsbot.cli_r53 import cli_r53_init
-    from awsbot.cli_acm import cli_acm
-    from awsbot.cli_acm import cli_acm_init
-    from awsbot.cli_cf import cli_cf
-    from awsbot.cli_cf import cli_cf_init
-    from awsbot.cli_ec2 import cli_ec2
-    from awsbot.cli_ec2 import cli_ec2_init
-    from awsbot.cli_cw import cli_cw
-    from awsbot.cli_cw import cli_cw_init
+    from awsbot.session import SessionManager
+    from awsbot.cli_lazy_group import LazyGroup
 except ImportError:
     from s3_region import S3RegionConfig
     from cli_context import cli_context
-    from cli_s3 import cli_s3
-    from cli_s3 import cli_s3_init
-    from cli_r53 import cli_r53
-    from cli_r53 import cli_r53_init
-    from cli_acm import cli_acm
-    from cli_acm import cli_acm_init
-    from cli_cf import cli_cf
-    from cli_cf import cli_cf_init
-    from cli_ec2 import cli_ec2
-    from cli_ec2 import cli_ec2_init
-    from cli_cw import cli_cw
-    from cli_cw import cli_cw_init
+    from session import SessionManager
+    from cli_lazy_group import LazyGroup
 
 
 def cli_init():
     """Initialize cli.
 
-    Configure click package
+    Configure click package. The subcommand modules are imported
+    lazily (see LazyGroup) when a subcommand is invoked.
     """
-    cli_acm_init()
-    cli.add_command(cli_acm)
-
-    cli_cf_init()
-    cli.add_command(cli_cf)
-
-    cli_ec2_init()
-    cli.add_command(cli_ec2)
-
-    cli_r53_init()
-    cli.add_command(cli_r53)
-
-    cli_s3_init()
-    cli.add_command(cli_s3)
-
-    cli_cw_init()
-    cli.add_command(cli_cw)
-
-
-@click.group()
+    pass
+
+
+@click.group(cls=LazyGroup, lazy_commands={
+    'acm': ('cli_acm', 'cli_acm', 'cli_acm_init',
+            '- AWS ACM Automation Commands.'),
+    'cf': ('cli_cf', 'cli_cf', 'cli_cf_init',
+           '- AWS Cloud Front Automation Commands.'),
+    'ec2': ('cli_ec2', 'cli_ec2', 'cli_ec2_init',
+            '- AWS EC2 Automation Commands.'),
+    'r53': ('cli_r53', 'cli_r53', 'cli_r53_init',
+            '- AWS Route 53 Automation Commands.'),
+    's3': ('cli_s3', 'cli_s3', 'cli_s3_init',
+           '- AWS S3 Automation Commands.'),
+    'cw': ('cli_cw', 'cli_cw', 'cli_cw_init',
+           '- AWS Cloudwatch Automation Commands.')})
 @click.option('--profile', default='python_automation',
               help='profile name to use while creating a boto3 session')
 @click.option('--region', default=None,
               help='overide the region name in the aws profile')
 @click.option('--s3-config', default='resources/config/s3_region.csv',
               help='s3 region config csv file to use')
+@click.option('--max-pool-connections', default=None,
+              type=click.IntRange(min=1),
+              help='maximum number of connections kept in each '
+                   'aws client connection pool')
+@click.option('--retry-mode', default=None,
+              type=click.Choice(['legacy', 'standard', 'adaptive']),
+              help='retry mode used by the aws clients')
+@click.option('--max-attempts', default=None, type=click.IntRange(min=1),
+              help='maximum number of attempts (including the first '
+                   'request) made by the aws clients')
+@click.option('--connect-timeout', default=None,
+              type=click.FloatRange(min=0),
+              help='aws client connect timeout in seconds')
+@click.option('--read-timeout', default=None, type=click.FloatRange(min=0),
+              help='aws client read timeout in seconds')
+@click.option('--botocore-config', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help='json file with the connection pool, retry and '
+                   'timeout options (defaults to '
+                   '~/.awsbot/<profile>.json if it exists)')
+@click.option('--cache-ttl', default=0, type=click.IntRange(min=0),
+              help='keep lookups that rarely change (e.g. ec2 image '
+                   'names) in a disk cache under ~/.awsbot/cache for '
+                   'this many seconds (default 0, no disk cache)')
 @cli_context
-def cli(session=None, profile=None, region=None, s3_config=None):
+def cli(session=None, profile=None, region=None, s3_config=None,
+        max_pool_connections=None, retry_mode=None, max_attempts=None,
+        connect_timeout=None, read_timeout=None, botocore_config=None,
+        cache_ttl=None):
     """Awsbot cli - AWS Automation Tool CLI."""
     region_config = None
 
+    options, err = SessionManager.\
+        load_botocore_options(profile, botocore_config)
+    if err:
+        raise click.UsageError(err)
+
+    cli_options = {'max_pool_connections': max_pool_connections,
+                   'retry_mode': retry_mode,
+                   'max_attempts': max_attempts,
+                   'connect_timeout': connect_timeout,
+                   'read_timeout': read_timeout}
+    options.update({name: value for name, value in cli_options.items()
+                    if value is not None})
+
     try:
         region_config = S3RegionConfig(s3_config)
     except FileNotFoundError as file_err:
         print('WARNING : Cannot load s3 endpoints' +
               f'from file {s3_config} : {str(file_err)}')
 
-    session.init(profile, region, region_config)
+    session.init(profile, region, region_config,
+                 botocore_config=SessionManager.
+                 create_botocore_config(**options),
+                 cache_ttl=cache_ttl)
 
 
 if __name__ == '__main__':
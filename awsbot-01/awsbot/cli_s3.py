@@ -86,19 +86,52 @@ def s3_bucket_setup(session, name, policy_file, index_file,
 
 
 @cli_s3.command('sync-bucket')
-@click.argument('path', default=None, type=click.Path(exists=True))
+@click.argument('path', default=None,
+                type=click.Path(exists=True, file_okay=False, readable=True))
 @click.argument('name', default=None)
 @click.option('--validate', default=False, is_flag=True,
               help='validates html file syntax before syncing with s3 bucket')
+@click.option('--concurrency', default=8, type=click.IntRange(min=1),
+              help='number of files to upload in parallel')
+@click.option('--manifest/--no-manifest', default=True,
+              help='cache local file digests in a manifest so that '
+                   'unchanged files are not re-hashed')
+@click.option('--manifest-file', default=None, type=click.Path(),
+              help='manifest file to use (defaults to a file per bucket '
+                   'and path in ~/.awsbot/cache/s3-sync-manifests)')
+@click.option('--include', multiple=True,
+              help='only sync files whose relative path matches this '
+                   'glob pattern (can be repeated)')
+@click.option('--exclude', multiple=True,
+              help='do not sync files or directories whose relative '
+                   'path matches this glob pattern (can be repeated)')
+@click.option('--symlinks', default='follow',
+              type=click.Choice(['follow', 'files', 'skip']),
+              help='follow all symbolic links, only links to files '
+                   'or skip symbolic links')
+@click.option('--delete', default=False, is_flag=True,
+              help='delete objects from the bucket that no longer '
+                   'exist in the file system')
+@click.option('--dry-run', default=False, is_flag=True,
+              help='list the objects that would be uploaded or '
+                   'deleted without changing the bucket')
+@click.option('--prefix', default=None,
+              help='sync to (and only list) the keys under this '
+                   'folder of the bucket')
 @cli_context
-def s3_bucket_sync(session, path, name, validate):
+def s3_bucket_sync(session, path, name, validate, concurrency,
+                   manifest, manifest_file, include, exclude, symlinks,
+                   delete, dry_run, prefix):
     """Sync filesystem to s3 bucket.
 
     sync files found in fs specified by 'fs_pathname' to bucket
     specified by 'bucket_name'.  optionally validate files (html only)
     """
     url, err = S3BucketManager(session.get_s3_session()).\
-        sync_fs_to_bucket(path, name, validate)
+        sync_fs_to_bucket(path, name, validate, concurrency,
+                          manifest, manifest_file,
+                          include, exclude, symlinks,
+                          delete, dry_run, prefix)
 
     if err:
         print(f'Cannot sync file system with bucket : {name} : {err}')
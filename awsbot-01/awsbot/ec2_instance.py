@@ -7,15 +7,24 @@ from botocore.exceptions import ClientError
 
 try:
     from awsbot.ec2_security_group import EC2SecurityGroupManager
+    from awsbot.ec2_instance_scheduler import EC2InstanceScheduler
+    from awsbot.ec2_instance_modifier import EC2InstanceModifier
+    from awsbot.ec2_instance_fleet import EC2InstanceFleet
     from awsbot import util
 except ImportError:
     from ec2_security_group import EC2SecurityGroupManager
+    from ec2_instance_scheduler import EC2InstanceScheduler
+    from ec2_instance_modifier import EC2InstanceModifier
+    from ec2_instance_fleet import EC2InstanceFleet
     import util
 
 
 class EC2InstanceManager():
     """EC2 instance Manager Class."""
 
+    USER_DATA_FILE = 'resources/templates/script/www_script.sh'
+    FLEET_USER_DATA_FILE = 'resources/templates/script/www_fleet_script.sh'
+
     def __init__(self, ec2_session):
         """Initialize EC2 instance Manager Class."""
         self.ec2_session = ec2_session
@@ -38,6 +47,7 @@ class EC2InstanceManager():
                                   whose state doesnot match
                                   any state in the states
                                   variable.
+        pfunc is called with an EC2InstanceRecord per instance.
         """
         def default_print(inst):
             print()
@@ -91,145 +101,126 @@ class EC2InstanceManager():
             pfunc = default_print
 
         try:
-            for inst in self.ec2_session.\
-                    get_instances(instance_ids, project_name,
-                                  states, include_states):
-                pfunc(inst)
+            for instances in self.ec2_session.\
+                    get_instance_record_pages(instance_ids, project_name,
+                                              states, include_states):
+                if pfunc is default_print:
+                    # resolve the image names of a page in batched calls.
+                    self.ec2_session.\
+                        get_image_names(inst.image_id for inst in instances)
+
+                for inst in instances:
+                    pfunc(inst)
 
             return True, None
         except ClientError as client_err:
             return False, str(client_err)
 
     def start_instances(self, instance_ids=None,
-                        project_name=None, sfunc=None):
-        """Start EC2 instances."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
+                        project_name=None, sfunc=None,
+                        wait=False, poll_interval=5, timeout=600):
+        """Start EC2 instances.
 
-        success_count = 0
-        failure_count = 0
-        try:
-            for inst in self.ec2_session.\
-                    get_instances(instance_ids, project_name,
-                                  states='terminated', include_states=False):
-                aok, err = self.ec2_session.start_instance(inst, False, sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
-
-            return self.ec2_session.get_status(success_count, failure_count)
-        except ClientError as client_err:
-            return False, str(client_err)
+        if 'wait' is set, wait (polling every 'poll_interval' seconds)
+        for the instances to be running.
+        """
+        return self.change_instance_states('start', instance_ids,
+                                           project_name, sfunc, wait,
+                                           poll_interval, timeout)
 
     def stop_instances(self, instance_ids=None,
-                       project_name=None, sfunc=None):
-        """Stop EC2 instances."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
+                       project_name=None, sfunc=None,
+                       wait=False, poll_interval=5, timeout=600):
+        """Stop EC2 instances.
 
-        success_count = 0
-        failure_count = 0
+        if 'wait' is set, wait (polling every 'poll_interval' seconds)
+        for the instances to be stopped.
+        """
+        return self.change_instance_states('stop', instance_ids,
+                                           project_name, sfunc, wait,
+                                           poll_interval, timeout)
+
+    def get_instance_ids(self, instance_ids=None, project_name=None):
+        """Get the ids of the selected (not terminated) EC2 instances."""
+        return [inst.id for inst in self.ec2_session.
+                get_instance_records(instance_ids, project_name,
+                                     states='terminated',
+                                     include_states=False)]
+
+    def change_instance_states(self, action, instance_ids=None,
+                               project_name=None, sfunc=None,
+                               wait=False, poll_interval=5, timeout=600):
+        """Start, stop or terminate the selected EC2 instances.
+
+        the instances are changed in batches, see
+        EC2SessionManager.change_instance_states.
+        """
         try:
-            for inst in self.ec2_session.\
-                    get_instances(instance_ids, project_name,
-                                  states='terminated', include_states=False):
-                aok, err = self.ec2_session.stop_instance(inst, False, sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
-
-            return self.ec2_session.get_status(success_count, failure_count)
+            instance_ids = self.get_instance_ids(instance_ids, project_name)
+
+            changed, failed = \
+                EC2InstanceScheduler(self.ec2_session, poll_interval,
+                                     timeout).\
+                change_instance_states(action, instance_ids, wait, sfunc)
         except ClientError as client_err:
             return False, str(client_err)
 
-    def reboot_instances(self, instance_ids=None,
-                         project_name=None, sfunc=None):
-        """Reboot EC2 Instances."""
-
-        def default_status(status_str):
-            print(status_str)
+        return self.ec2_session.get_status(len(changed), len(failed))
 
-        if not sfunc:
-            sfunc = default_status
-
-        success_count = 0
-        failure_count = 0
+    def reboot_instances(self, instance_ids=None,
+                         project_name=None, sfunc=None,
+                         max_in_flight=None, rolling=None,
+                         poll_interval=5, timeout=600):
+        """Reboot EC2 Instances.
+
+        all the instances are stopped at once (or up to
+        'max_in_flight' at a time) and polled every 'poll_interval'
+        seconds. each instance is started as soon as it is stopped.
+        in rolling mode at most 'rolling' instances are down at a time.
+        see EC2InstanceScheduler.reboot_instances.
+        """
         try:
-            for inst in self.ec2_session.\
-                    get_instances(instance_ids, project_name,
-                                  states='terminated', include_states=False):
-                aok, err = self.ec2_session.stop_instance(inst, True, sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
-
-                aok, err = self.ec2_session.start_instance(inst, False, sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
+            instance_ids = self.get_instance_ids(instance_ids, project_name)
+
+            rebooted, failed = \
+                EC2InstanceScheduler(self.ec2_session, poll_interval,
+                                     timeout).\
+                reboot_instances(instance_ids, max_in_flight, rolling, sfunc)
         except ClientError as client_err:
             return False, str(client_err)
 
-        return self.ec2_session.get_status(success_count, failure_count)
+        return self.ec2_session.get_status(len(rebooted), len(failed))
 
-    def create_instances(self, image_name, instance_type, security_groups,
-                         key_name, min_count=1, max_count=1, subnet_id=None,
-                         user_data=False, user_data_file=None,
-                         project_name=None, instance_name=None,
-                         iam_instance_profile_arn=None,
-                         base64_encode=False):
-        """Create EC2 Instances."""
+    def get_launch_params(self, image_name, instance_type, security_groups,
+                          key_name, project_name=None,
+                          iam_instance_profile_arn=None):
+        """Get the 'RunInstances' parameters shared by new instances.
+
+        returns (params_dict, err)
+        """
         if not key_name:
-            return False, 'Require key_name'
+            return None, 'Require key_name'
 
         if not instance_type:
-            return False, 'Require instance_type'
-
-        if not min_count:
-            return False, 'Require min_count'
-
-        if not max_count:
-            return False, 'Require max_count'
+            return None, 'Require instance_type'
 
         security_groups, err =\
             EC2SecurityGroupManager(self.ec2_session).\
             validate_and_get_security_groups(security_groups)
         if err:
-            return False, err
+            return None, err
         security_groups = [group['GroupId'] for group in security_groups]
 
         image_id = self.ec2_session.\
             get_image_id_from_name(image_name)
 
         if not image_id:
-            return False, f'Invalid Image Name : {image_name}'
-
-        if instance_name:
-            min_count = 1
-            max_count = 1
+            return None, f'Invalid Image Name : {image_name}'
 
         param_dict = {
             'ImageId': image_id,
             'InstanceType': instance_type,
             'KeyName': key_name,
-            'MinCount': min_count,
-            'MaxCount': max_count,
             'SecurityGroupIds': security_groups
         }
 
@@ -246,6 +237,39 @@ class EC2InstanceManager():
             ]
             param_dict['TagSpecifications'] = tag_spec
 
+        if iam_instance_profile_arn:
+            param_dict['IamInstanceProfile'] = \
+                {'Arn': iam_instance_profile_arn}
+
+        return param_dict, None
+
+    def create_instances(self, image_name, instance_type, security_groups,
+                         key_name, min_count=1, max_count=1, subnet_id=None,
+                         user_data=False, user_data_file=None,
+                         project_name=None, instance_name=None,
+                         iam_instance_profile_arn=None,
+                         base64_encode=False):
+        """Create EC2 Instances."""
+        if not min_count:
+            return False, 'Require min_count'
+
+        if not max_count:
+            return False, 'Require max_count'
+
+        param_dict, err = self.get_launch_params(image_name, instance_type,
+                                                 security_groups, key_name,
+                                                 project_name,
+                                                 iam_instance_profile_arn)
+        if err:
+            return False, err
+
+        if instance_name:
+            min_count = 1
+            max_count = 1
+
+        param_dict['MinCount'] = min_count
+        param_dict['MaxCount'] = max_count
+
         if instance_name:
             instance_name_tag_dict = \
                 {'Key': 'Name', 'Value': instance_name}
@@ -268,11 +292,12 @@ class EC2InstanceManager():
 
         if user_data:
             user_data_file, err = self.\
-                get_user_data_as_string(user_data_file)
-            user_data_file = self.update_user_data(user_data_file,
-                                                   instance_name)
+                get_user_data_as_string(user_data_file or
+                                        self.USER_DATA_FILE)
             if err:
                 return False, err
+            user_data_file = self.update_user_data(user_data_file,
+                                                   instance_name)
 
             if base64_encode:
                 user_data_file = \
@@ -280,10 +305,6 @@ class EC2InstanceManager():
 
             param_dict['UserData'] = user_data_file
 
-        if iam_instance_profile_arn:
-            param_dict['IamInstanceProfile'] = \
-                {'Arn': iam_instance_profile_arn}
-
         try:
             instances = self.ec2_session.get_ec2_resource().\
                 create_instances(**param_dict)
@@ -293,33 +314,64 @@ class EC2InstanceManager():
         except ClientError as client_error:
             return False, str(client_error)
 
-    def terminate_instances(self, instances=None,
-                            project_name=None, sfunc=None):
-        """Delete EC2 Instances."""
+    def create_fleet(self, image_name, instance_type, security_groups,
+                     key_name, count=None, name_pattern=None,
+                     instance_names=None, subnet_ids=None,
+                     user_data=False, user_data_file=None,
+                     project_name=None, iam_instance_profile_arn=None,
+                     base64_encode=False, wait=False, parallelism=4,
+                     poll_interval=5, timeout=600, sfunc=None):
+        """Create a fleet of named EC2 Instances.
+
+        the instances are named from 'instance_names' or from
+        'name_pattern' (e.g. 'web-{index:03d}') and spread over
+        'subnet_ids', see EC2InstanceFleet. the instances are launched
+        with their metadata tags enabled, so that the user data
+        (FLEET_USER_DATA_FILE by default) can read their name at boot.
+        """
+        names, err = EC2InstanceFleet.get_instance_names(count, name_pattern,
+                                                         instance_names,
+                                                         project_name)
+        if err:
+            return False, err
 
-        def default_status(status_str):
-            print(status_str)
+        if subnet_ids:
+            subnet_ids, err = util.convert_to_list(subnet_ids,
+                                                   remove_duplicates=True)
+            if not subnet_ids:
+                return False, err
 
-        if not sfunc:
-            sfunc = default_status
+        user_data_template = None
+        if user_data:
+            user_data_template, err = self.\
+                get_user_data_as_string(user_data_file or
+                                        self.FLEET_USER_DATA_FILE)
+            if err:
+                return False, err
 
-        success_count = 0
-        failure_count = 0
-        try:
-            for inst in self.ec2_session.\
-                    get_instances(instances, project_name,
-                                  states='terminated', include_states=False):
-                aok, err = \
-                    self.ec2_session.terminate_instance(inst, False, sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
-
-            return self.ec2_session.get_status(success_count, failure_count)
-        except ClientError as client_err:
-            return False, str(client_err)
+        param_dict, err = self.get_launch_params(image_name, instance_type,
+                                                 security_groups, key_name,
+                                                 project_name,
+                                                 iam_instance_profile_arn)
+        if err:
+            return False, err
+        param_dict['MetadataOptions'] = {'InstanceMetadataTags': 'enabled'}
+
+        instance_ids, failed_count = \
+            EC2InstanceFleet(self.ec2_session, parallelism,
+                             poll_interval, timeout).\
+            launch(param_dict, names, subnet_ids, user_data_template,
+                   base64_encode, wait, sfunc)
+
+        aok, status = self.ec2_session.get_status(len(instance_ids),
+                                                  failed_count)
+        return aok, f'{status} : InstanceIds : {instance_ids}'
+
+    def terminate_instances(self, instances=None,
+                            project_name=None, sfunc=None):
+        """Delete EC2 Instances."""
+        return self.change_instance_states('terminate', instances,
+                                           project_name, sfunc)
 
     def modify_instances(self, instances, security_groups,
                          source_dest_check_flag,
@@ -327,8 +379,12 @@ class EC2InstanceManager():
                          project_name=None, instance_names=None,
                          iam_instance_profile_arn=None,
                          attach_iam_role=None,
-                         sfunc=None):
-        """Modify EC2 Instances."""
+                         sfunc=None, parallelism=4,
+                         poll_interval=5, timeout=600):
+        """Modify EC2 Instances.
+
+        the instances are modified in bulk, see EC2InstanceModifier.
+        """
         modify_flag = False
         if security_groups:
             modify_flag = True
@@ -337,7 +393,7 @@ class EC2InstanceManager():
                 validate_and_get_security_groups(security_groups)
 
             if err:
-                return err
+                return False, err
 
             security_groups = [group['GroupId'] for group in security_groups]
 
@@ -361,53 +417,42 @@ class EC2InstanceManager():
         if attach_iam_role is not None:
             modify_flag = True
 
+        if source_dest_check_flag is not None:
+            modify_flag = True
+
         if not modify_flag:
             return False, 'Nothing to modify'
 
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        success_count = 0
-        failure_count = 0
-        index = 0
-        user_data_file_template = user_data_file
         try:
-            for inst in self.ec2_session.\
-                    get_instances(instances, project_name,
-                                  states='terminated', include_states=False):
+            records = list(self.ec2_session.
+                           get_instance_records(instances, project_name,
+                                                states='terminated',
+                                                include_states=False))
+
+            names = {}
+            for index, inst in enumerate(records):
                 instance_name = None \
                     if not instance_names or index >= len(instance_names) \
                     else instance_names[index]
-                if not instance_name:
-                    tags = self.ec2_session.get_instance_tags(inst)
-                    instance_name = tags.get('Name')
-                if user_data:
-                    user_data_file = \
-                        self.update_user_data(user_data_file_template,
-                                              instance_name)
-                else:
-                    user_data_file = None
-
-                aok, err = self.\
-                    ec2_session.modify_instance(inst, security_groups,
-                                                source_dest_check_flag,
-                                                user_data_file, instance_name,
-                                                iam_instance_profile_arn,
-                                                attach_iam_role,
-                                                base64_encode=False,
-                                                sfunc=sfunc)
-                if not aok:
-                    sfunc(err)
-                    failure_count += 1
-                else:
-                    success_count += 1
-
-                index += 1
-
-            return self.ec2_session.get_status(success_count, failure_count)
+                names[inst.id] = instance_name or \
+                    self.ec2_session.get_instance_tags(inst).get('Name')
+
+            user_data_dict = None
+            if user_data:
+                user_data_dict = {
+                    instance_id: self.update_user_data(user_data_file, name)
+                    for instance_id, name in names.items()}
+
+            modified, failed = \
+                EC2InstanceModifier(self.ec2_session, parallelism,
+                                    poll_interval, timeout).\
+                modify_instances(records, security_groups,
+                                 source_dest_check_flag,
+                                 names if instance_names else None,
+                                 user_data_dict, iam_instance_profile_arn,
+                                 attach_iam_role, sfunc)
+
+            return self.ec2_session.get_status(len(modified), len(failed))
         except ClientError as client_err:
             return False, str(client_err)
 
@@ -0,0 +1,254 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance fleet launch Class."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+try:
+    from awsbot.ec2_instance_scheduler import EC2InstanceScheduler
+    from awsbot import util
+except ImportError:
+    from ec2_instance_scheduler import EC2InstanceScheduler
+    import util
+
+
+class EC2InstanceFleet():
+    """EC2 instance fleet launch Class.
+
+    Launches many named instances at once. the instances are spread
+    over the subnets (round robin) and launched with one 'RunInstances'
+    call per subnet, the calls being issued concurrently. instances
+    that were not named at launch get their 'Name' tag afterwards, user
+    data scripts read it at boot from the instance metadata tags.
+    """
+
+    def __init__(self, ec2_session, parallelism=4,
+                 poll_interval=5, timeout=600):
+        """Initialize EC2 instance fleet launch Class."""
+        self.ec2_session = ec2_session
+        self.parallelism = max(1, parallelism)
+        self.scheduler = EC2InstanceScheduler(ec2_session,
+                                              poll_interval, timeout)
+
+    @staticmethod
+    def get_instance_names(count=None, name_pattern=None,
+                           instance_names=None, project_name=None):
+        """Get the names of the fleet instances.
+
+        names are either listed ('instance_names') or generated from a
+        str.format 'name_pattern' with the 'index' (1 based) and the
+        'project' of each instance, e.g. 'web-{index:03d}'.
+        returns (names, err), a name is None if instances are unnamed.
+        """
+        if instance_names:
+            names, err = util.convert_to_list(instance_names)
+            if not names:
+                return None, err
+            if count and count != len(names):
+                return None, f'Got {len(names)} instance names ' + \
+                    f'for {count} instances'
+            return names, None
+
+        if not count:
+            return None, 'Require count or instance names'
+
+        if not name_pattern:
+            return [None] * count, None
+
+        try:
+            return [name_pattern.format(index=index, project=project_name)
+                    for index in range(1, count + 1)], None
+        except (KeyError, IndexError, ValueError) as pattern_err:
+            return None, f'Invalid name pattern {name_pattern} : ' + \
+                str(pattern_err)
+
+    @staticmethod
+    def compile_user_data(user_data):
+        """Compile a user data template.
+
+        returns a function rendering the user data of an instance from
+        its name (each '%s' in the template is replaced by the name).
+        templates with '%s' need one 'RunInstances' call per instance,
+        templates reading the 'Name' tag from the instance metadata
+        (see www_fleet_script.sh) are shared by the instances of a
+        subnet.
+        """
+        if user_data is None:
+            return lambda instance_name: None
+
+        parts = user_data.split('%s')
+        if len(parts) == 1:
+            return lambda instance_name: user_data
+
+        return lambda instance_name: (instance_name or '').join(parts)
+
+    @staticmethod
+    def plan_launches(names, subnet_ids, render):
+        """Group the instances to launch per subnet and user data.
+
+        returns [(subnet_id, user_data, names)], one per 'RunInstances'
+        call.
+        """
+        subnet_ids = subnet_ids or [None]
+        plan = {}
+        for index, name in enumerate(names):
+            key = (subnet_ids[index % len(subnet_ids)], render(name))
+            plan.setdefault(key, []).append(name)
+
+        return [(subnet_id, user_data, group_names)
+                for (subnet_id, user_data), group_names in plan.items()]
+
+    def run_instances(self, params_dict, subnet_id, user_data, names,
+                      base64_encode=False, sfunc=None):
+        """Launch a group of instances with one 'RunInstances' call.
+
+        a single instance is named at launch.
+        returns ({instance_id: name}, err)
+        """
+        params = dict(params_dict, MinCount=len(names), MaxCount=len(names))
+        if subnet_id:
+            params['SubnetId'] = subnet_id
+        if user_data is not None:
+            params['UserData'] = util.get_base64_encoding(user_data) \
+                if base64_encode else user_data
+        if len(names) == 1 and names[0]:
+            tag_spec = [dict(spec, Tags=list(spec['Tags']))
+                        for spec in params.get('TagSpecifications', [])]
+            instance_specs = [spec for spec in tag_spec
+                              if spec['ResourceType'] == 'instance']
+            if not instance_specs:
+                instance_specs = [{'ResourceType': 'instance', 'Tags': []}]
+                tag_spec.extend(instance_specs)
+            instance_specs[0]['Tags'].append({'Key': 'Name',
+                                              'Value': names[0]})
+            params['TagSpecifications'] = tag_spec
+
+        try:
+            sfunc(f'Launching {len(names)} instances' +
+                  (f' in {subnet_id}' if subnet_id else ''))
+            instances = self.ec2_session.get_ec2_client().\
+                run_instances(**params)['Instances']
+            return {instance['InstanceId']: name for instance, name
+                    in zip(instances, names)}, None
+        except ClientError as client_err:
+            return None, f'couldnot launch {len(names)} instances' + \
+                (f' in {subnet_id}' if subnet_id else '') + \
+                f' : {str(client_err)}'
+
+    def tag_instances(self, names, sfunc=None, max_attempts=8):
+        """Set the 'Name' tag of launched instances (concurrently).
+
+        up to 'parallelism' instances are tagged at a time, fewer while
+        the calls are throttled (RequestLimitExceeded). throttled calls
+        and calls made before a new instance is visible
+        (InvalidInstanceID.NotFound) are retried with backoff up to
+        'max_attempts' times.
+        returns the list of instance ids that could not be tagged.
+        """
+        limiter = util.AdaptiveLimiter(self.parallelism)
+
+        def tag_instance(item):
+            instance_id, name = item
+            for attempt in range(max_attempts):
+                limiter.acquire()
+                try:
+                    self.ec2_session.get_ec2_client().\
+                        create_tags(Resources=[instance_id],
+                                    Tags=[{'Key': 'Name', 'Value': name}])
+                    limiter.release()
+                    return None
+                except ClientError as client_err:
+                    code = client_err.response['Error']['Code']
+                    throttled = code in ('RequestLimitExceeded',
+                                         'Throttling')
+                    limiter.release(throttled)
+                    if not (throttled or
+                            code == 'InvalidInstanceID.NotFound') or \
+                            attempt == max_attempts - 1:
+                        sfunc(f'couldnot tag instance {instance_id} : ' +
+                              str(client_err))
+                        return instance_id
+                time.sleep(util.get_backoff_delay(attempt))
+
+            return instance_id
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            untagged = [instance_id for instance_id in
+                        executor.map(tag_instance, names.items())
+                        if instance_id]
+
+        if limiter.throttled_count:
+            sfunc(f'{limiter.throttled_count} throttled calls, ' +
+                  f'concurrency ended at {limiter.limit}')
+
+        return untagged
+
+    def launch(self, params_dict, names, subnet_ids=None, user_data=None,
+               base64_encode=False, wait=False, sfunc=None):
+        """Launch a fleet of instances.
+
+        'params_dict' are the 'RunInstances' parameters shared by all
+        the instances, 'names' the names of the instances (see
+        get_instance_names) and 'user_data' the user data template
+        (see compile_user_data). if 'wait' is set, wait for all the
+        instances to be running. the launch throughput (and time to
+        all running) is reported.
+        returns the (launched, failed_count) list of instance ids and
+        number of instances that were not launched, could not be named
+        or did not start.
+        """
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        plan = self.plan_launches(names, subnet_ids,
+                                  self.compile_user_data(user_data))
+        start_time = time.monotonic()
+
+        def run(group):
+            subnet_id, group_user_data, group_names = group
+            return group_names, \
+                self.run_instances(params_dict, subnet_id, group_user_data,
+                                   group_names, base64_encode, sfunc)
+
+        launched = {}
+        unnamed = {}
+        failed_count = 0
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            for group_names, (instances, err) in executor.map(run, plan):
+                if err:
+                    sfunc(err)
+                    failed_count += len(group_names)
+                    continue
+                launched.update(instances)
+                if len(group_names) > 1:
+                    unnamed.update((instance_id, name) for instance_id, name
+                                   in instances.items() if name)
+
+        elapsed = time.monotonic() - start_time
+        sfunc(f'Launched {len(launched)} instances with {len(plan)} ' +
+              f'RunInstances calls in {elapsed:.1f}s ' +
+              f'({len(launched) / max(elapsed, 0.001):.1f} instances/s)')
+
+        untagged = self.tag_instances(unnamed, sfunc)
+        failed_count += len(untagged)
+
+        instance_ids = list(launched)
+        if wait and instance_ids:
+            instance_ids, failed = self.scheduler.\
+                wait_for_state(instance_ids, 'running', sfunc)
+            failed_count += len(failed)
+            sfunc(f'{len(instance_ids)} instances running after ' +
+                  f'{time.monotonic() - start_time:.1f}s')
+
+        return instance_ids, failed_count
+
+
+if __name__ == '__main__':
+    pass
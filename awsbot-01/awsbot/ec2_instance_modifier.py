@@ -0,0 +1,304 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance bulk modification Class."""
+
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+try:
+    from awsbot.ec2_instance_scheduler import EC2InstanceScheduler
+    from awsbot import util
+except ImportError:
+    from ec2_instance_scheduler import EC2InstanceScheduler
+    import util
+
+
+class EC2InstanceModifier():
+    """EC2 instance bulk modification Class.
+
+    Modifies many instances at once. the changes each instance needs
+    are planned against its current state first, so no-op calls are
+    skipped. name tags are set with one 'CreateTags' call per name
+    (and batch of instances), the instances whose user data changes
+    are stopped together, the attributes are modified concurrently
+    and the stopped instances are started again together.
+    """
+
+    METADATA_TAGS_PATH = 'meta-data/tags/instance'
+
+    def __init__(self, ec2_session, parallelism=4,
+                 poll_interval=5, timeout=600):
+        """Initialize EC2 instance bulk modification Class."""
+        self.ec2_session = ec2_session
+        self.parallelism = max(1, parallelism)
+        self.scheduler = EC2InstanceScheduler(ec2_session,
+                                              poll_interval, timeout)
+
+    @staticmethod
+    def get_security_group_ids(instance):
+        """Get the ids of the security groups of an instance."""
+        return {group['GroupId'] for group in instance.security_groups or []}
+
+    def get_user_data_changes(self, instances, user_data):
+        """Get the instances whose user data differs from 'user_data'.
+
+        'user_data' maps an instance id to its new user data. the
+        current user data of the instances is read concurrently.
+        returns {instance_id: user_data} of the instances to change.
+        """
+        header = self.ec2_session.USER_DATA_MIME_HEADER
+
+        def get_change(instance):
+            new_user_data = user_data.get(instance.id)
+            if new_user_data is None:
+                return None
+            current = self.ec2_session.get_instance_user_data(instance.id)
+            if current == header + new_user_data:
+                return None
+            return instance.id, new_user_data
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            return dict(change for change in
+                        executor.map(get_change, instances) if change)
+
+    def get_iam_role_changes(self, instances, iam_instance_profile_arn,
+                             attach_iam_role):
+        """Get the iam instance profile changes of instances.
+
+        returns {instance_id: (association_id, arn)}, 'association_id'
+        being the association to replace or remove (None if the
+        profile is to be associated) and 'arn' the profile to
+        associate (None if the association is to be removed).
+        """
+        if attach_iam_role is None:
+            return {}
+
+        associations = self.ec2_session.\
+            get_iam_role_associations([instance.id for instance in instances])
+        changes = {}
+        for instance in instances:
+            assoc = associations.get(instance.id)
+            assoc_id = assoc['AssociationId'] if assoc else None
+            if attach_iam_role and \
+                    (not assoc or assoc['IamInstanceProfile']['Arn'] !=
+                     iam_instance_profile_arn):
+                changes[instance.id] = (assoc_id, iam_instance_profile_arn)
+            elif attach_iam_role is False and assoc:
+                changes[instance.id] = (assoc_id, None)
+
+        return changes
+
+    def plan_changes(self, instances, security_group_ids=None,
+                     src_dest_check_flag=None, instance_names=None,
+                     user_data=None, iam_instance_profile_arn=None,
+                     attach_iam_role=None):
+        """Plan the changes needed to modify instances.
+
+        'instance_names' and 'user_data' map an instance id to its new
+        name and user data. the changes already in effect are dropped.
+        returns {instance_id: {change: value}}
+        """
+        plan = {instance.id: {} for instance in instances}
+        for instance in instances:
+            changes = plan[instance.id]
+            if security_group_ids and \
+                    set(security_group_ids) != \
+                    self.get_security_group_ids(instance):
+                changes['groups'] = list(security_group_ids)
+
+            if src_dest_check_flag is not None and \
+                    src_dest_check_flag != instance.source_dest_check:
+                changes['source_dest_check'] = src_dest_check_flag
+
+            name = (instance_names or {}).get(instance.id)
+            if name and name != self.ec2_session.\
+                    get_instance_tags(instance).get('Name'):
+                changes['name'] = name
+
+        for instance_id, new_user_data in \
+                self.get_user_data_changes(instances,
+                                           user_data or {}).items():
+            plan[instance_id]['user_data'] = new_user_data
+
+        # user data reading the instance tags needs them in the metadata
+        for instance in instances:
+            new_user_data = (user_data or {}).get(instance.id)
+            if new_user_data and \
+                    self.METADATA_TAGS_PATH in new_user_data and \
+                    (instance.metadata_options or {}).\
+                    get('InstanceMetadataTags') != 'enabled':
+                plan[instance.id]['metadata_tags'] = 'enabled'
+
+        for instance_id, change in \
+                self.get_iam_role_changes(instances,
+                                          iam_instance_profile_arn,
+                                          attach_iam_role).items():
+            plan[instance_id]['iam_role'] = change
+
+        return plan
+
+    def apply_names(self, plan, sfunc):
+        """Set the name tags, one 'CreateTags' call per name and batch.
+
+        returns {instance_id: err} of the instances that failed.
+        """
+        names = {}
+        for instance_id, changes in plan.items():
+            if 'name' in changes:
+                names.setdefault(changes['name'], []).append(instance_id)
+
+        errors = {}
+        for name, instance_ids in names.items():
+            for batch in util.get_batches(
+                    instance_ids, self.ec2_session.INSTANCE_BATCH_SIZE):
+                try:
+                    sfunc(f'Modifying {",".join(batch)}...Name={name}')
+                    self.ec2_session.get_ec2_client().\
+                        create_tags(Resources=batch,
+                                    Tags=[{'Key': 'Name', 'Value': name}])
+                except ClientError as client_err:
+                    errors.update(dict.fromkeys(
+                        batch, f'couldnot tag instance : {str(client_err)}'))
+
+        return errors
+
+    def apply_instance_changes(self, instance_id, changes, sfunc):
+        """Modify the attributes of an instance.
+
+        returns the list of errors.
+        """
+        client = self.ec2_session.get_ec2_client()
+        attributes = []
+        if 'groups' in changes:
+            attributes.append(('Groups', changes['groups'],
+                               {'Groups': changes['groups']}))
+        if 'source_dest_check' in changes:
+            attributes.append(('SourceDestCheck',
+                               changes['source_dest_check'],
+                               {'SourceDestCheck': {
+                                   'Value': changes['source_dest_check']}}))
+        if 'user_data' in changes:
+            attributes.append(('UserData', changes['user_data'],
+                               {'UserData': {'Value': (
+                                   self.ec2_session.USER_DATA_MIME_HEADER +
+                                   changes['user_data']).encode()}}))
+
+        errors = []
+        for name, value, params in attributes:
+            try:
+                sfunc(f'Modifying {instance_id}...{name}={value}')
+                client.modify_instance_attribute(InstanceId=instance_id,
+                                                 **params)
+            except ClientError as client_err:
+                errors.append(f'couldnot modify instance {instance_id} : ' +
+                              str(client_err))
+
+        if 'metadata_tags' in changes:
+            try:
+                sfunc(f'Modifying {instance_id}...InstanceMetadataTags=' +
+                      changes['metadata_tags'])
+                client.modify_instance_metadata_options(
+                    InstanceId=instance_id,
+                    InstanceMetadataTags=changes['metadata_tags'])
+            except ClientError as client_err:
+                errors.append(f'couldnot modify instance {instance_id} : ' +
+                              str(client_err))
+
+        if 'iam_role' in changes:
+            assoc_id, arn = changes['iam_role']
+            try:
+                sfunc(f'Modifying {instance_id}...IamInstanceProfile={arn}')
+                if assoc_id and arn:
+                    client.replace_iam_instance_profile_association(
+                        AssociationId=assoc_id,
+                        IamInstanceProfile={'Arn': arn})
+                elif arn:
+                    client.associate_iam_instance_profile(
+                        InstanceId=instance_id,
+                        IamInstanceProfile={'Arn': arn})
+                else:
+                    client.disassociate_iam_instance_profile(
+                        AssociationId=assoc_id)
+            except ClientError as client_err:
+                errors.append(f'couldnot modify instance {instance_id} : ' +
+                              str(client_err))
+
+        return errors
+
+    def apply_changes(self, instances, plan, sfunc):
+        """Apply planned changes to instances.
+
+        the running instances whose user data changes are stopped
+        together first and started again together at the end.
+        returns the (modified, failed) lists of instance ids.
+        """
+        errors = self.apply_names(plan, sfunc)
+
+        running_ids = [instance.id for instance in instances
+                       if 'user_data' in plan[instance.id] and
+                       self.ec2_session.is_instance_running(instance)]
+        stopped_ids = []
+        if running_ids:
+            stopped_ids, failed_ids = self.scheduler.\
+                change_instance_states('stop', running_ids, True, sfunc)
+            for instance_id in failed_ids:
+                errors[instance_id] = f'couldnot stop instance {instance_id}'
+                del plan[instance_id]['user_data']
+
+        def apply(instance_id):
+            return instance_id, \
+                self.apply_instance_changes(instance_id, plan[instance_id],
+                                            sfunc)
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            for instance_id, instance_errors in \
+                    executor.map(apply, list(plan)):
+                if instance_errors:
+                    errors[instance_id] = ' | '.join(
+                        filter(None, [errors.get(instance_id)] +
+                               instance_errors))
+
+        if stopped_ids:
+            _, failed_ids = self.scheduler.\
+                change_instance_states('start', stopped_ids, True, sfunc)
+            for instance_id in failed_ids:
+                errors.setdefault(instance_id,
+                                  f'couldnot start instance {instance_id}')
+
+        for instance_id in sorted(errors):
+            sfunc(errors[instance_id])
+
+        return [instance_id for instance_id in plan
+                if instance_id not in errors], sorted(errors)
+
+    def modify_instances(self, instances, security_group_ids=None,
+                         src_dest_check_flag=None, instance_names=None,
+                         user_data=None, iam_instance_profile_arn=None,
+                         attach_iam_role=None, sfunc=None):
+        """Modify ec2 instances (see plan_changes for the arguments).
+
+        returns the (modified, failed) lists of instance ids (instances
+        already in the requested state count as modified).
+        """
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        plan = self.plan_changes(instances, security_group_ids,
+                                 src_dest_check_flag, instance_names,
+                                 user_data, iam_instance_profile_arn,
+                                 attach_iam_role)
+
+        for instance_id, changes in plan.items():
+            if not changes:
+                sfunc(f'{instance_id} : nothing to modify')
+
+        return self.apply_changes(instances, plan, sfunc)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,54 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance record class."""
+
+
+class EC2InstanceRecord():
+    """EC2 instance record class.
+
+    Lightweight, read only view of an instance returned by a
+    'DescribeInstances' call. it holds only the fields awsbot prints
+    or uses, under the same attribute names as the boto3 Instance
+    resource, so it can be used wherever an Instance is only read.
+    unlike an Instance resource it never calls aws to load attributes.
+    """
+
+    FIELDS = (('id', 'InstanceId'),
+              ('image_id', 'ImageId'),
+              ('instance_type', 'InstanceType'),
+              ('key_name', 'KeyName'),
+              ('state', 'State'),
+              ('placement', 'Placement'),
+              ('vpc_id', 'VpcId'),
+              ('subnet_id', 'SubnetId'),
+              ('public_ip_address', 'PublicIpAddress'),
+              ('private_ip_address', 'PrivateIpAddress'),
+              ('public_dns_name', 'PublicDnsName'),
+              ('private_dns_name', 'PrivateDnsName'),
+              ('security_groups', 'SecurityGroups'),
+              ('source_dest_check', 'SourceDestCheck'),
+              ('iam_instance_profile', 'IamInstanceProfile'),
+              ('root_device_name', 'RootDeviceName'),
+              ('metadata_options', 'MetadataOptions'),
+              ('tags', 'Tags'))
+
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    def __init__(self, instance):
+        """Initialize the record from a 'DescribeInstances' instance."""
+        for name, key in self.FIELDS:
+            setattr(self, name, instance.get(key))
+
+    @property
+    def instance_id(self):
+        """Get the instance id."""
+        return self.id
+
+    def __repr__(self):
+        """Get the printable representation of the record."""
+        return f'EC2InstanceRecord(id={self.id!r})'
+
+
+if __name__ == '__main__':
+    pass
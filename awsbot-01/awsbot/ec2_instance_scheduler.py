@@ -0,0 +1,193 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance state Scheduler Class."""
+
+import time
+from collections import deque
+from types import MappingProxyType
+
+
+class EC2InstanceScheduler():
+    """EC2 instance state Scheduler Class.
+
+    Drives many instances through state transitions at once. state
+    changes are issued in batches and the instances are then polled
+    together (one batched 'DescribeInstances' call per poll interval)
+    instead of waiting on each instance in turn.
+    """
+
+    TARGET_STATES = MappingProxyType({'start': 'running',
+                                      'stop': 'stopped',
+                                      'terminate': 'terminated'})
+    FAILED_STATES = frozenset({'shutting-down', 'terminated'})
+
+    def __init__(self, ec2_session, poll_interval=5, timeout=600):
+        """Initialize EC2 instance Scheduler Class.
+
+        'timeout' is the time (in seconds) each instance is given to
+        reach a state once its state change was issued.
+        """
+        self.ec2_session = ec2_session
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def get_deadline(self):
+        """Get the deadline of a state change issued now."""
+        return time.monotonic() + self.timeout
+
+    def poll(self, *in_flight):
+        """Wait a poll interval, then get the state of in flight instances.
+
+        each 'in_flight' argument maps an instance id to its deadline.
+        """
+        time.sleep(self.poll_interval)
+        instance_ids = [instance_id for instances in in_flight
+                        for instance_id in instances]
+        return self.ec2_session.get_instance_states(instance_ids)
+
+    @staticmethod
+    def pop_reached(in_flight, states, state):
+        """Remove and return the in flight instances that reached state."""
+        reached = [instance_id for instance_id in in_flight
+                   if states.get(instance_id) == state]
+        for instance_id in reached:
+            del in_flight[instance_id]
+
+        return reached
+
+    def pop_failed(self, in_flight, states, state, sfunc):
+        """Remove and return the in flight instances that cannot reach state.
+
+        an instance fails if it timed out or if it is being terminated
+        (unless state is 'terminated').
+        """
+        now = time.monotonic()
+        failed = []
+        for instance_id, deadline in list(in_flight.items()):
+            current_state = states.get(instance_id, 'unknown')
+            if state != 'terminated' and \
+                    current_state in self.FAILED_STATES:
+                sfunc(f'{instance_id} cannot reach {state} : ' +
+                      f'instance is {current_state}')
+            elif now > deadline:
+                sfunc(f'{instance_id} did not reach {state} within ' +
+                      f'{self.timeout}s : instance is {current_state}')
+            else:
+                continue
+            del in_flight[instance_id]
+            failed.append(instance_id)
+
+        return failed
+
+    def wait_for_state(self, instance_ids, state, sfunc=None):
+        """Wait for ec2 instances to reach state.
+
+        returns the (reached, failed) lists of instance ids.
+        """
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        waiting = dict.fromkeys(instance_ids, self.get_deadline())
+        reached = []
+        failed = []
+        while waiting:
+            states = self.poll(waiting)
+            for instance_id in self.pop_reached(waiting, states, state):
+                sfunc(f'{instance_id} is {state}')
+                reached.append(instance_id)
+            failed.extend(self.pop_failed(waiting, states, state, sfunc))
+
+        return reached, failed
+
+    def change_instance_states(self, action, instance_ids,
+                               wait=False, sfunc=None):
+        """Start, stop or terminate ec2 instances.
+
+        if 'wait' is set, wait for the instances to reach the target
+        state of the action. returns the (changed, failed) lists of
+        instance ids.
+        """
+        changed, failed = self.ec2_session.\
+            change_instance_states(action, instance_ids, sfunc)
+
+        if wait and changed:
+            changed, wait_failed = \
+                self.wait_for_state(changed, self.TARGET_STATES[action],
+                                    sfunc)
+            failed.extend(wait_failed)
+
+        return changed, failed
+
+    def reboot_instances(self, instance_ids, max_in_flight=None,
+                         rolling=None, sfunc=None):
+        """Reboot (stop and then start) ec2 instances.
+
+        up to 'max_in_flight' instances (all if not set) are stopped at
+        once. each instance is started as soon as it is stopped, which
+        frees its slot for the next instance.
+
+        in rolling mode, at most 'rolling' instances are down at a time:
+        a slot is only freed when its instance is running again.
+
+        returns the (rebooted, failed) lists of instance ids.
+        """
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        limit = rolling or max_in_flight
+        pending = deque(instance_ids)
+        stopping = {}
+        starting = {}
+        rebooted = []
+        failed = []
+
+        while pending or stopping or starting:
+            count = len(pending) if not limit else \
+                limit - len(stopping) - len(starting)
+            batch = [pending.popleft()
+                     for _ in range(max(0, min(count, len(pending))))]
+            if batch:
+                changed, stop_failed = self.ec2_session.\
+                    change_instance_states('stop', batch, sfunc)
+                failed.extend(stop_failed)
+                stopping.update(dict.fromkeys(changed, self.get_deadline()))
+
+            if not stopping and not starting:
+                continue
+
+            states = self.poll(stopping, starting)
+
+            for instance_id in self.pop_reached(starting, states, 'running'):
+                sfunc(f'{instance_id} is running')
+                rebooted.append(instance_id)
+            failed.extend(self.pop_failed(starting, states,
+                                          'running', sfunc))
+
+            stopped = self.pop_reached(stopping, states, 'stopped')
+            failed.extend(self.pop_failed(stopping, states,
+                                          'stopped', sfunc))
+            if not stopped:
+                continue
+
+            changed, start_failed = self.ec2_session.\
+                change_instance_states('start', stopped, sfunc)
+            failed.extend(start_failed)
+            if rolling:
+                starting.update(dict.fromkeys(changed, self.get_deadline()))
+            else:
+                rebooted.extend(changed)
+
+        return rebooted, failed
+
+
+if __name__ == '__main__':
+    pass
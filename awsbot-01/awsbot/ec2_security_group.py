@@ -7,13 +7,19 @@ from botocore.exceptions import ClientError
 
 try:
     from awsbot import util
+    from awsbot.ec2_security_group_analyzer import EC2SecurityGroupAnalyzer
+    from awsbot.ec2_security_group_sync import EC2SecurityGroupSync
 except ImportError:
     import util
+    from ec2_security_group_analyzer import EC2SecurityGroupAnalyzer
+    from ec2_security_group_sync import EC2SecurityGroupSync
 
 
 class EC2SecurityGroupManager():
     """EC2 Security Group Manager Class."""
 
+    SECURITY_GROUP_BATCH_SIZE = 200
+
     def __init__(self, ec2_session):
         """Initialize the ec2 security group manager class."""
         self.ec2_session = ec2_session
@@ -22,35 +28,25 @@ class EC2SecurityGroupManager():
         """Get EC2 Session."""
         return self.ec2_session
 
-    def validate_and_get_security_groups(self, groups):
+    def validate_and_get_security_groups(self, groups, vpc_id=None):
         """Validate one or more security groups passed in.
 
         groups can be a (comma separated) string or a collection
-        of groupids, groupnames or a mix of both.
+        of groupids, groupnames or a mix of both. if 'vpc_id' is set,
+        the groups must belong to that vpc.
         """
         if not groups:
             return None, 'No groups specified'
 
-        invalid_groups = set()
-        valid_groups = set()
-        sg_list = []
-
-        if groups:
-            groups, err = util.convert_to_set(groups)
-            if not groups:
-                return None, err
-        else:
-            groups = set(groups)
+        groups, err = util.convert_to_set(groups)
+        if not groups:
+            return None, err
 
         try:
-            for security_group in \
-                    self.get_security_groups():
-                if security_group['GroupName'] in groups:
-                    valid_groups.add(security_group['GroupName'])
-                    sg_list.append(security_group)
-                elif security_group['GroupId'] in groups:
-                    valid_groups.add(security_group['GroupId'])
-                    sg_list.append(security_group)
+            sg_list = list(self.get_security_groups(groups, groups, vpc_id))
+            valid_groups = {security_group[key]
+                            for security_group in sg_list
+                            for key in ('GroupId', 'GroupName')}
             invalid_groups = groups - valid_groups
 
             if len(invalid_groups) == 0:
@@ -165,6 +161,52 @@ class EC2SecurityGroupManager():
         except ClientError as client_err:
             return False, str(client_err)
 
+    def analyze_security_groups(self, groups=None, vpc_id=None,
+                                pfunc=None):
+        """Analyze the rules of security groups.
+
+        groups can be a (comma separated) string or a collection
+        of groupids, groupnames or a mix of both (all the groups of the
+        region, or of 'vpc_id' if set, by default). the groups are read
+        once and their rules indexed in memory to find redundant,
+        shadowed, overlapping, duplicate and aggregatable rules.
+        """
+        def default_print(finding):
+            print(f'{finding["kind"]} | {finding["group_id"]} | ' +
+                  f'{finding["direction"]} | {finding["rule"]} | ' +
+                  f'{finding["detail"]}')
+
+        if not pfunc:
+            pfunc = default_print
+
+        try:
+            security_groups = list(self.get_security_groups(groups, groups,
+                                                            vpc_id))
+        except ClientError as client_err:
+            return False, str(client_err)
+
+        findings = EC2SecurityGroupAnalyzer(security_groups).analyze()
+        counts = {}
+        for finding in findings:
+            pfunc(finding)
+            counts[finding['kind']] = counts.get(finding['kind'], 0) + 1
+
+        return True, f'Analyzed {len(security_groups)} security groups, ' + \
+            f'{len(findings)} findings' + \
+            ''.join(f', {kind} : {count}'
+                    for kind, count in sorted(counts.items()))
+
+    def apply_security_groups(self, desired_state_file, dry_run=False,
+                              parallelism=4, pfunc=None, sfunc=None):
+        """Sync the rules of security groups with a desired state file.
+
+        see EC2SecurityGroupSync for the (yaml or json) file format.
+        the rule entries to add (+) and remove (-) are printed, and
+        applied unless 'dry_run' is set.
+        """
+        return EC2SecurityGroupSync(self, parallelism).\
+            apply(desired_state_file, dry_run, pfunc, sfunc)
+
     def create_security_groups(self, group_names, vpc_ids,
                                descriptions, sfunc=None):
         """Create Security Groups."""
@@ -263,6 +305,7 @@ class EC2SecurityGroupManager():
                 create_security_group(Description=description,
                                       GroupName=group_name,
                                       VpcId=vpc_id)
+            self.ec2_session.clear_security_group_cache()
             return True, None
         except ClientError as client_err:
             return False, str(client_err)
@@ -289,48 +332,87 @@ class EC2SecurityGroupManager():
                 self.ec2_session.get_ec2_client().\
                     delete_security_group(GroupName=group_name)
 
+            self.ec2_session.clear_security_group_cache()
             return True, None
         except ClientError as client_err:
             return False, str(client_err)
 
-    def get_security_groups(self, group_ids=None, group_names=None):
+    def load_security_groups(self, filter_name, values):
+        """Load security groups into the session security group cache.
+
+        the groups are read with batched 'DescribeSecurityGroups' calls
+        filtered by 'filter_name' (SECURITY_GROUP_BATCH_SIZE values a
+        call). values are marked as queried, found or not.
+        """
+        values = sorted(values)
+        if not values:
+            return
+
+        paginator = \
+            self.ec2_session.get_describe_security_groups_paginator()
+        for batch in util.get_batches(values, self.SECURITY_GROUP_BATCH_SIZE):
+            for page in paginator.paginate(
+                    Filters=[{'Name': filter_name, 'Values': batch}]):
+                self.ec2_session.\
+                    add_security_groups_to_cache(page['SecurityGroups'])
+
+        self.ec2_session.get_security_group_cache()['queried'].update(values)
+
+    def get_security_groups(self, group_ids=None, group_names=None,
+                            vpc_id=None):
         """Iterate over security groups.
 
         group ids or group names passed can be a list or a set
-        or a comma separated string.
+        or a comma separated string. the ids and names are looked up
+        server side ('group-id' and 'group-name' filters) through the
+        session security group cache. if 'vpc_id' is set, only the
+        groups of that vpc are selected.
         """
         if group_ids:
             group_ids, err = util.\
-                convert_to_list(group_ids, remove_duplicates=True)
+                convert_to_set(group_ids)
             if not group_ids:
                 return False, err
 
         if group_names:
             group_names, err = util.\
-                convert_to_list(group_names, remove_duplicates=True)
+                convert_to_set(group_names)
             if not group_names:
                 return False, err
 
-        paginator = \
-            self.ec2_session.get_describe_security_groups_paginator()
-
-        for page in paginator.paginate():
-            for security_group in page['SecurityGroups']:
-                match = False
-
-                if not group_ids and not group_names:
-                    match = True
-
-                if not match and group_ids and \
-                        security_group['GroupId'] in group_ids:
-                    match = True
-
-                if not match and group_names and \
-                        security_group['GroupName'] in group_names:
-                    match = True
-
-                if match:
+        if not group_ids and not group_names:
+            filters = [{'Name': 'vpc-id', 'Values': [vpc_id]}] \
+                if vpc_id else []
+            paginator = \
+                self.ec2_session.get_describe_security_groups_paginator()
+            for page in paginator.paginate(Filters=filters):
+                self.ec2_session.\
+                    add_security_groups_to_cache(page['SecurityGroups'])
+                for security_group in page['SecurityGroups']:
                     yield security_group
+            return True, None
+
+        # group names cannot start with 'sg-'
+        group_ids = {group_id for group_id in group_ids or []
+                     if group_id.startswith('sg-')}
+        group_names = {group_name for group_name in group_names or []
+                       if not group_name.startswith('sg-')}
+
+        cache = self.ec2_session.get_security_group_cache()
+        self.load_security_groups('group-id', group_ids - cache['queried'])
+        self.load_security_groups('group-name',
+                                  group_names - cache['queried'])
+
+        selected = {group_id for group_id in group_ids
+                    if group_id in cache['ids']}
+        selected.update(group_id for (_, group_name), group_id
+                        in cache['names'].items()
+                        if group_name in group_names)
+
+        for group_id in sorted(selected):
+            security_group = cache['ids'][group_id]
+            if not vpc_id or security_group.get('VpcId') == vpc_id:
+                yield security_group
 
         return True, None
 
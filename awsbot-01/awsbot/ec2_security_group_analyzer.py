@@ -0,0 +1,303 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 Security Group Analyzer Class."""
+
+import ipaddress
+
+try:
+    from awsbot.cidr_trie import CidrTrie
+    from awsbot.cidr_trie import parse_cidr
+    from awsbot.interval_tree import IntervalTree
+    from awsbot.ec2_security_group_rule_matcher import \
+        EC2SecurityGroupRuleMatcher
+except ImportError:
+    from cidr_trie import CidrTrie
+    from cidr_trie import parse_cidr
+    from interval_tree import IntervalTree
+    from ec2_security_group_rule_matcher import EC2SecurityGroupRuleMatcher
+
+
+class EC2SecurityGroupRuleEntry():
+    """EC2 Security Group Rule Entry Class.
+
+    One source (cidr block, group or prefix list) of a security group
+    rule, with its protocol and port interval. icmp rules use the icmp
+    type as port interval and keep the icmp code (-1 for any).
+    """
+
+    __slots__ = ('index', 'group_id', 'vpc_id', 'direction', 'protocol',
+                 'from_port', 'to_port', 'icmp_code', 'source',
+                 'source_kind')
+
+    def __init__(self, index, security_group, direction, rule,
+                 source, source_kind):
+        """Initialize the rule entry."""
+        self.index = index
+        self.group_id = security_group['GroupId']
+        self.vpc_id = security_group.get('VpcId')
+        self.direction = direction
+        self.protocol = EC2SecurityGroupRuleMatcher.\
+            get_protocol_name(rule.get('IpProtocol'))
+        self.from_port, self.to_port, self.icmp_code = \
+            self.get_port_interval(self.protocol, rule)
+        self.source = source
+        self.source_kind = source_kind
+
+    @staticmethod
+    def get_port_interval(protocol, rule):
+        """Get the (from_port, to_port, icmp_code) of a rule."""
+        if protocol in EC2SecurityGroupRuleMatcher.ICMP_PROTOCOLS:
+            icmp_type = rule.get('FromPort', -1)
+            if icmp_type == -1:
+                return 0, 255, -1
+            return icmp_type, icmp_type, rule.get('ToPort', -1)
+
+        if protocol in ('tcp', 'udp'):
+            return rule.get('FromPort', 0), rule.get('ToPort', 65535), -1
+
+        return 0, 65535, -1
+
+    def get_key(self):
+        """Get the key of the entry (equal for duplicate entries)."""
+        source = self.source
+        if self.source_kind in ('ipv4', 'ipv6'):
+            source = parse_cidr(source) or source
+        return (self.direction, self.protocol, self.from_port,
+                self.to_port, self.icmp_code, self.source_kind, source)
+
+    def get_label(self):
+        """Get the printable label of the entry."""
+        if self.protocol == '-1':
+            protocol, ports = 'Any-Protocol', 'Any-Port'
+        elif self.protocol in EC2SecurityGroupRuleMatcher.ICMP_PROTOCOLS:
+            protocol = self.protocol
+            ports = 'anytype' if self.from_port != self.to_port else \
+                f'type-{self.from_port}'
+            ports += '-anycode' if self.icmp_code == -1 else \
+                f'-code-{self.icmp_code}'
+        else:
+            protocol = self.protocol
+            ports = f'{self.from_port}' if self.from_port == self.to_port \
+                else f'{self.from_port}-{self.to_port}'
+
+        return f'{protocol} | {ports} | {self.source}'
+
+    def overlaps_ports(self, entry):
+        """Determine if the protocol and ports of the entries overlap."""
+        if '-1' in (self.protocol, entry.protocol):
+            return True
+
+        return self.protocol == entry.protocol and \
+            self.from_port <= entry.to_port and \
+            entry.from_port <= self.to_port and \
+            (self.icmp_code == entry.icmp_code or
+             -1 in (self.icmp_code, entry.icmp_code))
+
+    def covers_ports(self, entry):
+        """Determine if the protocol and ports cover those of entry."""
+        if self.protocol == '-1':
+            return True
+
+        return self.protocol == entry.protocol and \
+            self.from_port <= entry.from_port and \
+            entry.to_port <= self.to_port and \
+            self.icmp_code in (-1, entry.icmp_code)
+
+    def covers(self, entry):
+        """Determine if the entry allows all the traffic of 'entry'."""
+        if self.source_kind != entry.source_kind or \
+                not self.covers_ports(entry):
+            return False
+
+        if self.source_kind in ('ipv4', 'ipv6'):
+            return ipaddress.ip_network(entry.source, strict=False).\
+                subnet_of(ipaddress.ip_network(self.source, strict=False))
+
+        return self.source == entry.source
+
+
+class EC2SecurityGroupAnalyzer():
+    """EC2 Security Group Analyzer Class.
+
+    Indexes the rules of security groups ('DescribeSecurityGroups'
+    results) once in memory and finds:
+    - redundant entries, allowing traffic another entry of the same
+      group and direction already allows
+    - shadowed group references, whose traffic is allowed by an open
+      (0.0.0.0/0) cidr entry of the same group
+    - overlapping entries of a group (partial overlap of their ports
+      and cidr blocks)
+    - entries duplicated in several groups of a vpc
+    - cidr blocks (of a group, direction, protocol and ports) that can
+      be aggregated into fewer blocks covering the same addresses
+    the cidr blocks of each group are indexed in a prefix trie and the
+    port ranges in an interval tree, so an entry is only compared to
+    the entries it may overlap.
+    """
+
+    DIRECTIONS = (('ingress', 'IpPermissions'),
+                  ('egress', 'IpPermissionsEgress'))
+    SOURCES = (('IpRanges', 'CidrIp', 'ipv4'),
+               ('Ipv6Ranges', 'CidrIpv6', 'ipv6'),
+               ('UserIdGroupPairs', 'GroupId', 'group'),
+               ('PrefixListIds', 'PrefixListId', 'prefix-list'))
+
+    def __init__(self, security_groups):
+        """Index the rules of the security groups."""
+        self.entries = []
+        for security_group in security_groups:
+            for direction, rules_key in self.DIRECTIONS:
+                for rule in security_group.get(rules_key, []):
+                    for list_key, source_key, source_kind in self.SOURCES:
+                        for source in rule.get(list_key, []):
+                            self.entries.append(EC2SecurityGroupRuleEntry(
+                                len(self.entries), security_group,
+                                direction, rule, source[source_key],
+                                source_kind))
+
+        self.scopes = {}
+        for entry in self.entries:
+            self.scopes.setdefault((entry.group_id, entry.direction),
+                                   []).append(entry)
+
+    @staticmethod
+    def get_finding(kind, entry, detail):
+        """Get a finding about an entry."""
+        return {'kind': kind,
+                'group_id': entry.group_id,
+                'vpc_id': entry.vpc_id,
+                'direction': entry.direction,
+                'rule': entry.get_label(),
+                'detail': detail}
+
+    def analyze_scope(self, entries):
+        """Find redundant, shadowed and overlapping entries of a scope.
+
+        a scope holds the entries of one group and direction.
+        """
+        trie = CidrTrie()
+        for entry in entries:
+            if entry.source_kind in ('ipv4', 'ipv6'):
+                trie.add(entry.source, entry)
+        tree = IntervalTree((entry.from_port, entry.to_port, entry)
+                            for entry in entries)
+        open_node = trie.find_node('0.0.0.0/0')
+        open_entries = {id(entry) for entry in
+                        (open_node[2] or [] if open_node else [])}
+        by_source = {}
+        for entry in entries:
+            by_source.setdefault((entry.source_kind, entry.source),
+                                 []).append(entry)
+
+        findings = []
+        for entry in entries:
+            port_candidates = tree.get_overlapping(entry.from_port,
+                                                   entry.to_port)
+            if entry.source_kind in ('ipv4', 'ipv6'):
+                source_ids = {id(candidate) for candidate in
+                              trie.get_overlapping(entry.source)}
+            else:
+                source_ids = {id(candidate) for candidate in
+                              by_source[(entry.source_kind, entry.source)]}
+            candidates = [candidate for candidate in port_candidates
+                          if id(candidate) in source_ids and
+                          candidate is not entry and
+                          candidate.overlaps_ports(entry)]
+
+            covering = [candidate for candidate in candidates
+                        if candidate.covers(entry) and
+                        (not entry.covers(candidate) or
+                         candidate.index < entry.index)]
+            if covering:
+                findings.append(self.get_finding(
+                    'redundant', entry,
+                    f'allowed by {covering[0].get_label()}'))
+                continue
+
+            if entry.source_kind == 'group':
+                shadowing = [candidate for candidate in port_candidates
+                             if id(candidate) in open_entries and
+                             candidate.covers_ports(entry)]
+                if shadowing:
+                    findings.append(self.get_finding(
+                        'shadowed', entry,
+                        f'allowed by {shadowing[0].get_label()}'))
+                    continue
+
+            for candidate in candidates:
+                if candidate.index > entry.index and \
+                        not candidate.covers(entry) and \
+                        not entry.covers(candidate):
+                    findings.append(self.get_finding(
+                        'overlapping', entry,
+                        f'overlaps {candidate.get_label()}'))
+
+        return findings
+
+    def get_duplicates(self):
+        """Find the entries duplicated in several groups of a vpc."""
+        groups = {}
+        for entry in self.entries:
+            groups.setdefault((entry.vpc_id, entry.get_key()),
+                              {}).setdefault(entry.group_id, entry)
+
+        findings = []
+        for group_entries in groups.values():
+            if len(group_entries) < 2:
+                continue
+            group_ids = sorted(group_entries)
+            findings.append(self.get_finding(
+                'duplicate', group_entries[group_ids[0]],
+                'also in ' + ', '.join(group_ids[1:])))
+
+        return findings
+
+    def get_aggregations(self, entries):
+        """Find the cidr blocks of a scope that can be aggregated.
+
+        the blocks of the entries with the same protocol and ports are
+        collapsed into the fewest blocks covering the same addresses.
+        """
+        blocks = {}
+        for entry in entries:
+            if entry.source_kind in ('ipv4', 'ipv6'):
+                blocks.setdefault((entry.protocol, entry.from_port,
+                                   entry.to_port, entry.icmp_code,
+                                   entry.source_kind), []).append(entry)
+
+        findings = []
+        for block_entries in blocks.values():
+            if len(block_entries) < 2:
+                continue
+            networks = [ipaddress.ip_network(entry.source, strict=False)
+                        for entry in block_entries]
+            collapsed = list(ipaddress.collapse_addresses(networks))
+            if len(collapsed) < len(networks):
+                findings.append(self.get_finding(
+                    'aggregate', block_entries[0],
+                    f'{len(networks)} cidr blocks can be replaced by ' +
+                    f'{len(collapsed)} : ' +
+                    ','.join(str(network) for network in collapsed)))
+
+        return findings
+
+    def analyze(self):
+        """Analyze the security group rules.
+
+        returns the list of findings, dicts with the 'kind'
+        (redundant, shadowed, overlapping, duplicate or aggregate),
+        'group_id', 'vpc_id', 'direction', 'rule' and 'detail' of
+        each finding.
+        """
+        findings = []
+        for entries in self.scopes.values():
+            findings.extend(self.analyze_scope(entries))
+            findings.extend(self.get_aggregations(entries))
+        findings.extend(self.get_duplicates())
+
+        return findings
+
+
+if __name__ == '__main__':
+    pass
@@ -3,12 +3,19 @@
 
 """EC2 Security Group Rule Manager Class."""
 
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
 try:
+    from awsbot.ec2_security_group_rule_matcher import \
+        EC2SecurityGroupRuleMatcher
+    from awsbot.ec2_security_group_sync import EC2SecurityGroupSync
     from awsbot import util
 except ImportError:
+    from ec2_security_group_rule_matcher import EC2SecurityGroupRuleMatcher
+    from ec2_security_group_sync import EC2SecurityGroupSync
     import util
 
 
@@ -96,9 +103,9 @@ class EC2SecurityGroupRuleManager():
             rule_json['FromPort'] = icmp_type if icmp_type != 'any' else -1
             rule_json['ToPort'] = icmp_code if icmp_code != 'any' else -1
         elif ip_protocol != 'any':
-            if from_port:
+            if from_port is not None:
                 rule_json['FromPort'] = from_port
-            if to_port:
+            if to_port is not None:
                 rule_json['ToPort'] = to_port
 
         if ipv4_cidr:
@@ -137,11 +144,12 @@ class EC2SecurityGroupRuleManager():
                     security_groups=None,
                     security_group_descriptions=None,
                     icmp_type=None, icmp_code=None,
-                    sfunc=None):
+                    sfunc=None, parallelism=4):
         """Create a Rule.
 
         groups can be a (comma separated) string or a collection
-        of groupids, groupnames or a mix of both.
+        of groupids, groupnames or a mix of both. the rule is created
+        in up to 'parallelism' groups at a time.
         """
         if not groups:
             return False, 'No groups specified'
@@ -178,7 +186,7 @@ class EC2SecurityGroupRuleManager():
                 security_group_resources,
                 icmp_type, icmp_code)
 
-        if not aok:
+        if err:
             return False, err
 
         def default_status(status_str):
@@ -187,28 +195,95 @@ class EC2SecurityGroupRuleManager():
         if not sfunc:
             sfunc = default_status
 
-        success_count = 0
-        failure_count = 0
-        try:
-            for group in groups:
-                security_group = \
-                    self.ec2_sg_manager.get_ec2_session().\
-                    get_ec2_resource().\
-                    SecurityGroup(group['GroupId'])
-                _, err = self.\
-                    create_security_group_rule(
-                        security_group, rule_json,
-                        egress_rule, sfunc)
-                if err:
-                    failure_count += 1
-                    sfunc(err)
-                else:
-                    success_count += 1
+        results = self.create_group_rules(groups, rule_json, egress_rule,
+                                          parallelism, sfunc)
+        latencies = [latency for _, latency in results]
+        percentiles = util.get_percentiles(latencies)
+        if percentiles:
+            sfunc(f'{len(latencies)} groups, latency (s) : ' +
+                  ', '.join(f'p{percentile} {latency:.3f}'
+                            for percentile, latency in percentiles.items()) +
+                  f', max {max(latencies):.3f}')
+
+        self.ec2_sg_manager.get_ec2_session().clear_security_group_cache()
+        return self.ec2_sg_manager.get_ec2_session().\
+            get_status(sum(1 for aok, _ in results if aok),
+                       sum(1 for aok, _ in results if not aok))
+
+    def create_group_rules(self, groups, rule_json, egress_rule,
+                           parallelism=4, sfunc=None, max_attempts=8):
+        """Create a rule in security groups concurrently.
+
+        groups are 'DescribeSecurityGroups' results. up to 'parallelism'
+        groups are updated at a time, fewer while the calls are
+        throttled (RequestLimitExceeded), throttled calls being retried
+        with backoff up to 'max_attempts' times. rule entries a group
+        already has are left out of its call, and a group which has
+        them all (or the InvalidPermission.Duplicate error) is a
+        success. returns the [(aok, latency in seconds)] of the groups.
+        """
+        def default_status(status_str):
+            print(status_str)
 
-            return self.ec2_sg_manager.get_ec2_session().\
-                get_status(success_count, failure_count)
-        except ClientError as client_err:
-            return False, str(client_err)
+        if not sfunc:
+            sfunc = default_status
+
+        client = self.ec2_sg_manager.get_ec2_session().get_ec2_client()
+        authorize = client.authorize_security_group_egress if egress_rule \
+            else client.authorize_security_group_ingress
+        direction = 'Egress' if egress_rule else 'Ingress'
+        limiter = util.AdaptiveLimiter(parallelism)
+        wanted = {}
+        for rule in rule_json:
+            wanted.update(EC2SecurityGroupSync.get_rule_entries(rule))
+
+        def create_group_rule(group):
+            start_time = time.perf_counter()
+            current = {}
+            for rule in self.get_rule_json(group, egress_rule):
+                current.update(EC2SecurityGroupSync.get_rule_entries(rule))
+            entries = [entry for entry in wanted if entry not in current]
+            if not entries:
+                sfunc(f'{direction} Rule Already Exists For Group : ' +
+                      f'{group["GroupName"]}')
+                return True, time.perf_counter() - start_time
+
+            permissions = EC2SecurityGroupSync.get_permissions(entries,
+                                                               wanted)
+            sfunc(f'Creating {direction} Rule For Group : ' +
+                  f'{group["GroupName"]}')
+            for attempt in range(max_attempts):
+                limiter.acquire()
+                try:
+                    authorize(GroupId=group['GroupId'],
+                              IpPermissions=permissions)
+                    limiter.release()
+                    return True, time.perf_counter() - start_time
+                except ClientError as client_err:
+                    code = client_err.response['Error']['Code']
+                    throttled = code in ('RequestLimitExceeded',
+                                         'Throttling')
+                    limiter.release(throttled)
+                    if code == 'InvalidPermission.Duplicate':
+                        return True, time.perf_counter() - start_time
+                    if not throttled or attempt == max_attempts - 1:
+                        sfunc(f'Couldnot create {direction} rule for ' +
+                              f'group {group["GroupName"]} : ' +
+                              str(client_err))
+                        return False, time.perf_counter() - start_time
+                time.sleep(util.get_backoff_delay(attempt))
+
+            return False, time.perf_counter() - start_time
+
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) \
+                as executor:
+            results = list(executor.map(create_group_rule, groups))
+
+        if limiter.throttled_count:
+            sfunc(f'{limiter.throttled_count} throttled calls, ' +
+                  f'concurrency ended at {limiter.limit}')
+
+        return results
 
     @staticmethod
     def ignore_field(field, ignore_label='ignore'):
@@ -224,94 +299,70 @@ class EC2SecurityGroupRuleManager():
             return security_group['IpPermissionsEgress']
         return security_group['IpPermissions']
 
-    def match_port(self, rule, port_label, port_field, icmp_field):
-        """Determine if rule matches the specified port values."""
-        if self.ignore_field(port_field) and \
-                self.ignore_field(icmp_field):
-            return True
-
-        if not self.ignore_field(icmp_field) and \
-                'icmp' in rule['IpProtocol'] and \
-                rule.get(port_label) and \
-                rule[port_label] == icmp_field:
-            return True
-
-        if not self.ignore_field(port_field) and \
-                'icmp' not in rule['IpProtocol'] and \
-                rule.get(port_label) and \
-                rule[port_label] == port_field:
-            return True
-
-        return False
-
-    def match_list(self, rule, list_label, key_labels, field_list):
-        """Determine if rule matches the list of value passed in."""
-        if self.ignore_field(field_list):
-            return rule[list_label]
-
-        output_list = []
-        if not self.ignore_field(field_list) and \
-                rule[list_label]:
-            for dict_type in rule[list_label]:
-                for key in key_labels:
-                    if dict_type.get(key) and \
-                            dict_type.get(key) in field_list:
-                        output_list.append(dict_type)
-                        break
-        return output_list
+    def compile_rule_matcher(self, ip_protocol=None,
+                             from_port=None, to_port=None,
+                             ipv4_cidr=None,
+                             ipv6_cidr=None,
+                             security_groups=None,
+                             icmp_type=None, icmp_code=None,
+                             exact_cidr=False, exact_port=False):
+        """Compile the rule match criteria (ignored fields match all).
+
+        security_groups are validated groups ('DescribeSecurityGroups'
+        results). cidr criteria match the blocks they contain, unless
+        'exact_cidr' is set, and ports match the rules whose port range
+        contains them, unless 'exact_port' is set.
+        returns an EC2SecurityGroupRuleMatcher.
+        """
+        def get_field(field, convert=None):
+            if self.ignore_field(field):
+                return None
+            return convert(field) if convert else field
+
+        return EC2SecurityGroupRuleMatcher(
+            get_field(ip_protocol, lambda protocol: [protocol]),
+            from_port, to_port,
+            get_field(ipv4_cidr),
+            get_field(ipv6_cidr),
+            get_field(security_groups,
+                      lambda groups: [group['GroupId'] for group in groups]),
+            get_field(icmp_type), get_field(icmp_code), exact_cidr,
+            exact_port)
 
     def match_rule(self, rule, ip_protocol=None,
                    from_port=None, to_port=None,
                    ipv4_cidr=None,
                    ipv6_cidr=None,
                    security_groups=None,
-                   icmp_type=None, icmp_code=None):
-        """Determine if the input fields matches a rule."""
-        if not rule:
-            return False, None
-
-        match = False
-
-        match = not self.ignore_field(ip_protocol) and \
-            rule.get('IpProtocol') and \
-            rule['IpProtocol'] == ip_protocol
-
-        match = self.match_port(rule, 'FromPort',
-                                from_port, icmp_type)
-
-        match = self.match_port(rule, 'ToPort',
-                                to_port, icmp_code)
+                   icmp_type=None, icmp_code=None, exact_cidr=False,
+                   exact_port=False):
+        """Determine if the input fields matches a rule.
 
-        if not match:
-            return False, None
-
-        ipv4_cidr_list = self.match_list(rule, 'IpRanges',
-                                         ('CidrIp',), ipv4_cidr)
-        ipv6_cidr_list = self.match_list(rule, 'Ipv6Ranges',
-                                         ('CidrIpv6',), ipv6_cidr)
-        sg_list = self.match_list(rule, 'UserIdGroupPairs',
-                                  ('GroupId', 'GroupName'),
-                                  security_groups)
-
-        if not (ipv4_cidr_list or ipv6_cidr_list or sg_list):
-            return False, None
-
-        rule['IpRanges'] = ipv4_cidr_list
-        rule['Ipv6Ranges'] = ipv6_cidr_list
-        rule['UserIdGroupPairs'] = sg_list
-
-        return True, rule
+        returns (True, matching part of the rule) or (False, None).
+        compile_rule_matcher should be used to match many rules.
+        """
+        rule = self.compile_rule_matcher(ip_protocol, from_port, to_port,
+                                         ipv4_cidr, ipv6_cidr,
+                                         security_groups, icmp_type,
+                                         icmp_code, exact_cidr,
+                                         exact_port).match(rule)
+        return rule is not None, rule
 
     def delete_rule(self, groups, egress_rule, ip_protocol=None,
                     from_port=None, to_port=None,
                     ipv4_cidr=None,
                     ipv6_cidr=None,
                     security_groups=None,
-                    icmp_type=None, icmp_code=None, sfunc=None):
+                    icmp_type=None, icmp_code=None, exact_cidr=False,
+                    exact_port=False, sfunc=None):
         """Delete a Rule.
 
         groups can be a (comma separated) string or a collection
-        of groupids, groupnames or a mix of both.
+        of groupids, groupnames or a mix of both. cidr criteria delete
+        the blocks they contain (e.g. 10.0.0.0/8 deletes 10.1.0.0/16),
+        unless 'exact_cidr' is set. ports delete the rules whose port
+        range contains them (e.g. 443 deletes 400-500), unless
+        'exact_port' is set.
         """
         if not groups:
             return False, 'No groups specified'
@@ -356,23 +407,32 @@ class EC2SecurityGroupRuleManager():
         if not sfunc:
             sfunc = default_status
 
+        try:
+            matcher = self.compile_rule_matcher(ip_protocol,
+                                                from_port, to_port,
+                                                ipv4_cidr, ipv6_cidr,
+                                                security_groups,
+                                                icmp_type, icmp_code,
+                                                exact_cidr, exact_port)
+        except ValueError as value_err:
+            return False, f'Invalid icmp type or code : {str(value_err)}'
+
         try:
             sg_dict = defaultdict(lambda: [])
             rule_match_count = 0
             for group in groups:
-                for rule in self.get_rule_json(group, egress_rule):
-                    aok, rule = self.\
-                        match_rule(rule, ip_protocol, from_port, to_port,
-                                   ipv4_cidr, ipv6_cidr, security_groups,
-                                   icmp_type, icmp_code)
-                    if not aok:
-                        continue
-                    rule_match_count += 1
-                    sg_group = \
-                        self.ec2_sg_manager.get_ec2_session().\
-                        get_ec2_resource().\
-                        SecurityGroup(group['GroupId'])
-                    sg_dict[sg_group].append(rule)
+                rules = [rule for rule in map(matcher.match,
+                                              self.get_rule_json(group,
+                                                                 egress_rule))
+                         if rule]
+                if not rules:
+                    continue
+                rule_match_count += len(rules)
+                sg_group = \
+                    self.ec2_sg_manager.get_ec2_session().\
+                    get_ec2_resource().\
+                    SecurityGroup(group['GroupId'])
+                sg_dict[sg_group].extend(rules)
 
             success_count = 0
             failure_count = 0
@@ -387,6 +447,10 @@ class EC2SecurityGroupRuleManager():
                 else:
                     success_count += 1
 
+            if sg_dict:
+                self.ec2_sg_manager.get_ec2_session().\
+                    clear_security_group_cache()
+
             if groups and rule_match_count == 0:
                 noop_msg = 'No Rules Matched Input Criteria'
             else:
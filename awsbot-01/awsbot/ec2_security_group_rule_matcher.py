@@ -0,0 +1,167 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 Security Group Rule Matcher Class."""
+
+from types import MappingProxyType
+
+try:
+    from awsbot.cidr_trie import CidrTrie, parse_cidr
+except ImportError:
+    from cidr_trie import CidrTrie, parse_cidr
+
+
+class EC2SecurityGroupRuleMatcher():
+    """EC2 Security Group Rule Matcher Class.
+
+    Rule match criteria compiled once into a predicate: a protocol set,
+    the port interval (containment matching: a rule matches if its
+    port range contains the interval, e.g. 400-500 contains 443) or
+    exact ports, the icmp type / code, cidr prefix tries
+    (containment matching: a cidr criterion matches the blocks it
+    contains, e.g. 10.0.0.0/8 matches 10.1.0.0/16) or cidr sets (exact
+    matching) and a group id set. a criterion set to None matches
+    anything. matching a rule ('IpPermissions' entry) costs a few set
+    lookups and one trie walk per cidr entry, whatever the number of
+    criteria values.
+    """
+
+    PROTOCOL_NAMES = MappingProxyType({'any': '-1', '6': 'tcp', '17': 'udp',
+                                       '1': 'icmp', '58': 'icmpv6'})
+    ICMP_PROTOCOLS = frozenset({'icmp', 'icmpv6'})
+    IP_PROTOCOLS = frozenset({'-1', 'tcp', 'udp', 'icmp', 'icmpv6'})
+
+    def __init__(self, ip_protocols=None, from_port=None, to_port=None,
+                 ipv4_cidrs=None, ipv6_cidrs=None, group_ids=None,
+                 icmp_type=None, icmp_code=None, exact_cidr=False,
+                 exact_port=False):
+        """Compile the rule match criteria.
+
+        ports and icmp type / code are ints ('any' is an icmp type or
+        code of -1), the other criteria collections of values. a
+        single port is the interval of that port. if 'exact_cidr'
+        ('exact_port') is set, cidr entries (ports) only match the same
+        blocks (ports).
+        """
+        self.protocols = None if ip_protocols is None else \
+            frozenset(self.get_protocol_name(protocol)
+                      for protocol in ip_protocols)
+        self.ports = (from_port, to_port)
+        self.port_interval = (to_port if from_port is None else from_port,
+                              from_port if to_port is None else to_port)
+        self.exact_port = exact_port
+        self.icmp_ports = (self.get_icmp_value(icmp_type),
+                           self.get_icmp_value(icmp_code))
+        self.any_port = from_port is None and to_port is None and \
+            icmp_type is None and icmp_code is None
+        self.exact_cidr = exact_cidr
+        self.ipv4_cidrs = self.compile_cidrs(ipv4_cidrs)
+        self.ipv6_cidrs = self.compile_cidrs(ipv6_cidrs)
+        self.group_ids = None if group_ids is None else frozenset(group_ids)
+        self.any_entry = ipv4_cidrs is None and ipv6_cidrs is None and \
+            group_ids is None
+
+    @classmethod
+    def get_protocol_name(cls, protocol):
+        """Get the name of an ip protocol ('-1' for all protocols)."""
+        protocol = str(protocol).lower()
+        return cls.PROTOCOL_NAMES.get(protocol, protocol)
+
+    @staticmethod
+    def get_icmp_value(value):
+        """Get an icmp type or code as an int (-1 for 'any')."""
+        if value is None:
+            return None
+
+        return -1 if value == 'any' else int(value)
+
+    def compile_cidrs(self, cidrs):
+        """Compile cidr criteria into a trie (or a set if exact)."""
+        if cidrs is None:
+            return None
+
+        if self.exact_cidr:
+            return frozenset(parse_cidr(cidr) for cidr in cidrs)
+
+        return CidrTrie(cidrs)
+
+    def match_cidr(self, cidrs, cidr):
+        """Determine if a cidr entry matches compiled cidr criteria."""
+        if self.exact_cidr:
+            return parse_cidr(cidr) in cidrs
+
+        return cidr in cidrs
+
+    def match_ports(self, rule, protocol):
+        """Determine if rule matches the port (or icmp) criteria.
+
+        the 'FromPort' ('ToPort') of an icmp rule must be the icmp type
+        (code). the port range of any other rule (all ports if it has
+        none) must contain the port interval, or be the same if
+        'exact_port' is set.
+        """
+        if self.any_port:
+            return True
+
+        is_icmp = protocol in self.ICMP_PROTOCOLS
+        if not is_icmp and not self.exact_port:
+            if self.ports == (None, None):
+                return False
+            rule_from, rule_to = rule.get('FromPort'), rule.get('ToPort')
+            if rule_from is None or rule_from == -1:
+                rule_from, rule_to = 0, 65535
+            return rule_from <= self.port_interval[0] and \
+                self.port_interval[1] <= rule_to
+
+        for port_label, port, icmp_port in zip(('FromPort', 'ToPort'),
+                                               self.ports, self.icmp_ports):
+            if port is None and icmp_port is None:
+                continue
+            value = icmp_port if is_icmp else port
+            if value is None or rule.get(port_label) != value:
+                return False
+
+        return True
+
+    def match(self, rule):
+        """Match a rule.
+
+        returns a copy of the rule holding only its matching cidr and
+        group entries (all of them if there is no entry criteria), or
+        None if the rule does not match.
+        """
+        if not rule:
+            return None
+
+        protocol = self.get_protocol_name(rule.get('IpProtocol'))
+        if self.protocols is not None and protocol not in self.protocols:
+            return None
+
+        if not self.match_ports(rule, protocol):
+            return None
+
+        if self.any_entry:
+            if not (rule.get('IpRanges') or rule.get('Ipv6Ranges') or
+                    rule.get('UserIdGroupPairs')):
+                return None
+            return dict(rule)
+
+        ipv4_ranges = [] if self.ipv4_cidrs is None else \
+            [ip_range for ip_range in rule.get('IpRanges', [])
+             if self.match_cidr(self.ipv4_cidrs, ip_range['CidrIp'])]
+        ipv6_ranges = [] if self.ipv6_cidrs is None else \
+            [ip_range for ip_range in rule.get('Ipv6Ranges', [])
+             if self.match_cidr(self.ipv6_cidrs, ip_range['CidrIpv6'])]
+        group_pairs = [] if self.group_ids is None else \
+            [group_pair for group_pair in rule.get('UserIdGroupPairs', [])
+             if group_pair.get('GroupId') in self.group_ids]
+
+        if not (ipv4_ranges or ipv6_ranges or group_pairs):
+            return None
+
+        return dict(rule, IpRanges=ipv4_ranges, Ipv6Ranges=ipv6_ranges,
+                    UserIdGroupPairs=group_pairs, PrefixListIds=[])
+
+
+if __name__ == '__main__':
+    pass
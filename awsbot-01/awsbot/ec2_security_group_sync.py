@@ -0,0 +1,414 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 Security Group Desired State Sync Class."""
+
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+try:
+    from awsbot.ec2_security_group_rule_matcher import \
+        EC2SecurityGroupRuleMatcher
+    from awsbot import util
+except ImportError:
+    from ec2_security_group_rule_matcher import EC2SecurityGroupRuleMatcher
+    import util
+
+
+class EC2SecurityGroupSync():
+    """EC2 Security Group Desired State Sync Class.
+
+    Syncs the rules of security groups with a desired state file
+    (yaml or json) :
+
+        security_groups:
+          <group id or name>:
+            vpc_id: <vpc id>              # optional
+            ingress:                      # optional
+              - ip_protocol: tcp          # tcp, udp, icmp, icmpv6, any
+                port_range: 80-443        # tcp / udp, default any
+                icmp_type: any            # icmp / icmpv6, default any
+                icmp_code: any
+                ipv4_cidr: [10.0.0.0/8]   # lists or comma separated
+                ipv6_cidr: []
+                security_groups: [web]    # group ids or names
+                description: web traffic  # optional
+            egress: [...]                 # optional
+
+    the rules of the groups (and directions) in the file are replaced
+    by the rules of the file, the other groups and directions are left
+    alone. the groups are read with one batched lookup and each group
+    gets at most one authorize and one revoke call a direction, with
+    only the rule entries (cidr blocks and groups) added or removed.
+    """
+
+    DIRECTIONS = (('ingress', 'IpPermissions'),
+                  ('egress', 'IpPermissionsEgress'))
+    SOURCES = (('ipv4_cidr', 'IpRanges', 'CidrIp'),
+               ('ipv6_cidr', 'Ipv6Ranges', 'CidrIpv6'),
+               ('security_groups', 'UserIdGroupPairs', 'GroupId'))
+    RULE_KEYS = frozenset({'ip_protocol', 'port_range', 'icmp_type',
+                           'icmp_code', 'description'} |
+                          {source[0] for source in SOURCES})
+
+    def __init__(self, ec2_sg_manager, parallelism=4):
+        """Initialize the security group sync class."""
+        self.ec2_sg_manager = ec2_sg_manager
+        self.parallelism = max(1, parallelism)
+
+    @staticmethod
+    def get_cidr(cidr, version):
+        """Get the canonical form of a cidr block (None if invalid)."""
+        try:
+            network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+        except ValueError:
+            return None
+
+        return str(network) if network.version == version else None
+
+    @classmethod
+    def get_rule_entries(cls, rule):
+        """Get the entries of a rule ('DescribeSecurityGroups' result).
+
+        an entry is a (protocol, from_port, to_port, source_list_key,
+        source) tuple, the ports being None for rules without ports.
+        returns {entry: description}.
+        """
+        protocol = EC2SecurityGroupRuleMatcher.\
+            get_protocol_name(rule.get('IpProtocol'))
+        from_port = rule.get('FromPort')
+        to_port = rule.get('ToPort')
+        if protocol == '-1':
+            from_port = to_port = None
+
+        entries = {}
+        for _, list_key, source_key in cls.SOURCES:
+            for source in rule.get(list_key, []):
+                value = source[source_key]
+                if list_key == 'IpRanges':
+                    value = cls.get_cidr(value, 4) or value
+                elif list_key == 'Ipv6Ranges':
+                    value = cls.get_cidr(value, 6) or value
+                entries[(protocol, from_port, to_port, list_key, value)] = \
+                    source.get('Description')
+
+        return entries
+
+    @staticmethod
+    def get_rule_ports(rule, protocol):
+        """Get the (from_port, to_port) of a desired rule.
+
+        returns (from_port, to_port, err).
+        """
+        if protocol in EC2SecurityGroupRuleMatcher.ICMP_PROTOCOLS:
+            icmp_value = EC2SecurityGroupRuleMatcher.get_icmp_value
+            try:
+                return icmp_value(str(rule.get('icmp_type', 'any'))), \
+                    icmp_value(str(rule.get('icmp_code', 'any'))), None
+            except ValueError:
+                return None, None, 'Invalid icmp type or code : ' + \
+                    f'{rule.get("icmp_type")}/{rule.get("icmp_code")}'
+
+        if protocol == '-1':
+            return None, None, None
+
+        port_range = str(rule.get('port_range', 'any'))
+        aok, from_port, to_port = util.str_range_to_int(port_range)
+        if not aok:
+            return None, None, f'Invalid port range : {port_range}'
+
+        return from_port, to_port, None
+
+    def get_desired_entries(self, rules, resolve_group):
+        """Get the entries of the desired rules of a group direction.
+
+        'resolve_group' maps a group id or name to a group id.
+        returns ({entry: description}, err).
+        """
+        entries = {}
+        for rule in rules or []:
+            if not isinstance(rule, dict):
+                return None, f'Invalid rule : {rule}'
+
+            unknown_keys = set(rule) - self.RULE_KEYS
+            if unknown_keys:
+                return None, f'Invalid rule keys : {sorted(unknown_keys)}'
+
+            ip_protocol = str(rule.get('ip_protocol', 'any')).lower()
+            protocol = EC2SecurityGroupRuleMatcher.\
+                get_protocol_name(ip_protocol)
+            if protocol not in EC2SecurityGroupRuleMatcher.IP_PROTOCOLS:
+                return None, f'Invalid ip_protocol : {ip_protocol}'
+
+            from_port, to_port, err = self.get_rule_ports(rule, protocol)
+            if err:
+                return None, err
+
+            source_count = 0
+            for rule_key, list_key, _ in self.SOURCES:
+                if not rule.get(rule_key):
+                    continue
+                values, err = util.convert_to_list(rule[rule_key])
+                if err:
+                    return None, err
+                for value in values:
+                    value = str(value).strip()
+                    if list_key == 'UserIdGroupPairs':
+                        source, err = resolve_group(value)
+                    else:
+                        source = self.get_cidr(
+                            value, 4 if list_key == 'IpRanges' else 6)
+                        err = None if source else \
+                            f'Invalid {rule_key} : {value}'
+                    if err:
+                        return None, err
+                    entries[(protocol, from_port, to_port,
+                             list_key, source)] = rule.get('description')
+                    source_count += 1
+
+            if not source_count:
+                return None, f'No cidr blocks or groups in rule : {rule}'
+
+        return entries, None
+
+    @classmethod
+    def get_permissions(cls, entries, descriptions=None):
+        """Get the 'IpPermissions' of entries (one rule per ports)."""
+        permissions = {}
+        source_keys = {list_key: source_key
+                       for _, list_key, source_key in cls.SOURCES}
+        for entry in sorted(entries, key=str):
+            protocol, from_port, to_port, list_key, source = entry
+            permission = permissions.get((protocol, from_port, to_port))
+            if permission is None:
+                permission = {'IpProtocol': protocol}
+                if from_port is not None:
+                    permission['FromPort'] = from_port
+                    permission['ToPort'] = to_port
+                permissions[(protocol, from_port, to_port)] = permission
+            source = {source_keys[list_key]: source}
+            if descriptions and descriptions.get(entry):
+                source['Description'] = descriptions[entry]
+            permission.setdefault(list_key, []).append(source)
+
+        return list(permissions.values())
+
+    @staticmethod
+    def get_entry_label(entry):
+        """Get the printable label of an entry."""
+        protocol, from_port, to_port, _, source = entry
+        if protocol == '-1':
+            return f'Any-Protocol | Any-Port | {source}'
+
+        if protocol in EC2SecurityGroupRuleMatcher.ICMP_PROTOCOLS:
+            ports = ('anytype' if from_port == -1 else f'type-{from_port}') + \
+                ('-anycode' if to_port == -1 else f'-code-{to_port}')
+        elif from_port is None:
+            ports = 'Any-Port'
+        else:
+            ports = f'{from_port}' if from_port == to_port else \
+                f'{from_port}-{to_port}'
+
+        return f'{protocol} | {ports} | {source}'
+
+    def get_group_resolver(self, security_groups):
+        """Get a function resolving group ids and names to group ids.
+
+        the function takes a group id or name (and optionally the vpc
+        the group must belong to) and returns (group, err).
+        """
+        by_id = {}
+        by_name = {}
+        for security_group in security_groups:
+            by_id[security_group['GroupId']] = security_group
+            by_name.setdefault(security_group['GroupName'],
+                               []).append(security_group)
+
+        def resolve(group, vpc_id=None):
+            if group in by_id:
+                candidates = [by_id[group]]
+            else:
+                candidates = by_name.get(group, [])
+            if vpc_id:
+                candidates = [candidate for candidate in candidates
+                              if candidate.get('VpcId') == vpc_id]
+            if not candidates:
+                return None, f'Invalid Group : {group}' + \
+                    (f' (vpc {vpc_id})' if vpc_id else '')
+            if len(candidates) > 1:
+                return None, f'Ambiguous Group Name : {group}, ' + \
+                    'set the vpc_id of the group'
+            return candidates[0], None
+
+        return resolve
+
+    def plan(self, desired_state):
+        """Plan the rule changes syncing the groups with desired_state.
+
+        returns (changes, err), changes being a list of
+        {'group', 'direction', 'add', 'remove', 'descriptions'} dicts
+        (one per group direction to change).
+        """
+        if not isinstance(desired_state, dict) or \
+                not isinstance(desired_state.get('security_groups'), dict):
+            return None, 'Invalid desired state : ' + \
+                'a security_groups mapping is required'
+
+        desired_groups = desired_state['security_groups']
+        if not desired_groups:
+            return [], None
+
+        group_refs = set()
+        for group, group_state in desired_groups.items():
+            if not isinstance(group_state, dict):
+                return None, f'Invalid desired state of group : {group}'
+            group_refs.add(str(group))
+            for direction, _ in self.DIRECTIONS:
+                for rule in group_state.get(direction) or []:
+                    if isinstance(rule, dict) and \
+                            rule.get('security_groups'):
+                        values, err = util.\
+                            convert_to_list(rule['security_groups'])
+                        if err:
+                            return None, err
+                        group_refs.update(str(value).strip()
+                                          for value in values)
+
+        try:
+            resolve = self.get_group_resolver(
+                self.ec2_sg_manager.get_security_groups(group_refs,
+                                                        group_refs))
+        except ClientError as client_err:
+            return None, str(client_err)
+
+        changes = []
+        for group, group_state in desired_groups.items():
+            security_group, err = resolve(str(group),
+                                          group_state.get('vpc_id'))
+            if err:
+                return None, err
+
+            def resolve_group(group_ref, vpc_id=security_group['VpcId']):
+                group_ref, err = resolve(group_ref, vpc_id)
+                return (group_ref['GroupId'] if group_ref else None), err
+
+            for direction, rules_key in self.DIRECTIONS:
+                if direction not in group_state:
+                    continue
+                desired, err = self.\
+                    get_desired_entries(group_state[direction],
+                                        resolve_group)
+                if err:
+                    return None, f'{group} {direction} : {err}'
+                current = {}
+                for rule in security_group.get(rules_key, []):
+                    current.update(self.get_rule_entries(rule))
+                add = set(desired) - set(current)
+                remove = set(current) - set(desired)
+                if add or remove:
+                    changes.append({'group': security_group,
+                                    'direction': direction,
+                                    'add': sorted(add, key=str),
+                                    'remove': sorted(remove, key=str),
+                                    'descriptions': desired})
+
+        return changes, None
+
+    def apply_group_changes(self, group_changes, sfunc):
+        """Apply the changes of one group.
+
+        each direction gets one authorize call (for the added entries)
+        and one revoke call (for the removed entries). entries are
+        added before the stale ones are removed.
+        returns (aok, err).
+        """
+        client = self.ec2_sg_manager.get_ec2_session().get_ec2_client()
+        calls = {'ingress': (client.authorize_security_group_ingress,
+                             client.revoke_security_group_ingress),
+                 'egress': (client.authorize_security_group_egress,
+                            client.revoke_security_group_egress)}
+
+        group_id = group_changes[0]['group']['GroupId']
+        try:
+            for change in group_changes:
+                authorize, revoke = calls[change['direction']]
+                if change['add']:
+                    authorize(GroupId=group_id,
+                              IpPermissions=self.get_permissions(
+                                  change['add'], change['descriptions']))
+                if change['remove']:
+                    revoke(GroupId=group_id,
+                           IpPermissions=self.get_permissions(
+                               change['remove']))
+                sfunc(f'Synced {change["direction"]} rules of group : ' +
+                      f'{group_id} (+{len(change["add"])} ' +
+                      f'-{len(change["remove"])})')
+            return True, None
+        except ClientError as client_err:
+            return False, f'Couldnot sync group {group_id} : ' + \
+                str(client_err)
+
+    def apply(self, desired_state_file, dry_run=False,
+              pfunc=None, sfunc=None):
+        """Sync the security groups with a desired state file.
+
+        the planned changes are printed, and applied (one thread per
+        group, up to 'parallelism' threads) unless 'dry_run' is set.
+        """
+        def default_print(action, change, entry):
+            print(f'{action} | {change["group"]["GroupId"]} | ' +
+                  f'{change["group"]["GroupName"]} | ' +
+                  f'{change["direction"]} | {self.get_entry_label(entry)}')
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not pfunc:
+            pfunc = default_print
+
+        if not sfunc:
+            sfunc = default_status
+
+        desired_state, err = util.load_yaml_or_json_file(desired_state_file)
+        if err:
+            return False, err
+
+        changes, err = self.plan(desired_state)
+        if err:
+            return False, err
+
+        by_group = {}
+        for change in changes:
+            for entry in change['add']:
+                pfunc('+', change, entry)
+            for entry in change['remove']:
+                pfunc('-', change, entry)
+            by_group.setdefault(change['group']['GroupId'],
+                                []).append(change)
+
+        summary = f'{sum(len(change["add"]) for change in changes)} ' + \
+            'rule entries to add, ' + \
+            f'{sum(len(change["remove"]) for change in changes)} ' + \
+            f'to remove in {len(by_group)} groups'
+        if dry_run or not changes:
+            return True, summary if changes else 'No Changes Needed'
+
+        sfunc(summary)
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            results = list(executor.map(
+                lambda group_changes: self.apply_group_changes(
+                    group_changes, sfunc), by_group.values()))
+
+        self.ec2_sg_manager.get_ec2_session().clear_security_group_cache()
+        for _, err in results:
+            if err:
+                sfunc(err)
+
+        return self.ec2_sg_manager.get_ec2_session().\
+            get_status(sum(1 for aok, _ in results if aok),
+                       sum(1 for aok, _ in results if not aok))
+
+
+if __name__ == '__main__':
+    pass
@@ -4,13 +4,21 @@
 """EC2 Session Manager Class."""
 
 import sys
+import base64
 import datetime
+from types import MappingProxyType
 
 from botocore.exceptions import ClientError
 
 try:
+    from awsbot.ec2_instance_record import EC2InstanceRecord
+    from awsbot.ec2_volume_record import EC2VolumeRecord
+    from awsbot.ec2_snapshot_record import EC2SnapshotRecord
     from awsbot import util
 except ImportError:
+    from ec2_instance_record import EC2InstanceRecord
+    from ec2_volume_record import EC2VolumeRecord
+    from ec2_snapshot_record import EC2SnapshotRecord
     import util
 
 
@@ -21,10 +29,24 @@ class EC2SessionManager():
     USER_DATA_MIME_HEADER = None
     INSTANCE_STATES = frozenset({'pending', 'running', 'shutting-down',
                                  'terminated', 'stopping', 'stopped'})
+    INSTANCE_BATCH_SIZE = 100
+    INSTANCE_PAGE_SIZE = 1000
+    VOLUME_PAGE_SIZE = 500
+    VOLUME_BATCH_SIZE = 100
+    SNAPSHOT_PAGE_SIZE = 1000
+    IMAGE_BATCH_SIZE = 100
+    IMAGE_CACHE_NAME = 'ec2-images'
+    INSTANCE_STATE_ACTIONS = MappingProxyType({
+        'start': ('start_instances', 'StartingInstances', 'Starting'),
+        'stop': ('stop_instances', 'StoppingInstances', 'Stopping'),
+        'terminate': ('terminate_instances', 'TerminatingInstances',
+                      'Terminating')})
 
     def __init__(self, session):
         """Initialize the EC2 Session MAnager class."""
         self.session = session
+        self.image_cache = None
+        self.security_group_cache = None
         EC2SessionManager.USER_DATA_MIME_HEADER, err = \
             util.get_file_as_string(self.USER_DATA_MIME_HEADER_FILE)
         if err:
@@ -45,6 +67,7 @@ class EC2SessionManager():
     def set_session(self, session):
         """Set session."""
         self.session = session
+        self.image_cache = None
 
     def get_ec2_paginator(self, name):
         """Get ec2 paginator."""
@@ -62,24 +85,11 @@ class EC2SessionManager():
         return self.\
             get_ec2_paginator('describe_iam_instance_profile_associations')[0]
 
-    def get_instances(self, instance_ids=None, project_name=None,
-                      states=None, include_states=None):
-        """Get instances associated with resource.
-
-        Conditionally filter by project name
-        and/or instanceIds
+    def get_instance_params(self, instance_ids=None, project_name=None,
+                            states=None, include_states=None):
+        """Get the 'DescribeInstances' parameters selecting instances.
 
-        Also filter by interesting states.
-        include_states = None => list all instances
-                                 regardless of state.
-        include_states = True => list all instances
-                                 whose state matches
-                                 any state in the states
-                                 variable.
-        include_states = False => list all instances
-                                  whose state doesnot match
-                                  any state in the states
-                                  variable.
+        see get_instances for the meaning of the arguments.
         """
         params_dict = {}
 
@@ -87,7 +97,7 @@ class EC2SessionManager():
             params_dict['InstanceIds'], err = \
                 util.str_to_list(instance_ids, remove_duplicates=True)
             if err:
-                return None
+                return None, err
 
         if project_name:
             params_dict['Filters'] = \
@@ -96,7 +106,7 @@ class EC2SessionManager():
         if states and include_states is not None:
             states, err = util.str_to_set(states)
             if err:
-                return None
+                return None, err
             if not include_states:
                 states = self.INSTANCE_STATES - states
             filters = params_dict.get('Filters', [])
@@ -104,172 +114,208 @@ class EC2SessionManager():
                             'Values': list(states)})
             params_dict['Filters'] = filters
 
+        return params_dict, None
+
+    def get_instances(self, instance_ids=None, project_name=None,
+                      states=None, include_states=None):
+        """Get instances associated with resource.
+
+        Conditionally filter by project name
+        and/or instanceIds
+
+        Also filter by interesting states.
+        include_states = None => list all instances
+                                 regardless of state.
+        include_states = True => list all instances
+                                 whose state matches
+                                 any state in the states
+                                 variable.
+        include_states = False => list all instances
+                                  whose state doesnot match
+                                  any state in the states
+                                  variable.
+        """
+        params_dict, err = self.get_instance_params(instance_ids,
+                                                    project_name,
+                                                    states, include_states)
+        if err:
+            return None
+
         if not params_dict:
             return list(self.get_ec2_resource().instances.all())
 
         return list(self.get_ec2_resource().instances.filter(**params_dict))
 
-    def get_volumes(self, instance_ids=None, project_name=None):
-        """Iterate over volumes associated with instances."""
-        for inst in self.get_instances(instance_ids, project_name,
-                                       states='terminated',
-                                       include_states=False):
-            for volume in inst.volumes.all():
-                yield inst, volume
+    def get_instance_record_pages(self, instance_ids=None, project_name=None,
+                                  states=None, include_states=None,
+                                  page_size=INSTANCE_PAGE_SIZE):
+        """Iterate over pages of EC2InstanceRecords.
+
+        selects the same instances as get_instances, but pages
+        'DescribeInstances' on the client (up to 'page_size' instances
+        a page, filtered by the server) and yields a list of
+        lightweight EC2InstanceRecords per page instead of loading
+        boto3 Instance resources, so memory stays flat however large
+        the fleet.
+        """
+        params_dict, err = self.get_instance_params(instance_ids,
+                                                    project_name,
+                                                    states, include_states)
+        if err:
+            return
+
+        # 'MaxResults' cannot be combined with 'InstanceIds'.
+        if 'InstanceIds' not in params_dict:
+            params_dict['MaxResults'] = max(5, min(page_size, 1000))
+
+        paginator = self.get_ec2_paginator('describe_instances')[0]
+        for page in paginator.paginate(**params_dict):
+            yield [EC2InstanceRecord(inst)
+                   for reservation in page['Reservations']
+                   for inst in reservation['Instances']]
+
+    def get_instance_records(self, instance_ids=None, project_name=None,
+                             states=None, include_states=None,
+                             page_size=INSTANCE_PAGE_SIZE):
+        """Iterate over EC2InstanceRecords (see get_instance_record_pages)."""
+        for page in self.get_instance_record_pages(instance_ids,
+                                                   project_name, states,
+                                                   include_states,
+                                                   page_size):
+            for record in page:
+                yield record
+
+    def get_volume_records(self, instance_ids=None, project_name=None,
+                           unattached=False):
+        """Iterate over (instance, volume) records of the selected instances.
+
+        the selected instances are indexed by id and their volumes are
+        read with paginated 'DescribeVolumes' calls, filtered by
+        'attachment.instance-id' (INSTANCE_BATCH_SIZE instances a
+        call), then joined to the instances in memory. the number of
+        calls depends on the number of pages, not of instances.
+
+        if 'unattached' is set, volumes that are not attached to any
+        instance (tagged with project_name, if set) are also yielded
+        as (None, volume).
+        """
+        instances = {inst.id: inst for inst in
+                     self.get_instance_records(instance_ids, project_name,
+                                               states='terminated',
+                                               include_states=False)}
+        paginator = self.get_ec2_paginator('describe_volumes')[0]
+
+        for batch in util.get_batches(instances, self.INSTANCE_BATCH_SIZE):
+            for page in paginator.paginate(
+                    Filters=[{'Name': 'attachment.instance-id',
+                              'Values': batch}],
+                    MaxResults=self.VOLUME_PAGE_SIZE):
+                for volume in page['Volumes']:
+                    volume = EC2VolumeRecord(volume)
+                    for instance_id in volume.get_instance_ids():
+                        if instance_id in instances:
+                            yield instances[instance_id], volume
+
+        if not unattached or instance_ids:
+            return
+
+        filters = [{'Name': 'status', 'Values': ['available']}]
+        if project_name:
+            filters.append({'Name': 'tag:Project', 'Values': [project_name]})
+        for page in paginator.paginate(Filters=filters,
+                                       MaxResults=self.VOLUME_PAGE_SIZE):
+            for volume in page['Volumes']:
+                yield None, EC2VolumeRecord(volume)
+
+    def get_snapshot_index(self, volume_ids):
+        """Get the snapshots of volumes, indexed by volume id.
+
+        the snapshots are read in one pass of paginated
+        'DescribeSnapshots' calls (owned by this account, filtered by
+        'volume-id', VOLUME_BATCH_SIZE volumes a call).
+        if volume_ids is None, all the snapshots owned by this account
+        are read (including those of deleted volumes).
+        returns {volume_id: [EC2SnapshotRecord]}, newest first.
+        """
+        paginator = self.get_ec2_paginator('describe_snapshots')[0]
+        if volume_ids is None:
+            filters = [[]]
+        else:
+            filters = [[{'Name': 'volume-id', 'Values': batch}]
+                       for batch in util.get_batches(sorted(volume_ids),
+                                                     self.VOLUME_BATCH_SIZE)]
+        index = {}
+        for batch_filters in filters:
+            for page in paginator.paginate(
+                    OwnerIds=['self'], Filters=batch_filters,
+                    MaxResults=self.SNAPSHOT_PAGE_SIZE):
+                for snapshot in page['Snapshots']:
+                    snapshot = EC2SnapshotRecord(snapshot)
+                    index.setdefault(snapshot.volume_id, []).append(snapshot)
+
+        for snapshots in index.values():
+            snapshots.sort(key=lambda snapshot: snapshot.start_time,
+                           reverse=True)
+
+        return index
+
+    def get_image_snapshot_ids(self):
+        """Get the ids of the snapshots backing the images of this account.
+
+        the images owned by this account are read with paginated
+        'DescribeImages' calls.
+        """
+        paginator = self.get_ec2_paginator('describe_images')[0]
+        return {mapping['Ebs']['SnapshotId']
+                for page in paginator.paginate(Owners=['self'])
+                for image in page['Images']
+                for mapping in image.get('BlockDeviceMappings', [])
+                if mapping.get('Ebs', {}).get('SnapshotId')}
 
     def get_volume_snapshots(self, instance_ids=None, project_name=None):
-        """Iterate over snapshots associated with instances and volumes."""
-        for inst, volume in self.get_volumes(instance_ids, project_name):
-            for snapshot in volume.snapshots.all():
-                yield inst, volume, snapshot
+        """Iterate over snapshots associated with instances and volumes.
+
+        yields (instance, volume, snapshots) records, 'snapshots' being
+        the list of snapshots of the volume, newest first.
+        the snapshots of all the volumes are read at once, see
+        get_snapshot_index.
+        """
+        volumes = list(self.get_volume_records(instance_ids, project_name))
+        index = self.get_snapshot_index({volume.id for _, volume in volumes})
+        for inst, volume in volumes:
+            yield inst, volume, index.get(volume.id, [])
 
     @staticmethod
     def get_instance_tags(instance):
         """Get tags associated with ec2 instance."""
         return {tag['Key']: tag['Value'] for tag in instance.tags or []}
 
-    @staticmethod
-    def stop_instance(instance, wait=True, sfunc=None):
-        """Stop ec2 instance."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            sfunc(f'Stopping {instance.id}...')
-
-            instance.stop()
-
-            if wait:
-                instance.wait_until_stopped()
-
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot stop {instance.id} : {str(client_err)}'
-
-    @staticmethod
-    def start_instance(instance, wait=True, sfunc=None):
-        """Start ec2 instance."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            if sfunc:
-                sfunc(f'Starting {instance.id}...')
-
-            instance.start()
-
-            if wait:
-                instance.wait_until_running()
-
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot start {instance.id} : {str(client_err)}'
-
-    @staticmethod
-    def terminate_instance(instance, wait=True, sfunc=None):
-        """Terminate ec2 instance."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            sfunc(f'Terminating {instance.id}...')
-
-            instance.terminate()
-
-            if wait:
-                instance.wait_until_terminated()
-
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot terminate {instance.id} : {str(client_err)}'
-
-    @staticmethod
-    def modify_instance_security_groups(instance,
-                                        security_group_id_list=None,
-                                        sfunc=None):
-        """Modify ec2 instance security groups."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            if security_group_id_list:
-                sfunc(f'Modifying {instance.id}...' +
-                      f'Groups={security_group_id_list}')
-                instance.modify_attribute(Groups=security_group_id_list)
-
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot modify instance {instance.id} : {str(client_err)}'
-
-    @staticmethod
-    def modify_instance_src_dest_check_flag(instance,
-                                            src_dest_check_flag=None,
-                                            sfunc=None):
-        """Modify ec2 instance src dest check flag."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
+    def change_instance_state_batch(self, action, instance_ids):
+        """Start, stop or terminate a batch of ec2 instances in one call.
 
+        returns the set of instance ids found in the response.
+        """
+        method_name, result_label, _ = self.INSTANCE_STATE_ACTIONS[action]
         try:
-            if src_dest_check_flag is not None:
-                sfunc(f'Modifying {instance.id}...' +
-                      f'SourceDestCheck={src_dest_check_flag}')
-                instance.modify_attribute(
-                    SourceDestCheck={'Value': src_dest_check_flag})
-
-            return True, None
+            response = getattr(self.get_ec2_client(), method_name)(
+                InstanceIds=instance_ids)
+            return {inst['InstanceId']
+                    for inst in response.get(result_label, [])}, None
         except ClientError as client_err:
-            return False, \
-                f'couldnot modify instance {instance.id} : {str(client_err)}'
+            return None, str(client_err)
 
-    @staticmethod
-    def modify_instance_name(instance, instance_name=None, sfunc=None):
-        """Modify ec2 instance name."""
+    def change_instance_states(self, action, instance_ids, sfunc=None):
+        """Start, stop or terminate ec2 instances.
 
-        def default_status(status_str):
-            print(status_str)
+        'action' is one of 'start', 'stop' or 'terminate'. the instance
+        ids are sent INSTANCE_BATCH_SIZE at a time in a single
+        'StartInstances', 'StopInstances' or 'TerminateInstances' call
+        and the result of each instance is read from the response. if
+        a batch call fails, its instances are retried one at a time so
+        one bad instance does not fail the rest of the batch.
 
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            if instance_name:
-                instance.create_tags(
-                    Tags=[{'Key': 'Name',
-                           'Value': instance_name}])
-
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot modify instance {instance.id} : {str(client_err)}'
-
-    @staticmethod
-    def modify_instance_user_data(instance, user_data=None,
-                                  base64_encode=False, sfunc=None):
-        """Modify ec2 instance user data."""
+        returns the (changed, failed) lists of instance ids.
+        """
 
         def default_status(status_str):
             print(status_str)
@@ -277,136 +323,55 @@ class EC2SessionManager():
         if not sfunc:
             sfunc = default_status
 
-        try:
-            if user_data:
-                stopped = False
-                if EC2SessionManager.is_instance_running(instance):
-                    aok, err = \
-                        EC2SessionManager.stop_instance(instance, sfunc=sfunc)
-                    if aok:
-                        stopped = True
-                    else:
-                        return False, err
-
-                user_data_bytes = EC2SessionManager.\
-                    USER_DATA_MIME_HEADER + user_data
-                if base64_encode:
-                    user_data_bytes = \
-                        util.get_base64_encoding(user_data_bytes)
-                sfunc(f'Modifying {instance.id}...' +
-                      f'UserData={user_data}')
-                instance.modify_attribute(
-                    UserData={'Value': user_data_bytes})
-
-                if stopped:
-                    aok, err = \
-                        EC2SessionManager.start_instance(instance, sfunc=sfunc)
+        _, _, status_label = self.INSTANCE_STATE_ACTIONS[action]
+        changed_ids = []
+        failed_ids = []
+        for batch in util.get_batches(instance_ids, self.INSTANCE_BATCH_SIZE):
+            for instance_id in batch:
+                sfunc(f'{status_label} {instance_id}...')
+
+            errors = {}
+            changed, err = self.change_instance_state_batch(action, batch)
+            changed = changed or set()
+            if err and len(batch) == 1:
+                errors[batch[0]] = err
+            elif err:
+                for instance_id in batch:
+                    instance_changed, err = self.\
+                        change_instance_state_batch(action, [instance_id])
                     if err:
-                        return False, err
-            return True, None
-        except ClientError as client_err:
-            return False, \
-                f'couldnot modify instance {instance.id} : {str(client_err)}'
-
-    def modify_instance_iam_role(self, instance,
-                                 iam_instance_profile_arn=None,
-                                 attach_iam_role=None, sfunc=None):
-        """Modify ec2 instance iam role."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        try:
-            assoc_id = None
-            iam_role_arn = None
-            attach_role = False
-            detach_role = False
-            reattach_orig = False
-
-            for assoc in self.get_ec2_iam_roles(instance.id):
-                assoc_id = assoc['AssociationId']
-                iam_role_arn = assoc['IamInstanceProfile']['Arn']
-
-            if attach_iam_role and iam_instance_profile_arn and \
-                    iam_instance_profile_arn != iam_role_arn:
-                attach_role = True
-                if assoc_id:
-                    detach_role = True
-            elif attach_iam_role is False:
-                detach_role = True
-
-            if detach_role:
-                self.get_ec2_client().\
-                    disassociate_iam_instance_profile(
-                        AssociationId=assoc_id)
-                reattach_orig = True
-
-            if attach_role:
-                self.get_ec2_client().\
-                    associate_iam_instance_profile(
-                        InstanceId=instance.id,
-                        IamInstanceProfile={'Arn': iam_instance_profile_arn})
-
-            return True, None
-        except ClientError as client_err:
-            if reattach_orig:
-                self.get_ec2_client().\
-                    associate_iam_instance_profile(
-                        InstanceId=instance.id,
-                        IamInstanceProfile={'Arn': iam_role_arn})
-            return False, \
-                f'couldnot modify instance {instance.id} : {str(client_err)}'
-
-    def modify_instance(self, instance, security_group_id_list=None,
-                        src_dest_check_flag=None, user_data=None,
-                        instance_name=None,
-                        iam_instance_profile_arn=None,
-                        attach_iam_role=None,
-                        base64_encode=False,
-                        sfunc=None):
-        """Modify ec2 instance."""
-
-        def default_status(status_str):
-            print(status_str)
-
-        if not sfunc:
-            sfunc = default_status
-
-        err_list = []
-        _, err = self.modify_instance_security_groups(instance,
-                                                      security_group_id_list,
-                                                      sfunc)
-        if err:
-            err_list.append(err)
-
-        _, err = self.modify_instance_src_dest_check_flag(instance,
-                                                          src_dest_check_flag,
-                                                          sfunc)
-        if err:
-            err_list.append(err)
+                        errors[instance_id] = err
+                    else:
+                        changed |= instance_changed
 
-        _, err = self.modify_instance_name(instance, instance_name, sfunc)
-        if err:
-            err_list.append(err)
+            for instance_id in batch:
+                if instance_id in changed:
+                    changed_ids.append(instance_id)
+                else:
+                    sfunc(f'couldnot {action} {instance_id} : ' +
+                          errors.get(instance_id, 'not in the response'))
+                    failed_ids.append(instance_id)
 
-        _, err = self.modify_instance_user_data(instance, user_data,
-                                                base64_encode, sfunc)
-        if err:
-            err_list.append(err)
+        return changed_ids, failed_ids
 
-        _, err = self.modify_instance_iam_role(instance,
-                                               iam_instance_profile_arn,
-                                               attach_iam_role, sfunc)
-        if err:
-            err_list.append(err)
+    def get_instance_states(self, instance_ids):
+        """Get the current state of ec2 instances.
 
-        if err_list:
-            return False, ' | '.join(err_list)
+        the states are read with one 'DescribeInstances' call (filtered
+        by instance id) per INSTANCE_BATCH_SIZE instances.
+        returns {instance_id: state}, instances that are not found are
+        left out.
+        """
+        paginator = self.get_ec2_paginator('describe_instances')[0]
+        states = {}
+        for batch in util.get_batches(instance_ids, self.INSTANCE_BATCH_SIZE):
+            for page in paginator.paginate(
+                    Filters=[{'Name': 'instance-id', 'Values': batch}]):
+                for reservation in page['Reservations']:
+                    for inst in reservation['Instances']:
+                        states[inst['InstanceId']] = inst['State']['Name']
 
-        return True, None
+        return states
 
     @staticmethod
     def is_instance_running(instance):
@@ -417,39 +382,36 @@ class EC2SessionManager():
         return False
 
     @staticmethod
-    def has_pending_volume_snapshots(volume):
-        """Check if there are any pending snapshots for this volume."""
-        snapshots = list(volume.snapshots.all())
-        return snapshots and snapshots[0] == 'pending'
+    def has_pending_volume_snapshots(snapshots):
+        """Check if there are any pending snapshots in a volume snapshots."""
+        return any(snapshot.state == 'pending' for snapshot in snapshots)
 
     @staticmethod
-    def get_snapshot(volume):
-        """Get latest snapshot associated with volume."""
-        if volume is None:
-            return None
-
-        for snapshot in volume.snapshots.all():
+    def get_snapshot(snapshots):
+        """Get latest completed snapshot in a volume snapshots."""
+        for snapshot in snapshots or []:
             if snapshot.state == 'completed':
                 return snapshot
 
         return None
 
-    def can_create_volume_snapshot(self, volume, age):
+    def can_create_volume_snapshot(self, snapshots, age):
         """Check to see if a volume shanpshot can be created.
 
-        Checks to see if number of days since snapshot
-        was created is > age
+        Checks to see if number of days since the latest
+        completed snapshot (in the volume snapshots, newest
+        first) was created is > age
         """
         if age is None:
             return True
 
-        snapshot = self.get_snapshot(volume)
+        snapshot = self.get_snapshot(snapshots)
 
         if snapshot is None:
             return True
 
-        created_time = snapshot.start_time.now()
-        current_time = datetime.datetime.now()
+        created_time = snapshot.start_time
+        current_time = datetime.datetime.now(datetime.timezone.utc)
         diff = current_time - created_time
 
         if diff.days > age:
@@ -486,41 +448,135 @@ class EC2SessionManager():
         return f'{key} created by awsbot on ' + \
                f'{util.get_utcnow_with_tzinfo()}'
 
+    def get_image_cache(self):
+        """Get the image cache.
+
+        {'names': {image_id: name}, 'ids': {name: image_id}} shared by
+        get_image_names, get_image_name_from_id and
+        get_image_id_from_name. loaded from the session disk cache
+        (if enabled) on first use.
+        """
+        if self.image_cache is None:
+            cache = self.session.load_disk_cache(self.IMAGE_CACHE_NAME)
+            self.image_cache = {'names': dict(cache.get('names', {})),
+                                'ids': dict(cache.get('ids', {}))}
+
+        return self.image_cache
+
+    def add_images_to_cache(self, images):
+        """Add images ('DescribeImages' results) to the image cache."""
+        cache = self.get_image_cache()
+        for image in images:
+            cache['names'][image['ImageId']] = image.get('Name')
+
+    def get_image_names(self, image_ids):
+        """Get the names of EC2 Images.
+
+        image ids that are not cached are resolved with one
+        'DescribeImages' call per IMAGE_BATCH_SIZE distinct ids.
+        returns {image_id: name}, name is None if the image is not found.
+        """
+        image_ids = [image_id for image_id in image_ids if image_id]
+        names = self.get_image_cache()['names']
+        missing = sorted({image_id for image_id in image_ids
+                          if image_id not in names})
+        if missing:
+            for batch in util.get_batches(missing, self.IMAGE_BATCH_SIZE):
+                self.add_images_to_cache(
+                    self.get_ec2_client().describe_images(
+                        Filters=[{'Name': 'image-id',
+                                  'Values': batch}])['Images'])
+            for image_id in missing:
+                names.setdefault(image_id, None)
+            self.session.save_disk_cache(self.IMAGE_CACHE_NAME,
+                                         self.image_cache)
+
+        return {image_id: names[image_id] for image_id in image_ids}
+
     def get_image_id_from_name(self, image_name):
         """Get EC2 Image Id from Image name."""
         if not image_name:
             return None
 
-        image_filter = [{
-            'Name': 'name',
-            'Values': [image_name]
-        }]
-
-        images = list(self.get_ec2_resource().
-                      images.filter(Filters=image_filter))
+        image_ids = self.get_image_cache()['ids']
+        if image_name not in image_ids:
+            images = self.get_ec2_client().describe_images(
+                Filters=[{'Name': 'name', 'Values': [image_name]}])['Images']
+            if not images:
+                return None
 
-        if not images:
-            return None
+            self.add_images_to_cache(images)
+            image_ids[image_name] = images[0]['ImageId']
+            self.session.save_disk_cache(self.IMAGE_CACHE_NAME,
+                                         self.image_cache)
 
-        return images[0].id
+        return image_ids[image_name]
 
     def get_image_name_from_id(self, image_id):
         """Get EC2 Image name from Image id."""
         if not image_id:
             return None
 
-        image_filter = [{
-            'Name': 'image-id',
-            'Values': [image_id]
-        }]
+        return self.get_image_names([image_id])[image_id]
 
-        images = list(self.get_ec2_resource().
-                      images.filter(Filters=image_filter))
+    def get_security_group_cache(self):
+        """Get the security group cache.
 
-        if not images:
+        {'ids': {group_id: group}, 'names': {(vpc_id, name): group_id},
+        'queried': {group id or name looked up}} shared by the security
+        group lookups of the session, so repeated lookups of the same
+        groups cost no extra 'DescribeSecurityGroups' calls.
+        """
+        if self.security_group_cache is None:
+            self.security_group_cache = {'ids': {}, 'names': {},
+                                         'queried': set()}
+
+        return self.security_group_cache
+
+    def add_security_groups_to_cache(self, security_groups):
+        """Add security groups ('DescribeSecurityGroups' results)."""
+        cache = self.get_security_group_cache()
+        for security_group in security_groups:
+            cache['ids'][security_group['GroupId']] = security_group
+            cache['names'][(security_group.get('VpcId'),
+                            security_group['GroupName'])] = \
+                security_group['GroupId']
+
+    def clear_security_group_cache(self):
+        """Clear the security group cache (after groups or rules change)."""
+        self.security_group_cache = None
+
+    def get_iam_role_associations(self, instance_ids):
+        """Get the iam instance profile associations of instances.
+
+        the associations are read in batched
+        'DescribeIamInstanceProfileAssociations' calls (filtered by
+        'instance-id', INSTANCE_BATCH_SIZE instances a call).
+        returns {instance_id: association} of the associated instances.
+        """
+        paginator = \
+            self.get_describe_iam_instance_profile_associations_paginator()
+        associations = {}
+        for batch in util.get_batches(sorted(instance_ids),
+                                      self.INSTANCE_BATCH_SIZE):
+            for page in paginator.paginate(
+                    Filters=[{'Name': 'instance-id', 'Values': batch},
+                             {'Name': 'state', 'Values': ['associated']}]):
+                for assoc in page['IamInstanceProfileAssociations']:
+                    associations[assoc['InstanceId']] = assoc
+
+        return associations
+
+    def get_instance_user_data(self, instance_id):
+        """Get the (decoded) user data of an ec2 instance."""
+        response = self.get_ec2_client().\
+            describe_instance_attribute(InstanceId=instance_id,
+                                        Attribute='userData')
+        user_data = response.get('UserData', {}).get('Value')
+        if not user_data:
             return None
 
-        return images[0].name
+        return base64.b64decode(user_data).decode('utf-8', 'replace')
 
     def get_ec2_iam_roles(self, instance_ids=None):
         """Iterate over iam roles."""
@@ -4,12 +4,26 @@
 
 """EC2 snapshot Manager Class."""
 
+import datetime
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
+try:
+    from awsbot.ec2_instance_scheduler import EC2InstanceScheduler
+    from awsbot.ec2_snapshot_retention import EC2SnapshotRetention
+    from awsbot import util
+except ImportError:
+    from ec2_instance_scheduler import EC2InstanceScheduler
+    from ec2_snapshot_retention import EC2SnapshotRetention
+    import util
+
 
 class EC2SnapshotManager():
     """EC2 snapshot Manager Class."""
 
+    # volume id of the copied and imported snapshots
+    UNKNOWN_VOLUME_ID = 'vol-ffffffff'
+
     def __init__(self, ec2_session):
         """Initialize the EC2 snapshot Manager Class."""
         self.ec2_session = ec2_session
@@ -33,25 +47,137 @@ class EC2SnapshotManager():
             pfunc = default_print
 
         try:
-            skip_volume = None
-            for inst, volume, snapshot in self.ec2_session.\
+            for inst, volume, snapshots in self.ec2_session.\
                     get_volume_snapshots(instance_ids, project_name):
-                if skip_volume and skip_volume == volume:
-                    continue
-                if skip_volume != volume:
-                    skip_volume = None
-                pfunc(inst, volume, snapshot)
-                if(snapshot.state == 'completed' and not list_all):
-                    skip_volume = volume
+                for snapshot in snapshots:
+                    pfunc(inst, volume, snapshot)
+                    if snapshot.state == 'completed' and not list_all:
+                        break
 
             return True, None
         except ClientError as client_err:
             return False, str(client_err)
 
+    def plan_volume_snapshots(self, instance_ids=None, project_name=None,
+                              age=None, sfunc=None):
+        """Group the volumes to snapshot per instance.
+
+        returns [(instance, volumes, skipped_volumes)], where volumes
+        need a snapshot and skipped_volumes have a pending snapshot or
+        a snapshot younger than 'age' days.
+        """
+        plan = {}
+        for instance, volume, snapshots in self.ec2_session.\
+                get_volume_snapshots(instance_ids, project_name):
+            _, volumes, skipped = plan.setdefault(instance.id,
+                                                  (instance, [], []))
+            if self.ec2_session.has_pending_volume_snapshots(snapshots):
+                sfunc(f'skipping {volume.id}, '
+                      'snapshot already in progress')
+                skipped.append(volume)
+            elif not self.ec2_session.\
+                    can_create_volume_snapshot(snapshots, age):
+                sfunc('skipping snapshot creation for '
+                      f'{instance.id}-{volume.id}...snapshot already '
+                      f'created in < than {age} days')
+                skipped.append(volume)
+            else:
+                volumes.append(volume)
+
+        return [group for group in plan.values() if group[1]]
+
+    def create_instance_snapshots(self, instance, volumes,
+                                  stop=True, comment=None, sfunc=None):
+        """Snapshot volumes of an instance, in one stop window.
+
+        if 'stop' is set and the instance is running, it is stopped
+        before the first snapshot and started after the last one.
+        returns (created_count, failure_count)
+        """
+        scheduler = EC2InstanceScheduler(self.ec2_session)
+        stopped = False
+        if stop and self.ec2_session.is_instance_running(instance):
+            changed, _ = scheduler.change_instance_states('stop',
+                                                          [instance.id],
+                                                          True, sfunc)
+            if not changed:
+                return 0, len(volumes)
+            stopped = True
+
+        created_count = 0
+        for volume in volumes:
+            try:
+                sfunc(f'creating snapshot...({instance.id}, {volume.id})')
+                self.ec2_session.get_ec2_client().\
+                    create_snapshot(VolumeId=volume.id, Description=comment)
+                created_count += 1
+            except ClientError as client_err:
+                sfunc(f'couldnot snapshot {volume.id} : {str(client_err)}')
+
+        if stopped:
+            scheduler.change_instance_states('start', [instance.id],
+                                             True, sfunc)
+
+        return created_count, len(volumes) - created_count
+
+    @staticmethod
+    def is_boot_volume(instance, volume):
+        """Determine if volume is the root volume of instance."""
+        return any(attachment['InstanceId'] == instance.id and
+                   attachment['Device'] == instance.root_device_name
+                   for attachment in volume.attachments or [])
+
+    def create_crash_consistent_snapshots(self, instance, volumes,
+                                          skipped_volumes, comment=None,
+                                          sfunc=None):
+        """Snapshot volumes of an instance at the same point in time.
+
+        one 'CreateSnapshots' call snapshots all the volumes of the
+        (running or stopped) instance, except skipped_volumes.
+        returns (created_count, failure_count)
+        """
+        volume_ids = {volume.id for volume in volumes}
+        instance_spec = {'InstanceId': instance.id,
+                         'ExcludeBootVolume': not any(
+                             self.is_boot_volume(instance, volume)
+                             for volume in volumes)}
+        excluded_ids = [volume.id for volume in skipped_volumes
+                        if not self.is_boot_volume(instance, volume)]
+        if excluded_ids:
+            instance_spec['ExcludeDataVolumeIds'] = excluded_ids
+
+        try:
+            sfunc(f'creating crash consistent snapshots...({instance.id}, '
+                  f'{", ".join(sorted(volume_ids))})')
+            response = self.ec2_session.get_ec2_client().\
+                create_snapshots(InstanceSpecification=instance_spec,
+                                 Description=comment)
+        except ClientError as client_err:
+            sfunc(f'couldnot snapshot {instance.id} : {str(client_err)}')
+            return 0, len(volume_ids)
+
+        created_count = len(volume_ids & {snapshot['VolumeId'] for snapshot
+                                          in response['Snapshots']})
+        return created_count, len(volume_ids) - created_count
+
     def create_volume_snapshots(self, instance_ids=None, project_name=None,
                                 age=None, sfunc=None,
-                                comment='created by awsbot app'):
-        """Create EC2 volume snapshots."""
+                                comment='created by awsbot app',
+                                stop=True, crash_consistent=False,
+                                parallelism=1):
+        """Create EC2 volume snapshots.
+
+        the volumes to snapshot are grouped per instance. by default a
+        running instance is stopped once, all its volumes are
+        snapshotted and it is started again. if 'stop' is not set, the
+        volumes are snapshotted without stopping their instance.
+
+        if 'crash_consistent' is set, the volumes of an instance are
+        snapshotted at the same point in time by one 'CreateSnapshots'
+        call, without stopping the instance.
+
+        up to 'parallelism' instances are processed concurrently.
+        """
 
         def default_status(status_str):
             print(status_str)
@@ -60,41 +186,145 @@ class EC2SnapshotManager():
             sfunc = default_status
 
         try:
-            for instance, volume in self.ec2_session.\
-                    get_volumes(instance_ids, project_name):
-                stopped = False
-                if self.ec2_session.has_pending_volume_snapshots(volume):
-                    sfunc(f'skipping {volume.id}, '
-                          'snapshot already in progress')
-                    continue
-
-                if not self.ec2_session.\
-                        can_create_volume_snapshot(volume, age):
-                    sfunc('skipping snapshot creation for '
-                          f'{instance.id}-{volume.id}...snapshot already'
-                          f'created in < than {age} days')
-                    continue
-
-                if self.ec2_session.is_instance_running(instance):
-                    aok, err = self.ec2_session.\
-                        stop_instance(instance, True)
-                    if aok:
-                        stopped = True
-                    else:
-                        sfunc(err)
-                        continue
+            plan = self.plan_volume_snapshots(instance_ids, project_name,
+                                              age, sfunc)
+        except ClientError as client_err:
+            return False, str(client_err)
 
-                sfunc(f'creating snapshot...({instance.id}, {volume.id})')
-                volume.create_snapshot(Description=comment)
-                if stopped:
-                    aok, err = self.ec2_session.start_instance(instance, True)
-                    if err:
-                        sfunc(err)
+        def snapshot_instance(group):
+            instance, volumes, skipped_volumes = group
+            if crash_consistent:
+                return self.create_crash_consistent_snapshots(
+                    instance, volumes, skipped_volumes, comment, sfunc)
+            return self.create_instance_snapshots(instance, volumes, stop,
+                                                  comment, sfunc)
 
-            return True, None
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) \
+                as executor:
+            results = list(executor.map(snapshot_instance, plan))
+
+        created_count = sum(created for created, _ in results)
+        failure_count = sum(failed for _, failed in results)
+        if failure_count:
+            return False, f'{failure_count} of ' + \
+                f'{created_count + failure_count} volume snapshots failed'
+
+        return True, None
+
+    def plan_snapshot_pruning(self, retention, instance_ids=None,
+                              project_name=None, all_snapshots=False):
+        """Get the volume snapshots expired by a retention policy.
+
+        the snapshots of the volumes of the selected instances (all
+        instances if no instances or project are selected) are read in
+        one batched listing. if 'all_snapshots' is set, all the
+        snapshots owned by this account are read instead (including
+        those of deleted volumes), except the copied and imported ones,
+        which do not belong to a volume.
+        the snapshots backing images owned by this account are never
+        expired (nor counted by the policy).
+        returns the (expired, total) snapshot list and count.
+        """
+        if all_snapshots:
+            index = self.ec2_session.get_snapshot_index(None)
+            index.pop(self.UNKNOWN_VOLUME_ID, None)
+        else:
+            index = {volume.id: snapshots
+                     for _, volume, snapshots in self.ec2_session.
+                     get_volume_snapshots(instance_ids, project_name)}
+
+        image_snapshot_ids = self.ec2_session.get_image_snapshot_ids()
+        index = {volume_id: [snapshot for snapshot in snapshots
+                             if snapshot.id not in image_snapshot_ids]
+                 for volume_id, snapshots in index.items()}
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expired = [snapshot for snapshots in index.values()
+                   for snapshot in
+                   retention.get_expired_snapshots(snapshots, now)]
+
+        return expired, sum(len(snapshots) for snapshots in index.values())
+
+    def prune_volume_snapshots(self, instance_ids=None, project_name=None,
+                               all_snapshots=False, keep_last=None,
+                               daily=None, weekly=None, monthly=None,
+                               max_age=None, dry_run=False,
+                               parallelism=4, rate=None,
+                               pfunc=None, sfunc=None):
+        """Delete EC2 volume snapshots expired by a retention policy.
+
+        see EC2SnapshotRetention for the retention rules and
+        plan_snapshot_pruning for the snapshots it applies to. the expired
+        snapshots are deleted by up to 'parallelism' threads, with at
+        most 'rate' deletions a second (if set).
+        if 'dry_run' is set, the expired snapshots are only reported.
+        """
+
+        def default_print(snapshot):
+            print(','.join((
+                snapshot.id,
+                snapshot.volume_id,
+                snapshot.start_time.strftime('%c'),
+                f'{snapshot.volume_size}GiB',
+                'would delete' if dry_run else 'deleting')))
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not pfunc:
+            pfunc = default_print
+
+        if not sfunc:
+            sfunc = default_status
+
+        if all_snapshots and (instance_ids or project_name):
+            return False, 'Cannot select instances or a project ' + \
+                'with all snapshots'
+
+        retention = EC2SnapshotRetention(keep_last, daily, weekly,
+                                         monthly, max_age)
+        aok, err = retention.validate()
+        if not aok:
+            return False, err
+
+        try:
+            expired, total = self.plan_snapshot_pruning(retention,
+                                                        instance_ids,
+                                                        project_name,
+                                                        all_snapshots)
         except ClientError as client_err:
             return False, str(client_err)
 
+        if dry_run:
+            for snapshot in expired:
+                pfunc(snapshot)
+            sfunc(f'{len(expired)} of {total} snapshots would be deleted')
+            return True, None
+
+        limiter = util.RateLimiter(rate)
+
+        def delete_snapshot(snapshot):
+            limiter.acquire()
+            try:
+                pfunc(snapshot)
+                self.ec2_session.get_ec2_client().\
+                    delete_snapshot(SnapshotId=snapshot.id)
+                return True
+            except ClientError as client_err:
+                sfunc(f'couldnot delete {snapshot.id} : {str(client_err)}')
+                return False
+
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) \
+                as executor:
+            deleted_count = sum(executor.map(delete_snapshot, expired))
+
+        sfunc(f'{deleted_count} of {total} snapshots deleted')
+        if deleted_count < len(expired):
+            return False, f'{len(expired) - deleted_count} of ' + \
+                f'{len(expired)} snapshot deletions failed'
+
+        return True, None
+
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,42 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 snapshot record class."""
+
+
+class EC2SnapshotRecord():
+    """EC2 snapshot record class.
+
+    Lightweight, read only view of a snapshot returned by a
+    'DescribeSnapshots' call, with the same attribute names as the
+    boto3 Snapshot resource (see EC2InstanceRecord).
+    """
+
+    FIELDS = (('id', 'SnapshotId'),
+              ('volume_id', 'VolumeId'),
+              ('state', 'State'),
+              ('progress', 'Progress'),
+              ('start_time', 'StartTime'),
+              ('description', 'Description'),
+              ('volume_size', 'VolumeSize'),
+              ('tags', 'Tags'))
+
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    def __init__(self, snapshot):
+        """Initialize the record from a 'DescribeSnapshots' snapshot."""
+        for name, key in self.FIELDS:
+            setattr(self, name, snapshot.get(key))
+
+    @property
+    def snapshot_id(self):
+        """Get the snapshot id."""
+        return self.id
+
+    def __repr__(self):
+        """Get the printable representation of the record."""
+        return f'EC2SnapshotRecord(id={self.id!r})'
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,98 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 snapshot retention policy Class."""
+
+import datetime
+
+
+class EC2SnapshotRetention():
+    """EC2 snapshot retention policy Class.
+
+    The policy is applied to the completed snapshots of each volume:
+    - keep_last - keep the newest 'keep_last' snapshots
+    - daily, weekly, monthly - keep the newest snapshot of each of the
+      newest 'daily' days, 'weekly' (iso) weeks, 'monthly' months
+    - max_age - (days) snapshots older than that are not kept by the
+      daily/weekly/monthly rules (keep_last snapshots are always kept).
+      it only limits the keep rules, at least one of which must be set
+
+    a snapshot kept by any rule is kept. pending or failed snapshots
+    are never expired.
+    """
+
+    BUCKETS = (('daily', lambda time: time.date()),
+               ('weekly', lambda time: time.isocalendar()[:2]),
+               ('monthly', lambda time: (time.year, time.month)))
+
+    def __init__(self, keep_last=None, daily=None, weekly=None,
+                 monthly=None, max_age=None):
+        """Initialize EC2 snapshot retention policy Class."""
+        self.keep_last = keep_last or 0
+        self.buckets = {'daily': daily or 0,
+                        'weekly': weekly or 0,
+                        'monthly': monthly or 0}
+        self.max_age = max_age
+
+    def has_keep_rules(self):
+        """Determine if the policy has any keep rule."""
+        return bool(self.keep_last or any(self.buckets.values()))
+
+    def validate(self):
+        """Validate the policy (it must have at least one keep rule)."""
+        if not self.has_keep_rules():
+            return False, 'Need at least one keep rule to be specified ' + \
+                '(keep_last, daily, weekly or monthly)'
+
+        return True, None
+
+    def get_bucket_snapshots(self, snapshots):
+        """Get the snapshots kept by the daily/weekly/monthly rules.
+
+        'snapshots' must be sorted newest first.
+        """
+        kept = set()
+        for name, bucket_func in self.BUCKETS:
+            count = self.buckets[name]
+            seen = set()
+            for snapshot in snapshots:
+                if len(seen) >= count:
+                    break
+                bucket = bucket_func(snapshot.start_time)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    kept.add(snapshot.id)
+
+        return kept
+
+    def get_expired_snapshots(self, snapshots, now=None):
+        """Get the snapshots of a volume not kept by the policy.
+
+        'snapshots' are the snapshots of one volume, newest first.
+        returns the list of expired snapshots, newest first (none if
+        the policy has no keep rule).
+        """
+        if not self.has_keep_rules():
+            return []
+
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        completed = [snapshot for snapshot in snapshots
+                     if snapshot.state == 'completed']
+
+        if self.max_age is None:
+            young = completed
+        else:
+            min_time = now - datetime.timedelta(days=self.max_age)
+            young = [snapshot for snapshot in completed
+                     if snapshot.start_time >= min_time]
+
+        kept = {snapshot.id for snapshot in completed[:self.keep_last]}
+        kept.update(self.get_bucket_snapshots(completed) &
+                    {snapshot.id for snapshot in young})
+
+        return [snapshot for snapshot in completed
+                if snapshot.id not in kept]
+
+
+if __name__ == '__main__':
+    pass
@@ -14,13 +14,18 @@ class EC2VolumeManager():
         self.ec2_session = ec2_session
 
     def list_volumes(self, instance_ids=None,
-                     project_name=None, pfunc=None):
-        """List volumes associated with EC2 instances."""
+                     project_name=None, pfunc=None, unattached=False):
+        """List volumes associated with EC2 instances.
+
+        if 'unattached' is set, volumes that are not attached to any
+        instance are listed too (with instance None).
+        pfunc is called with EC2InstanceRecord, EC2VolumeRecord pairs.
+        """
         def default_print(inst, volume):
-            tags = self.ec2_session.get_instance_tags(inst)
+            tags = self.ec2_session.get_instance_tags(inst or volume)
             print(','.join((
                 volume.id,
-                inst.id,
+                inst.id if inst else '<unattached>',
                 volume.state,
                 str(volume.size) + 'GiB',
                 volume.encrypted and 'Encrypted' or 'Not Encrypted',
@@ -31,7 +36,8 @@ class EC2VolumeManager():
 
         try:
             for inst, volume in self.ec2_session.\
-                    get_volumes(instance_ids, project_name):
+                    get_volume_records(instance_ids, project_name,
+                                       unattached):
                 pfunc(inst, volume)
 
             return True, None
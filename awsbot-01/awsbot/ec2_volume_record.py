@@ -0,0 +1,48 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 volume record class."""
+
+
+class EC2VolumeRecord():
+    """EC2 volume record class.
+
+    Lightweight, read only view of a volume returned by a
+    'DescribeVolumes' call, with the same attribute names as the
+    boto3 Volume resource (see EC2InstanceRecord).
+    """
+
+    FIELDS = (('id', 'VolumeId'),
+              ('state', 'State'),
+              ('size', 'Size'),
+              ('volume_type', 'VolumeType'),
+              ('encrypted', 'Encrypted'),
+              ('availability_zone', 'AvailabilityZone'),
+              ('create_time', 'CreateTime'),
+              ('attachments', 'Attachments'),
+              ('tags', 'Tags'))
+
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    def __init__(self, volume):
+        """Initialize the record from a 'DescribeVolumes' volume."""
+        for name, key in self.FIELDS:
+            setattr(self, name, volume.get(key))
+
+    @property
+    def volume_id(self):
+        """Get the volume id."""
+        return self.id
+
+    def get_instance_ids(self):
+        """Get the ids of the instances the volume is attached to."""
+        return [attachment['InstanceId']
+                for attachment in self.attachments or []]
+
+    def __repr__(self):
+        """Get the printable representation of the record."""
+        return f'EC2VolumeRecord(id={self.id!r})'
+
+
+if __name__ == '__main__':
+    pass
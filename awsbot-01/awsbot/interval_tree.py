@@ -0,0 +1,76 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Interval tree Class."""
+
+
+class IntervalTree():
+    """Interval tree Class.
+
+    Static centered interval tree of closed [lo, hi] intervals (e.g.
+    port ranges) with values attached. finding the intervals
+    overlapping an interval costs O(log n + number of matches).
+    nodes are (center, by_lo, by_hi, left, right) tuples, 'by_lo' and
+    'by_hi' being the intervals containing 'center' sorted by lo
+    (ascending) and by hi (descending).
+    """
+
+    def __init__(self, intervals=()):
+        """Build the tree from (lo, hi, value) intervals."""
+        intervals = list(intervals)
+        self.count = len(intervals)
+        self.root = self.build(intervals)
+
+    def __len__(self):
+        """Get the number of intervals in the tree."""
+        return self.count
+
+    @classmethod
+    def build(cls, intervals):
+        """Build a (sub) tree from (lo, hi, value) intervals."""
+        if not intervals:
+            return None
+
+        endpoints = sorted(endpoint for lo, hi, _ in intervals
+                           for endpoint in (lo, hi))
+        center = endpoints[len(endpoints) // 2]
+        left = [interval for interval in intervals if interval[1] < center]
+        right = [interval for interval in intervals if interval[0] > center]
+        middle = [interval for interval in intervals
+                  if interval[0] <= center <= interval[1]]
+
+        return (center,
+                sorted(middle, key=lambda interval: interval[0]),
+                sorted(middle, key=lambda interval: -interval[1]),
+                cls.build(left), cls.build(right))
+
+    def get_overlapping(self, lo, hi):
+        """Get the values of the intervals overlapping [lo, hi]."""
+        values = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, by_lo, by_hi, left, right = node
+            if hi < center:
+                for interval in by_lo:
+                    if interval[0] > hi:
+                        break
+                    values.append(interval[2])
+                stack.append(left)
+            elif lo > center:
+                for interval in by_hi:
+                    if interval[1] < lo:
+                        break
+                    values.append(interval[2])
+                stack.append(right)
+            else:
+                values.extend(interval[2] for interval in by_lo)
+                stack.extend((left, right))
+
+        return values
+
+
+if __name__ == '__main__':
+    pass
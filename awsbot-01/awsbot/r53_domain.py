@@ -58,18 +58,22 @@ class R53DomainManager():
         except ClientError as client_err:
             return False, str(client_err)
 
-    def find_hosted_zone(self, domain_name):
-        """Find hosted zone associated with 'domain_name."""
-        for zone in self.r53_session.get_hosted_zones():
-            if domain_name.endswith(zone['Name'][:-1]):
-                return zone
-        return None
+    def find_hosted_zone(self, domain_name, private_zone=None):
+        """Find hosted zone associated with 'domain_name.
+
+        returns the zone with the longest name matching 'domain_name'
+        (see R53HostedZoneIndex.find for 'private_zone'), looked up in
+        the session hosted zone index, or None.
+        """
+        return self.r53_session.get_hosted_zone_index().\
+            find(domain_name, private_zone)
 
     def create_hosted_zone(self, hosted_zone_name):
         """Create hosted zone."""
         zone = self.r53_session.get_r53_client().\
             create_hosted_zone(Name=hosted_zone_name,
                                CallerReference=str(util.getuuid()))
+        self.r53_session.add_hosted_zone_to_index(zone['HostedZone'])
         return zone['HostedZone']
 
     def create_alias_domain_record(self, domain_name,
@@ -83,19 +87,33 @@ class R53DomainManager():
             if err:
                 return False, err
 
-            zone = self.find_hosted_zone(domain_name) or \
-                self.create_hosted_zone(hosted_zone_name)
-
             change_batch = self.r53_session.\
                 create_resource_record_set_config(
                     rrset_domain_name=domain_name,
                     rrset_alias_zone_id=alias_zone_id,
                     rrset_alias_dns_name=alias_dns_name)
 
-            self.r53_session.get_r53_client().\
-                change_resource_record_sets(
-                    HostedZoneId=zone['Id'],
-                    ChangeBatch=change_batch)
+            zone = self.find_hosted_zone(domain_name, private_zone=False) \
+                or self.create_hosted_zone(hosted_zone_name)
+            try:
+                self.r53_session.get_r53_client().\
+                    change_resource_record_sets(
+                        HostedZoneId=zone['Id'],
+                        ChangeBatch=change_batch)
+            except ClientError as client_err:
+                if client_err.response['Error']['Code'] != \
+                        'NoSuchHostedZone':
+                    raise
+
+                # the zone was deleted since the index was cached
+                self.r53_session.clear_hosted_zone_index()
+                zone = self.find_hosted_zone(domain_name,
+                                             private_zone=False) or \
+                    self.create_hosted_zone(hosted_zone_name)
+                self.r53_session.get_r53_client().\
+                    change_resource_record_sets(
+                        HostedZoneId=zone['Id'],
+                        ChangeBatch=change_batch)
 
             return True, None
         except ClientError as client_err:
@@ -3,13 +3,21 @@
 
 """Route 53 Session Manager class."""
 
+try:
+    from awsbot.r53_zone_index import R53HostedZoneIndex
+except ImportError:
+    from r53_zone_index import R53HostedZoneIndex
+
 
 class R53SessionManager():
     """Route 53 Session Manager class."""
 
+    HOSTED_ZONE_CACHE_NAME = 'r53-hosted-zones'
+
     def __init__(self, session):
         """Initialize the route 53 session manager class."""
         self.session = session
+        self.hosted_zone_index = None
 
     def get_r53_client(self):
         """Get route 53 client."""
@@ -22,6 +30,7 @@ class R53SessionManager():
     def set_session(self, session):
         """Set session."""
         self.session = session
+        self.hosted_zone_index = None
 
     def get_r53_paginator(self, name):
         """Get route 53 paginator."""
@@ -46,6 +55,41 @@ class R53SessionManager():
             for zone in page['HostedZones']:
                 yield zone
 
+    def get_hosted_zone_index(self):
+        """Get the hosted zone index.
+
+        the index (R53HostedZoneIndex) is built once per session, from
+        the session disk cache (if enabled and not expired) or from one
+        listing of the hosted zones.
+        """
+        if self.hosted_zone_index is None:
+            zones = self.session.load_disk_cache(
+                self.HOSTED_ZONE_CACHE_NAME).get('zones')
+            if zones is None:
+                zones = list(self.get_hosted_zones())
+                self.session.save_disk_cache(self.HOSTED_ZONE_CACHE_NAME,
+                                             {'zones': zones})
+            self.hosted_zone_index = R53HostedZoneIndex(zones)
+
+        return self.hosted_zone_index
+
+    def add_hosted_zone_to_index(self, zone):
+        """Add a (newly created) hosted zone to the hosted zone index."""
+        index = self.get_hosted_zone_index()
+        index.add(zone)
+        self.session.save_disk_cache(self.HOSTED_ZONE_CACHE_NAME,
+                                     {'zones': list(index.get_zones())})
+
+    def clear_hosted_zone_index(self):
+        """Clear the hosted zone index (and its disk cache).
+
+        the ttl of the disk cache restarts, as it will be rebuilt.
+        """
+        self.hosted_zone_index = None
+        self.session.disk_cache_created.pop(self.HOSTED_ZONE_CACHE_NAME,
+                                            None)
+        self.session.save_disk_cache(self.HOSTED_ZONE_CACHE_NAME, {})
+
     @staticmethod
     def get_default_cf_zone_id():
         """Get default cloud front zoneid."""
@@ -0,0 +1,86 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Route 53 Hosted Zone Index Class."""
+
+
+class R53HostedZoneIndex():
+    """Route 53 Hosted Zone Index Class.
+
+    Trie of hosted zones ('ListHostedZones' results) keyed by the
+    reversed labels of their names (com -> example -> sub). a lookup
+    walks the labels of a domain name once, whatever the number of
+    zones, and returns the zone with the longest matching name.
+    nodes are [children, zones] lists, 'children' mapping a label to
+    a node and 'zones' holding the zones named after the node.
+    """
+
+    def __init__(self, zones=()):
+        """Initialize the index with hosted zones."""
+        self.root = [{}, []]
+        self.count = 0
+        for zone in zones:
+            self.add(zone)
+
+    def __len__(self):
+        """Get the number of zones in the index."""
+        return self.count
+
+    @staticmethod
+    def get_labels(domain_name):
+        """Get the labels of a domain name, from the top level label."""
+        return [label for label in
+                reversed(domain_name.lower().rstrip('.').split('.'))
+                if label]
+
+    def add(self, zone):
+        """Add a hosted zone to the index."""
+        node = self.root
+        for label in self.get_labels(zone['Name']):
+            node = node[0].setdefault(label, [{}, []])
+
+        zones = [indexed for indexed in node[1]
+                 if indexed['Id'] != zone['Id']] + [zone]
+        self.count += len(zones) - len(node[1])
+        node[1] = zones
+
+    def get_zones(self):
+        """Iterate over the zones of the index."""
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield from node[1]
+            stack.extend(node[0].values())
+
+    @staticmethod
+    def is_private_zone(zone):
+        """Determine if a hosted zone is private."""
+        return zone.get('Config', {}).get('PrivateZone', False)
+
+    def find(self, domain_name, private_zone=None):
+        """Find the zone with the longest name matching domain_name.
+
+        a zone matches if its name is the domain name or one of its
+        parent domains. only public (private) zones match if
+        'private_zone' is False (True). if it is None, any zone
+        matches: the longest name wins whatever its visibility, and
+        only zones with the same name are ordered public first.
+        returns None if no zone matches.
+        """
+        found = None
+        node = self.root
+        for label in self.get_labels(domain_name):
+            node = node[0].get(label)
+            if node is None:
+                break
+            zones = [zone for zone in node[1]
+                     if private_zone is None or
+                     self.is_private_zone(zone) == private_zone]
+            if zones:
+                found = min(zones, key=self.is_private_zone)
+
+        return found
+
+
+if __name__ == '__main__':
+    pass
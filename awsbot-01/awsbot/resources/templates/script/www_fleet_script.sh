@@ -0,0 +1,23 @@
+#!/bin/bash
+yum update -y
+yum install httpd -y
+service httpd start
+chkconfig httpd on
+cd /var/www/html
+# fleet launches: the instance name is read at boot from the instance
+# metadata tags (the 'Name' tag may be set shortly after launch), so
+# that the same user data can be shared by all the instances of a
+# launch request. the instances need InstanceMetadataTags enabled.
+IMDS=http://169.254.169.254/latest
+TOKEN=$(curl -s -X PUT -H "X-aws-ec2-metadata-token-ttl-seconds: 300" \
+    $IMDS/api/token)
+for attempt in $(seq 1 30); do
+    NAME=$(curl -sf -H "X-aws-ec2-metadata-token: $TOKEN" \
+        $IMDS/meta-data/tags/instance/Name) && break
+    sleep 2
+done
+if [ -z "$NAME" ]; then
+    NAME=$(curl -s -H "X-aws-ec2-metadata-token: $TOKEN" \
+        $IMDS/meta-data/instance-id)
+fi
+echo "<html><h1>$NAME : If you see This. Apache Httpd is Up and Running!</h1></html>" > index.html
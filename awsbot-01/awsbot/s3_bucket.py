@@ -3,19 +3,28 @@
 
 """S3 Bucket Manager class."""
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 from pathlib import Path
 from botocore.exceptions import ClientError
 from botocore.exceptions import EndpointConnectionError
 
 try:
+    from awsbot.s3_manifest import S3SyncManifest
     from awsbot import util
 except ImportError:
+    from s3_manifest import S3SyncManifest
     import util
 
 
 class S3BucketManager():
     """S3 Bucket Manager class."""
 
+    UPLOAD_CONNECTIONS_PER_FILE = 10
+
     def __init__(self, s3_session):
         """Initialize BucketManager class."""
         self.s3_session = s3_session
@@ -85,55 +94,295 @@ class S3BucketManager():
 
         return self.s3_session.get_s3_bucket_url(name)
 
-    def sync_fs_to_bucket(self, fs_pathname, bucket_name, validate):
+    def sync_fs_to_bucket(self, fs_pathname, bucket_name, validate,
+                          concurrency=1, use_manifest=False,
+                          manifest_path=None, include=None, exclude=None,
+                          symlinks='follow', delete=False, dry_run=False,
+                          prefix=None, sfunc=None):
         """Sync fs to s3 bucket.
 
         sync files found in fs specified by 'fs_pathname' to bucket
         specified by 'bucket_name'.  optionally validate files (html only)
+
+        the fs tree is walked lazily and each file is handed to a pool
+        of 'concurrency' workers (sharing one s3 client) as soon as it
+        is found, so hashing and uploading start before the walk
+        finishes. upload failures are collected per file instead of
+        stopping at the first error.
+
+        local files are hashed with util.md5digest_concurrent, the
+        chunks of large files being hashed concurrently on a shared
+        pool. if 'use_manifest' is set, the digests of local files are
+        kept in a S3SyncManifest so unchanged files are not re-hashed.
+
+        if 'validate' is set, html files are validated as they are
+        found. invalid files are not uploaded and fail the sync.
+
+        include/exclude/symlinks are passed on to util.scan_fs_tree.
+
+        if 'delete' is set, objects whose keys were not found in the
+        (filtered) fs tree are removed from the bucket using batched
+        'DeleteObjects' calls, unless part of the fs tree could not be
+        read. if 'dry_run' is set, the objects that would be uploaded or
+        deleted are only listed.
+
+        if 'prefix' is set, files are synced to keys under the
+        '<prefix>/' folder of the bucket and only that folder is
+        listed (and pruned). the bucket is listed using 'concurrency'
+        workers as well.
         """
         if not self.s3_session.is_valid_s3_bucket(bucket_name):
             return None, 'Bucket Doesnot Exist : ' + \
                           'Bucket needs to be setup first using ' + \
                           "the 'setup-bucket' command"
 
-        path_map = {}
-        err_map = {}
-        metadata, _ =\
-            self.s3_session.get_s3_object_metadata(bucket_name)
+        if not concurrency or concurrency < 1:
+            return None, f'Invalid concurrency : {concurrency}'
+
+        root = Path(fs_pathname).expanduser().resolve()
+        if not root.is_dir() or not os.access(root, os.R_OK | os.X_OK):
+            return None, f'Not a readable directory : {fs_pathname}'
+
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        prefix = prefix.strip('/') + '/' if prefix and \
+            prefix.strip('/') else ''
+        metadata, err =\
+            self.s3_session.get_s3_object_metadata(bucket_name, prefix,
+                                                   concurrency)
+        if err:
+            return None, err
+        chunk_size = self.s3_session.get_chunk_size()
+
+        walk_errors = []
+        try:
+            files = util.scan_fs_tree(root, include, exclude,
+                                      symlinks=symlinks,
+                                      onerror=walk_errors.append)
+        except ValueError as value_error:
+            return None, str(value_error)
+
+        invalid_map = {}
+        if validate:
+            files = self.validate_html_files(files, invalid_map)
+
+        local_keys = set()
+
+        def track_keys(files):
+            for pathname, keyname, stat_result in files:
+                local_keys.add(prefix + keyname)
+                yield pathname, prefix + keyname, stat_result
+
+        manifest = None
+        if use_manifest:
+            manifest = S3SyncManifest(root, manifest_path, bucket_name)
+            aok, err = manifest.open()
+            if not aok:
+                sfunc(f'WARNING : {err} : hashing all files')
+                manifest = None
+
+        def is_unchanged(pathname, filename, stat_result):
+            etag = metadata.get(filename)
+            if not etag:
+                return False
+
+            if manifest:
+                md5digest, err = manifest.md5digest(pathname, filename,
+                                                    chunk_size, stat_result,
+                                                    hash_executor)
+            else:
+                md5digest, err = util.md5digest_concurrent(pathname,
+                                                           chunk_size,
+                                                           hash_executor)
+            return not err and md5digest == etag
+
+        hash_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        walk_complete = False
+        try:
+            err_map, file_count = \
+                self.upload_files(bucket_name, track_keys(files),
+                                  concurrency, sfunc, is_unchanged,
+                                  dry_run)
+            walk_complete = not walk_errors
+        finally:
+            hash_executor.shutdown()
+            if manifest:
+                sfunc(f'Manifest : {manifest.hit_count} cached, ' +
+                      f'{manifest.miss_count} hashed')
+                # entries of unread subtrees are kept for the next sync
+                _, err = manifest.close(prune=walk_complete)
+                if err:
+                    sfunc(f'WARNING : Cannot update manifest : {err}')
+
+        if walk_errors:
+            for walk_error in walk_errors:
+                sfunc(f'Cannot read {walk_error.filename} : ' +
+                      f'{walk_error.strerror}')
+            if delete:
+                sfunc('Stale objects not deleted : the fs tree could not ' +
+                      'be fully read')
+            return None, f'{len(walk_errors)} fs tree read errors'
+
+        if invalid_map:
+            return None, f'{len(invalid_map)} invalid html files : ' + \
+                str(invalid_map)
+
+        if err_map:
+            for filename, err in err_map.items():
+                sfunc(f'Cannot upload {filename} : {err}')
+            return None, f'{len(err_map)} of {file_count} ' + \
+                'files failed to sync'
 
-        def fswalk(path, root):
-            pathname = str(path)
-            filename = str(path.relative_to(root).as_posix())
-            content_type = util.get_content_type_from_filename(filename)
+        if delete and metadata:
+            err = self.delete_stale_objects(bucket_name, metadata,
+                                            local_keys, include, exclude,
+                                            concurrency, dry_run, prefix,
+                                            sfunc)
+            if err:
+                return None, err
 
-            if validate and content_type.find('html') != -1:
+        return self.s3_session.get_s3_bucket_url(bucket_name)
+
+    def delete_stale_objects(self, bucket_name, bucket_keys, local_keys,
+                             include=None, exclude=None, concurrency=1,
+                             dry_run=False, prefix='', sfunc=None):
+        """Delete bucket objects that no longer exist in the fs tree.
+
+        only keys under 'prefix' that are selected by the
+        include/exclude filters (and not hidden) are considered,
+        so filtered out objects are kept.
+        """
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        stale_keys = [key for key in bucket_keys
+                      if key not in local_keys and
+                      key.startswith(prefix) and
+                      not key.rsplit('/', 1)[-1].startswith('.') and
+                      util.is_fs_path_selected(key[len(prefix):],
+                                               include, exclude,
+                                               check_dirs=True)]
+
+        if dry_run:
+            for key in stale_keys:
+                sfunc(f'(dry run) delete : {key}')
+            sfunc(f'(dry run) {len(stale_keys)} objects would be deleted')
+            return None
+
+        deleted_count, err_map = self.s3_session.\
+            delete_s3_objects(bucket_name, stale_keys,
+                              concurrency, sfunc=sfunc)
+        sfunc(f'Deleted {deleted_count} of {len(stale_keys)} ' +
+              'stale objects')
+        if err_map:
+            for key, err in err_map.items():
+                sfunc(f'Cannot delete {key} : {err}')
+            return f'{len(err_map)} of {len(stale_keys)} ' + \
+                'stale objects could not be deleted'
+
+        return None
+
+    @staticmethod
+    def validate_html_files(files, err_map):
+        """Validate the html files found while walking a fs tree.
+
+        'files' is an iterable of (pathname, keyname, stat_result),
+        validated lazily: the valid files are yielded as they are found
+        and the error of every invalid html file is added to 'err_map'
+        (pathname -> error).
+        """
+        for pathname, keyname, stat_result in files:
+            content_type = util.get_content_type_from_filename(keyname)
+            if content_type.find('html') != -1:
                 aok, err = util.is_valid_html_file(pathname)
                 if not aok:
                     err_map[pathname] = err
-                    return
-
-            chunk_size = self.s3_session.get_chunk_size()
-            sync_flag = True
-            if metadata and metadata.get(filename, None):
-                md5digest, err = util.md5digest(pathname, chunk_size)
-                if not err and md5digest == metadata[filename][1:-1]:
-                    sync_flag = False
-            if sync_flag:
-                path_map[pathname] = filename
-
-        util.walk_fs_tree(Path(fs_pathname).expanduser().resolve(), fswalk)
-
-        if len(err_map) == 0:
-            for key, value in path_map.items():
-                aok, err = \
-                    self.s3_session.create_s3_bucket_object(
-                        self.s3_session.get_s3_bucket_resource(bucket_name),
-                        key, value)
-                if not aok:
-                    return None, err
-            return self.s3_session.get_s3_bucket_url(bucket_name)
+                    continue
+            yield pathname, keyname, stat_result
+
+    def upload_files(self, bucket_name, files, concurrency=1,
+                     sfunc=None, skip_func=None, dry_run=False):
+        """Upload files to s3 bucket using a bounded worker pool.
+
+        'files' is an iterable of (pathname, keyname, stat_result) and
+        is consumed lazily. a file is not uploaded if 'skip_func'
+        returns True for it (skip_func runs in the worker as well).
+        if 'dry_run' is set, files are only listed, not uploaded.
+
+        returns a dict of pathname -> error for every failed upload
+        and the number of files processed. the upload throughput (or
+        what would be uploaded, if 'dry_run' is set) is reported using
+        'sfunc'.
+        """
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        s3_client = self.s3_session.\
+            get_s3_client(concurrency * self.UPLOAD_CONNECTIONS_PER_FILE)
+
+        def upload(pathname, keyname, stat_result):
+            if skip_func and skip_func(pathname, keyname, stat_result):
+                return pathname, None, None
+            if dry_run:
+                sfunc(f'(dry run) upload : {pathname} -> {keyname}')
+                return pathname, stat_result.st_size, None
+            aok, err = self.s3_session.\
+                upload_s3_bucket_object(bucket_name, pathname,
+                                        keyname, s3_client=s3_client)
+            if not aok:
+                return pathname, None, err
+            return pathname, stat_result.st_size, None
+
+        err_map = {}
+        file_count = 0
+        upload_count = 0
+        upload_bytes = 0
+
+        def collect(futures):
+            nonlocal upload_count, upload_bytes
+            for future in futures:
+                pathname, size, err = future.result()
+                if err:
+                    err_map[pathname] = err
+                elif size is not None:
+                    upload_count += 1
+                    upload_bytes += size
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = set()
+            for pathname, keyname, stat_result in files:
+                if len(in_flight) >= concurrency * 4:
+                    done, in_flight = wait(in_flight,
+                                           return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight.add(executor.submit(upload, pathname,
+                                              keyname, stat_result))
+                file_count += 1
+            collect(wait(in_flight)[0])
+        elapsed = max(time.perf_counter() - start_time, 1e-6)
+
+        upload_mb = upload_bytes / (1024 * 1024)
+        if dry_run:
+            sfunc(f'Would upload {upload_count} of {file_count} files ' +
+                  f'({upload_mb:.2f} MB)')
+        else:
+            sfunc(f'Uploaded {upload_count} of {file_count} files ' +
+                  f'({upload_mb:.2f} MB) in {elapsed:.2f}s : ' +
+                  f'{upload_count / elapsed:.2f} files/s, ' +
+                  f'{upload_mb / elapsed:.2f} MB/s')
 
-        return None, str(err_map)
+        return err_map, file_count
 
 
 if __name__ == '__main__':
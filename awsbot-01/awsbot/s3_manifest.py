@@ -0,0 +1,158 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""S3 sync manifest class."""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+try:
+    from awsbot import util
+except ImportError:
+    import util
+
+
+class S3SyncManifest():
+    """S3 sync manifest class.
+
+    Persists the s3 style md5 digest of every local file synced to a
+    bucket, keyed by the path of the file relative to the sync root.
+    A file whose size, mtime and inode still match its manifest entry
+    (for the same chunk size) is not re-hashed.
+    """
+
+    MANIFEST_DIR = '~/.awsbot/cache/s3-sync-manifests'
+
+    def __init__(self, root, manifest_path=None, bucket_name=None):
+        """Initialize the S3 sync manifest class.
+
+        the manifest is kept in MANIFEST_DIR (outside the synced tree),
+        in a file named after the bucket and the root, unless
+        'manifest_path' is set.
+        """
+        self.root = Path(root).expanduser().resolve()
+        if manifest_path:
+            self.manifest_path = Path(manifest_path).expanduser().resolve()
+        else:
+            root_digest = hashlib.sha1(str(self.root).encode()).hexdigest()
+            self.manifest_path = Path(self.MANIFEST_DIR).expanduser().\
+                joinpath(f'{bucket_name or "default"}-{root_digest}.sqlite3')
+        self.connection = None
+        self.lock = threading.Lock()
+        self.seen = set()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def get_manifest_path(self):
+        """Get the path of the manifest file."""
+        return self.manifest_path
+
+    def open(self):
+        """Open (and create if needed) the manifest database."""
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = \
+                sqlite3.connect(str(self.manifest_path),
+                                check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS manifest ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+                'inode INTEGER, chunk_size INTEGER, digest TEXT)')
+            self.connection.commit()
+            return True, None
+        except (OSError, sqlite3.Error) as db_error:
+            self.connection = None
+            return False, f'Cannot open manifest {self.manifest_path} : ' + \
+                str(db_error)
+
+    def close(self, prune=False):
+        """Commit pending updates and close the manifest.
+
+        if 'prune' is set, entries for files that were not looked up
+        since the manifest was opened are removed.
+        """
+        if not self.connection:
+            return True, None
+
+        try:
+            with self.lock:
+                if prune:
+                    stale = [(path,) for (path,) in
+                             self.connection.execute(
+                                 'SELECT path FROM manifest')
+                             if path not in self.seen]
+                    self.connection.executemany(
+                        'DELETE FROM manifest WHERE path = ?', stale)
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
+            return True, None
+        except sqlite3.Error as db_error:
+            return False, str(db_error)
+
+    def get_digest(self, rel_path, stat_result, chunk_size):
+        """Get the cached digest if the file is unchanged."""
+        if not self.connection:
+            return None
+
+        with self.lock:
+            self.seen.add(rel_path)
+            row = self.connection.execute(
+                'SELECT size, mtime_ns, inode, chunk_size, digest '
+                'FROM manifest WHERE path = ?', (rel_path,)).fetchone()
+
+        if row and row[:4] == (stat_result.st_size,
+                               stat_result.st_mtime_ns,
+                               stat_result.st_ino,
+                               chunk_size or 0):
+            return row[4]
+
+        return None
+
+    def put_digest(self, rel_path, stat_result, chunk_size, digest):
+        """Add or update the manifest entry of a file."""
+        if not self.connection:
+            return
+
+        with self.lock:
+            self.seen.add(rel_path)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?, ?)',
+                (rel_path, stat_result.st_size, stat_result.st_mtime_ns,
+                 stat_result.st_ino, chunk_size or 0, digest))
+
+    def md5digest(self, pathname, rel_path, chunk_size,
+                  stat_result=None, executor=None):
+        """Get the md5digest of a file, hashing it only if it changed.
+
+        changed files are hashed by util.md5digest_concurrent on 'executor'.
+        """
+        try:
+            if stat_result is None:
+                stat_result = Path(pathname).stat()
+        except OSError as os_error:
+            return None, str(os_error)
+
+        digest = self.get_digest(rel_path, stat_result, chunk_size)
+        with self.lock:
+            if digest:
+                self.hit_count += 1
+            else:
+                self.miss_count += 1
+
+        if digest:
+            return digest, None
+
+        digest, err = util.md5digest_concurrent(pathname, chunk_size, executor)
+        if err:
+            return None, err
+
+        self.put_digest(rel_path, stat_result, chunk_size, digest)
+
+        return digest, None
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,104 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""S3 object metadata class."""
+
+import sys
+import threading
+
+
+class S3ObjectMetadata():
+    """S3 object metadata class.
+
+    Compact key -> etag map for the objects of a bucket. keys are
+    stored as (interned directory prefix, basename) and etags as
+    16 byte binary digests (plus a 2 byte part count for multipart
+    etags) instead of quoted hex strings. etags are returned in the
+    same '<md5>[-<n>]' format util.md5digest produces.
+    """
+
+    __slots__ = ('prefixes', 'count', 'lock')
+
+    def __init__(self):
+        """Initialize the S3 object metadata class."""
+        self.prefixes = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def encode_etag(etag):
+        """Encode a (quoted) etag as bytes.
+
+        etags that are not md5 digests are kept as strings.
+        """
+        etag = etag.strip('"')
+        digest, _, parts = etag.partition('-')
+        try:
+            if len(digest) != 32:
+                return etag
+            if not parts:
+                return bytes.fromhex(digest)
+            return bytes.fromhex(digest) + int(parts).to_bytes(2, 'big')
+        except (ValueError, OverflowError):
+            return etag
+
+    @staticmethod
+    def decode_etag(etag):
+        """Decode an etag encoded by encode_etag."""
+        if isinstance(etag, str):
+            return etag
+        if len(etag) == 16:
+            return etag.hex()
+        return f'{etag[:16].hex()}-{int.from_bytes(etag[16:], "big")}'
+
+    @staticmethod
+    def split_key(key):
+        """Split key into its (interned) directory prefix and basename."""
+        index = key.rfind('/') + 1
+        return sys.intern(key[:index]), key[index:]
+
+    def add(self, key, etag):
+        """Add an object key and its etag."""
+        self.update(((key, etag),))
+
+    def update(self, objects):
+        """Add (key, etag) pairs. safe to call from multiple threads."""
+        entries = [(self.split_key(key), self.encode_etag(etag))
+                   for key, etag in objects]
+        with self.lock:
+            for (prefix, name), etag in entries:
+                names = self.prefixes.setdefault(prefix, {})
+                if name not in names:
+                    self.count += 1
+                names[name] = etag
+
+    def get(self, key, default=None):
+        """Get the etag of key."""
+        prefix, name = self.split_key(key)
+        etag = self.prefixes.get(prefix, {}).get(name)
+        if etag is None:
+            return default
+        return self.decode_etag(etag)
+
+    def keys(self):
+        """Iterate over the object keys."""
+        for prefix, names in self.prefixes.items():
+            for name in names:
+                yield prefix + name
+
+    def __iter__(self):
+        """Iterate over the object keys."""
+        return self.keys()
+
+    def __contains__(self, key):
+        """Determine if key is present."""
+        prefix, name = self.split_key(key)
+        return name in self.prefixes.get(prefix, {})
+
+    def __len__(self):
+        """Get the number of objects."""
+        return self.count
+
+
+if __name__ == '__main__':
+    pass
@@ -3,12 +3,17 @@
 
 """s3 session manager class."""
 
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
+from botocore.exceptions import EndpointConnectionError
+from boto3.exceptions import S3UploadFailedError
 from boto3.s3.transfer import TransferConfig
 
 try:
+    from awsbot.s3_metadata import S3ObjectMetadata
     from awsbot import util
 except ImportError:
+    from s3_metadata import S3ObjectMetadata
     import util
 
 
@@ -40,8 +45,17 @@ class S3SessionManager():
         """Get s3 resource."""
         return self.session.get_resource('s3')
 
-    def get_s3_client(self):
-        """Get s3 client."""
+    def get_s3_client(self, max_pool_connections=None):
+        """Get s3 client.
+
+        if 'max_pool_connections' is specified, the client connection
+        pool is raised to (at least) that size.
+        """
+        if max_pool_connections:
+            return self.session.get_client(
+                's3', config=self.session.
+                get_pool_config(max_pool_connections))
+
         return self.session.get_client('s3')
 
     def get_s3_bucket_resources(self):
@@ -194,20 +208,167 @@ class S3SessionManager():
 
         return True, None
 
-    def get_s3_object_metadata(self, bucket_name):
-        """Get etag associated with S3 objects."""
-        paginator = self.get_s3_list_bucket_v2_paginator()
+    def upload_s3_bucket_object(self, bucket_name, filename,
+                                keyname, content_type=None,
+                                s3_client=None):
+        """Upload a file to the specified bucket using a s3 client.
+
+        boto3 clients (unlike resources) are thread safe, so a single
+        client can be passed in and shared by all upload workers.
+        """
+        try:
+            if content_type is None:
+                content_type = util.get_content_type_from_filename(keyname)
+
+            if s3_client is None:
+                s3_client = self.get_s3_client()
 
-        metadata = {}
+            chunk_size = self.get_chunk_size()
+            s3_client.upload_file(
+                filename, bucket_name, keyname,
+                ExtraArgs={'ContentType': content_type},
+                Config=TransferConfig(
+                    multipart_threshold=chunk_size,
+                    multipart_chunksize=chunk_size))
+        except (ClientError, EndpointConnectionError,
+                S3UploadFailedError, OSError) as upload_error:
+            return False, str(upload_error)
+
+        return True, None
+
+    def delete_s3_objects(self, bucket_name, keys, concurrency=1,
+                          batch_size=1000, sfunc=None):
+        """Delete s3 objects in batches using 'DeleteObjects'.
+
+        'keys' are split into batches of up to 'batch_size' (max 1000)
+        keys and the batches are deleted in parallel using a pool of
+        'concurrency' workers. returns the number of deleted objects
+        and a dict of key -> error for every object not deleted.
+        """
+        def default_status(status_str):
+            print(status_str)
+
+        if not sfunc:
+            sfunc = default_status
+
+        keys = list(keys)
+        batch_size = max(1, min(batch_size, 1000))
+        batches = [keys[index:index + batch_size]
+                   for index in range(0, len(keys), batch_size)]
+        s3_client = self.get_s3_client(concurrency)
+
+        def delete_batch(batch):
+            try:
+                response = s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch],
+                            'Quiet': True})
+                return {err['Key']: f'{err["Code"]} : {err["Message"]}'
+                        for err in response.get('Errors', [])}
+            except (ClientError, EndpointConnectionError) as client_error:
+                return {key: str(client_error) for key in batch}
+
+        deleted_count = 0
+        err_map = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for index, batch_errors in \
+                    enumerate(executor.map(delete_batch, batches), 1):
+                deleted_count += len(batches[index - 1]) - len(batch_errors)
+                err_map.update(batch_errors)
+                sfunc(f'Delete batch {index}/{len(batches)} : ' +
+                      f'{len(batches[index - 1]) - len(batch_errors)} ' +
+                      f'deleted, {len(batch_errors)} failed')
+
+        return deleted_count, err_map
+
+    def get_s3_object_metadata(self, bucket_name, prefix=None,
+                               concurrency=1, delimiter='/',
+                               max_split_depth=2):
+        """Get etag associated with S3 objects.
+
+        returns a S3ObjectMetadata (key -> etag) for the objects whose
+        keys start with 'prefix' (all objects if prefix is None).
+
+        the first page of the listing is read alone. if it is truncated
+        and 'concurrency' > 1, the rest of the keyspace is split into
+        up to 'concurrency' lexicographic key ranges, listed
+        concurrently (from 'StartAfter' to the start of the next
+        range). the range bounds are common prefixes found at up to
+        'max_split_depth' 'delimiter' levels below 'prefix', a level
+        being listed only while fewer than 'concurrency' bounds are
+        known. small buckets are listed with one call whatever the
+        number of prefixes.
+        """
+        metadata = S3ObjectMetadata()
+        s3_client = self.get_s3_client(concurrency)
+        prefix = prefix or ''
+
+        def list_range(start_after=None, start=None, end=None):
+            paginator = s3_client.get_paginator('list_objects_v2')
+            params = {'Bucket': bucket_name, 'Prefix': prefix}
+            if start_after:
+                params['StartAfter'] = start_after
+
+            for page in paginator.paginate(**params):
+                contents = page.get('Contents', [])
+                metadata.update((meta['Key'], meta['ETag'])
+                                for meta in contents
+                                if (start is None or meta['Key'] >= start)
+                                and (end is None or meta['Key'] < end))
+                if end is not None and contents and \
+                        contents[-1]['Key'] >= end:
+                    break
+
+        def get_common_prefixes(list_prefix):
+            paginator = s3_client.get_paginator('list_objects_v2')
+            return [common['Prefix']
+                    for page in paginator.paginate(Bucket=bucket_name,
+                                                   Prefix=list_prefix,
+                                                   Delimiter=delimiter)
+                    for common in page.get('CommonPrefixes', [])]
 
         try:
-            pages = paginator.paginate(Bucket=bucket_name)
+            if concurrency <= 1:
+                list_range()
+                return metadata, None
+
+            page = s3_client.list_objects_v2(Bucket=bucket_name,
+                                             Prefix=prefix)
+            contents = page.get('Contents', [])
+            metadata.update((meta['Key'], meta['ETag'])
+                            for meta in contents)
+            if not page.get('IsTruncated') or not contents:
+                return metadata, None
+
+            # keys up to last_key are listed, only split the rest
+            last_key = contents[-1]['Key']
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                bounds = set()
+                level = [prefix]
+                for _ in range(max_split_depth):
+                    level = [common_prefix
+                             for common_prefixes in
+                             executor.map(get_common_prefixes, level)
+                             for common_prefix in common_prefixes
+                             if common_prefix > last_key or
+                             last_key.startswith(common_prefix)]
+                    bounds.update(common_prefix for common_prefix in level
+                                  if common_prefix > last_key)
+                    if len(bounds) >= concurrency - 1 or not level:
+                        break
+
+                bounds = sorted(bounds)
+                count = min(concurrency, len(bounds) + 1)
+                cuts = [bounds[len(bounds) * index // count]
+                        for index in range(1, count)]
+                # keys equal to a cut are in its range, so list from
+                # just before it (a shorter key) and filter
+                ranges = [(last_key, None, cuts[0] if cuts else None)] + \
+                    [(max(cut[:-1], last_key), cut, end)
+                     for cut, end in zip(cuts, cuts[1:] + [None])]
+                list(executor.map(lambda key_range: list_range(*key_range),
+                                  ranges))
 
-            for page in pages:
-                if not page.get('Contents'):
-                    continue
-                for meta in page['Contents']:
-                    metadata[meta['Key']] = meta['ETag']
             return metadata, None
         except ClientError as client_error:
             return None, str(client_error)
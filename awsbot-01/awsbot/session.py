@@ -3,28 +3,45 @@
 
 """Main Session Manager class."""
 
-import boto3
+import json
+import time
+import threading
+from pathlib import Path
+
+try:
+    from awsbot import util
+except ImportError:
+    import util
 
 
 class SessionManager():
     """Session Manager Class."""
 
+    BOTOCORE_CONFIG_FILE = '~/.awsbot/{profile}.json'
+    DISK_CACHE_FILE = '~/.awsbot/cache/{profile}/{region}/{name}.json'
+    BOTOCORE_CONFIG_OPTIONS = ('max_pool_connections', 'retry_mode',
+                               'max_attempts', 'connect_timeout',
+                               'read_timeout')
+
     def __init__(self, profile_name='python_automation',
                  region_name=None,
                  s3_region_config='resources/config/s3_region.csv',
                  s3_session=None,
                  r53_session=None, acm_session=None,
                  cf_session=None, ec2_session=None,
-                 cw_session=None):
+                 cw_session=None, botocore_config=None, cache_ttl=None):
         """Initialize the session manager class."""
         if profile_name:
             self.init(profile_name, region_name,
                       s3_region_config, s3_session,
                       r53_session, acm_session,
                       cf_session, ec2_session,
-                      cw_session)
+                      cw_session, botocore_config, cache_ttl)
         else:
             self.session = None
+            self.botocore_config = botocore_config
+            self.init_cache()
+            self.init_disk_cache(cache_ttl)
             self.s3_region_config = s3_region_config
             self.s3_session = s3_session
             self.r53_session = r53_session
@@ -37,13 +54,23 @@ class SessionManager():
              s3_region_config=None, s3_session=None,
              r53_session=None, acm_session=None,
              cf_session=None, ec2_session=None,
-             cw_session=None):
-        """Initialize the class with a new profile_name."""
+             cw_session=None, botocore_config=None, cache_ttl=None):
+        """Initialize the class with a new profile_name.
+
+        'botocore_config' (a botocore.config.Config) is applied to
+        every client and resource created by this session.
+        'cache_ttl' enables the disk cache (see load_disk_cache).
+        """
+        import boto3
+
         if region_name is None:
             self.session = boto3.Session(profile_name=profile_name)
         else:
             self.session = boto3.Session(profile_name=profile_name,
                                          region_name=region_name)
+        self.botocore_config = botocore_config
+        self.init_cache()
+        self.init_disk_cache(cache_ttl)
         self.s3_session = s3_session
         self.s3_region_config = s3_region_config
         self.r53_session = r53_session
@@ -56,19 +83,165 @@ class SessionManager():
         """Get session."""
         return self.session
 
-    def get_resource(self, resource_name, region_name=None):
-        """Get resource by input resource name."""
-        if not region_name:
-            return self.session.resource(resource_name)
+    def get_botocore_config(self):
+        """Get the botocore config applied to all clients and resources."""
+        return self.botocore_config
+
+    def set_botocore_config(self, botocore_config):
+        """Set the botocore config applied to all clients and resources."""
+        self.botocore_config = botocore_config
+        self.invalidate_cache()
+
+    def get_effective_config(self, config=None):
+        """Merge config (if any) into the session botocore config."""
+        if not self.botocore_config:
+            return config
+
+        if not config:
+            return self.botocore_config
+
+        return self.botocore_config.merge(config)
+
+    def get_max_pool_connections(self):
+        """Get the connection pool size of clients created by the session."""
+        from botocore.config import Config
+
+        if self.botocore_config and \
+                self.botocore_config.max_pool_connections:
+            return self.botocore_config.max_pool_connections
+
+        return Config().max_pool_connections
+
+    def get_pool_config(self, max_pool_connections):
+        """Get a config raising the connection pool size if required.
+
+        returns None if the session pool is large enough.
+        """
+        from botocore.config import Config
+
+        if max_pool_connections <= self.get_max_pool_connections():
+            return None
+
+        return Config(max_pool_connections=max_pool_connections)
+
+    def init_cache(self):
+        """Initialize the client and resource cache.
+
+        clients are thread safe and are shared by all threads.
+        resources are not, so each thread gets its own resources.
+        """
+        self.cache_lock = threading.Lock()
+        self.client_cache = {}
+        self.resource_cache = threading.local()
+        self.resource_cache_generation = 0
+
+    def invalidate_cache(self, service_name=None):
+        """Drop cached clients (for service_name or all) and resources."""
+        with self.cache_lock:
+            if service_name:
+                for key in [key for key in self.client_cache
+                            if key[0] == service_name]:
+                    del self.client_cache[key]
+            else:
+                self.client_cache.clear()
+            self.resource_cache_generation += 1
+
+    def init_disk_cache(self, cache_ttl=None):
+        """Initialize the disk cache.
+
+        the disk cache is disabled unless 'cache_ttl' (seconds) is set.
+        """
+        self.cache_ttl = cache_ttl
+        self.disk_cache_created = {}
+
+    def get_disk_cache_file(self, name):
+        """Get the disk cache file of 'name' for this profile and region."""
+        return Path(self.DISK_CACHE_FILE.format(
+            profile=self.session.profile_name or 'default',
+            region=self.session.region_name or 'default',
+            name=name)).expanduser()
+
+    def load_disk_cache(self, name):
+        """Load the disk cache 'name' (a json object).
+
+        lookups that rarely change (image names, hosted zones) can be
+        kept in a disk cache, per profile and region, for 'cache_ttl'
+        seconds. returns {} if the cache is disabled, missing or
+        expired.
+        """
+        if not self.cache_ttl:
+            return {}
+
+        data, created = util.load_json_cache(self.get_disk_cache_file(name),
+                                             self.cache_ttl)
+        if not isinstance(data, dict):
+            return {}
+
+        self.disk_cache_created[name] = created
+        return data
+
+    def save_disk_cache(self, name, data):
+        """Save the disk cache 'name' (if the disk cache is enabled).
 
-        return self.session.resource(resource_name, region_name=region_name)
+        the ttl of a cache is counted from the time it was first saved.
+        """
+        if not self.cache_ttl:
+            return True, None
+
+        created = self.disk_cache_created.setdefault(name, time.time())
+        return util.save_json_cache(self.get_disk_cache_file(name),
+                                    data, created)
 
-    def get_client(self, client_name, region_name=None):
-        """Get client by input client name."""
-        if not region_name:
-            return self.session.client(client_name)
+    def get_cache_key(self, service_name, region_name=None, config=None):
+        """Get the cache key for a client or resource."""
+        return (service_name,
+                region_name or self.session.region_name,
+                self.get_config_key(config))
 
-        return self.session.client(client_name, region_name=region_name)
+    def get_resource(self, resource_name, region_name=None, config=None):
+        """Get resource by input resource name.
+
+        resources are cached per thread and reused by later calls.
+        'config' is merged into the session botocore config.
+        """
+        config = self.get_effective_config(config)
+        cache = getattr(self.resource_cache, 'resources', None)
+        if cache is None or \
+                self.resource_cache.generation != \
+                self.resource_cache_generation:
+            cache = self.resource_cache.resources = {}
+            self.resource_cache.generation = self.resource_cache_generation
+
+        key = self.get_cache_key(resource_name, region_name, config)
+        resource = cache.get(key)
+        if resource is None:
+            with self.cache_lock:
+                resource = self.session.resource(resource_name,
+                                                 region_name=key[1],
+                                                 config=config)
+            cache[key] = resource
+
+        return resource
+
+    def get_client(self, client_name, region_name=None, config=None):
+        """Get client by input client name.
+
+        clients are cached and shared by all threads.
+        'config' is merged into the session botocore config.
+        """
+        config = self.get_effective_config(config)
+        key = self.get_cache_key(client_name, region_name, config)
+        client = self.client_cache.get(key)
+        if client is None:
+            with self.cache_lock:
+                client = self.client_cache.get(key)
+                if client is None:
+                    client = self.session.client(client_name,
+                                                 region_name=key[1],
+                                                 config=config)
+                    self.client_cache[key] = client
+
+        return client
 
     def get_region_name(self):
         """Get region name associated with this session."""
@@ -145,6 +318,84 @@ class SessionManager():
         """Get default region."""
         return 'us-east-1'
 
+    @staticmethod
+    def create_botocore_config(max_pool_connections=None, retry_mode=None,
+                               max_attempts=None, connect_timeout=None,
+                               read_timeout=None):
+        """Create a botocore config from the options that are set.
+
+        returns None if no option is set.
+        """
+        from botocore.config import Config
+
+        options = {}
+        if max_pool_connections:
+            options['max_pool_connections'] = max_pool_connections
+        if connect_timeout is not None:
+            options['connect_timeout'] = connect_timeout
+        if read_timeout is not None:
+            options['read_timeout'] = read_timeout
+
+        retries = {}
+        if retry_mode:
+            retries['mode'] = retry_mode
+        if max_attempts is not None:
+            retries['total_max_attempts'] = max_attempts
+        if retries:
+            options['retries'] = retries
+
+        if not options:
+            return None
+
+        return Config(**options)
+
+    @classmethod
+    def load_botocore_options(cls, profile_name, config_file=None):
+        """Load botocore options from a profile named config file.
+
+        the file is a json document with any of the keys in
+        BOTOCORE_CONFIG_OPTIONS. if 'config_file' is not specified,
+        BOTOCORE_CONFIG_FILE (named after the profile) is used
+        if it exists.
+        """
+        if config_file:
+            path = Path(config_file).expanduser()
+        else:
+            path = Path(cls.BOTOCORE_CONFIG_FILE.
+                        format(profile=profile_name)).expanduser()
+            if not path.is_file():
+                return {}, None
+
+        try:
+            with path.open() as file:
+                options = json.load(file)
+        except (OSError, ValueError) as file_err:
+            return None, f'Cannot load botocore config {path} : {file_err}'
+
+        if not isinstance(options, dict):
+            return None, f'Invalid botocore config {path} : ' + \
+                'expected a json object'
+
+        invalid_options = set(options) - set(cls.BOTOCORE_CONFIG_OPTIONS)
+        if invalid_options:
+            return None, f'Invalid botocore config {path} : ' + \
+                f'unknown options {invalid_options}'
+
+        return options, None
+
+    @staticmethod
+    def get_config_key(config):
+        """Get a hashable key for a botocore config."""
+        if config is None:
+            return None
+
+        options = getattr(config, '_user_provided_options', None)
+        if options is None:
+            options = vars(config)
+
+        return tuple(sorted((name, repr(value))
+                            for name, value in options.items()))
+
     @staticmethod
     def get_client_error_code(err_response):
         """Get client error code from the response."""
@@ -3,8 +3,15 @@
 
 """Utility functions."""
 
+import os
+import stat
+import time
+import threading
 import base64
 import datetime
+import fnmatch
+import math
+import random
 from uuid import uuid4
 import csv
 import mimetypes
@@ -12,8 +19,7 @@ import json
 from json.decoder import JSONDecodeError
 import hashlib
 from pathlib import Path
-import html5lib
-from html5lib.html5parser import ParseError
+from concurrent.futures import ThreadPoolExecutor
 
 
 def get_base64_encoding(data_as_str):
@@ -44,6 +50,9 @@ def is_valid_html_file(html_file):
 
     raises the FileNotFoundException
     """
+    import html5lib
+    from html5lib.html5parser import ParseError
+
     fname, err = get_file_path(html_file)
     if not err:
         html_file = fname
@@ -59,6 +68,9 @@ def is_valid_html_file(html_file):
 
 def is_valid_html_string(html_string):
     """Validate the string passed in as html."""
+    import html5lib
+    from html5lib.html5parser import ParseError
+
     try:
         parser = html5lib.HTMLParser(strict=True)
         parser.parse(html_string)
@@ -93,6 +105,36 @@ def is_valid_json_string(json_str):
         return False, str(decode_error)
 
 
+def load_yaml_or_json_file(filename):
+    """Load a yaml (.yaml or .yml, needs PyYAML) or a json file.
+
+    returns (data, err).
+    """
+    fname, err = get_file_path(filename)
+    if not err:
+        filename = fname
+
+    try:
+        with open(filename) as file:
+            if Path(filename).suffix.lower() not in ('.yaml', '.yml'):
+                return json.load(file), None
+
+            try:
+                import yaml
+            except ImportError:
+                return None, 'PyYAML is required to read yaml files ' + \
+                    '(pip install pyyaml)'
+
+            try:
+                return yaml.safe_load(file), None
+            except yaml.YAMLError as yaml_error:
+                return None, f'Invalid Yaml File {filename} : {yaml_error}'
+    except OSError as file_error:
+        return None, str(file_error)
+    except JSONDecodeError as decode_error:
+        return None, f'Invalid Json File {filename} : {decode_error}'
+
+
 def is_valid_html(html_content, file_type=None, estr=None):
     """Validate the filename or a string passed in as html."""
     try:
@@ -133,27 +175,120 @@ def is_valid_json(json_content, file_type=None, estr=None):
         return is_valid_json(json_content, 'str', str(file_error))
 
 
-def walk_fs_tree(path,
-                 pfunc=lambda p, root:
-                 print(f'{str(p)} : ' +
-                       f'{str(p.relative_to(root).as_posix())}'),
-                 ignore_hidden_files=True,
-                 root=None):
-    """Walk and process files in fs tree.
+def is_fs_path_selected(rel_path, include=None, exclude=None,
+                        check_dirs=False):
+    """Determine if a relative (posix) path passes the glob filters.
 
-    walk fs specified by Path object and executes pfunc
-    for each file found in path
+    a path is selected if it matches any of the 'include' patterns
+    (or no include patterns are given) and none of the 'exclude'
+    patterns. if 'check_dirs' is set, the path is also not selected
+    if any of its parent directories matches an exclude pattern
+    (i.e. it would have been pruned by scan_fs_tree).
     """
-    if root is None:
-        root = path
-
-    for node in path.iterdir():
-        if node.is_dir():
-            walk_fs_tree(node, pfunc, ignore_hidden_files, root)
-        elif node.is_file():
-            if ignore_hidden_files and node.parts[-1].startswith('.'):
+    if exclude and check_dirs:
+        parts = rel_path.split('/')
+        for index in range(1, len(parts)):
+            if not is_fs_path_selected('/'.join(parts[:index]),
+                                       None, exclude):
+                return False
+
+    if include and not any(fnmatch.fnmatchcase(rel_path, pattern)
+                           for pattern in include):
+        return False
+
+    if exclude and any(fnmatch.fnmatchcase(rel_path, pattern)
+                       for pattern in exclude):
+        return False
+
+    return True
+
+
+def scan_fs_tree(path, include=None, exclude=None,
+                 ignore_hidden_files=True, ignore_hidden_dirs=False,
+                 symlinks='follow', onerror=None):
+    """Iterate over files in fs tree.
+
+    walks the fs tree rooted at 'path' iteratively (no recursion)
+    using os.scandir and yields (abs_path, rel_posix_path, stat_result)
+    for each file found. each entry is stat'ed at most once.
+
+    include/exclude are collections of glob patterns matched against
+    the relative posix path. directories matching an exclude pattern
+    are not descended into.
+
+    symlinks - 'follow' => follow links to files and directories
+                           (links to one of their parent directories
+                           are skipped, other directories reached
+                           through several links are walked each time)
+               'files'  => follow links to files only
+               'skip'   => ignore all symbolic links
+    dangling links are skipped.
+
+    onerror - called with the OSError if a directory cannot be
+              scanned or a file cannot be stat'ed. errors are
+              ignored if not specified.
+    """
+    if symlinks not in ('follow', 'files', 'skip'):
+        raise ValueError(f'Invalid symlinks policy : {symlinks}')
+
+    root = os.path.abspath(os.path.expanduser(str(path)))
+    # each directory is pushed with the (st_dev, st_ino) keys of its
+    # ancestors, so that only loops back to an ancestor are cut
+    stack = [(root, '', frozenset())]
+
+    while stack:
+        dir_path, rel_dir, ancestors = stack.pop()
+
+        try:
+            dir_stat = os.stat(dir_path)
+            dir_key = (dir_stat.st_dev, dir_stat.st_ino)
+            if dir_key in ancestors:
+                continue
+            ancestors = ancestors | {dir_key}
+            entries = list(os.scandir(dir_path))
+        except OSError as os_error:
+            if onerror:
+                onerror(os_error)
+            continue
+
+        for entry in entries:
+            rel_path = rel_dir + entry.name
+            hidden = entry.name.startswith('.')
+            try:
+                if entry.is_symlink() and (
+                        symlinks == 'skip' or
+                        (symlinks == 'files' and
+                         entry.is_dir(follow_symlinks=True))):
+                    continue
+
+                if entry.is_dir(follow_symlinks=True):
+                    if ignore_hidden_dirs and hidden:
+                        continue
+                    if exclude and not \
+                            is_fs_path_selected(rel_path, None, exclude):
+                        continue
+                    stack.append((entry.path, rel_path + '/', ancestors))
+                    continue
+
+                if ignore_hidden_files and hidden:
+                    continue
+
+                if not is_fs_path_selected(rel_path, include, exclude):
+                    continue
+
+                stat_result = entry.stat(follow_symlinks=True)
+                if not stat.S_ISREG(stat_result.st_mode):
+                    continue
+            except FileNotFoundError as os_error:
+                if onerror and not entry.is_symlink():
+                    onerror(os_error)
+                continue
+            except OSError as os_error:
+                if onerror:
+                    onerror(os_error)
                 continue
-            pfunc(node, root)
+
+            yield entry.path, rel_path, stat_result
 
 
 def get_content_type_from_filename(filename):
@@ -227,6 +362,64 @@ def md5digest(filename, chunksize=None):
         return None, str(file_error)
 
 
+def get_md5_chunks(size, chunksize=None):
+    """Get the (offset, length) of each chunk hashed by md5digest."""
+    if not chunksize or size <= chunksize:
+        return [(0, size)]
+
+    return [(offset, min(chunksize, size - offset))
+            for offset in range(0, size, chunksize)]
+
+
+def join_md5_digests(digests):
+    """Join chunk digests into the s3 style '<md5>[-<n>]' hex digest."""
+    if len(digests) == 1:
+        return digests[0].hex()
+
+    return '{}-{}'.format(hashlib.md5(b''.join(digests)).hexdigest(),
+                          len(digests))
+
+
+def md5digest_concurrent(filename, chunksize=None, executor=None):
+    """Compute the md5digest of 'filename', hashing chunks concurrently.
+
+    returns the same '<md5-of-md5s>-<n>' s3 multipart etag as md5digest
+    but reads (os.pread) and hashes the chunks of a multi chunk file
+    concurrently on the (thread pool) 'executor'. hashlib and the reads
+    release the GIL, so the chunks are hashed on multiple cores. a
+    file truncated while it is hashed yields a different digest (a
+    memory map would raise SIGBUS). a private pool is used if no
+    executor is passed in.
+    """
+    fname, err = get_file_path(filename)
+    try:
+        fd = os.open(fname if not err else filename, os.O_RDONLY)
+    except OSError as os_error:
+        return None, str(os_error)
+
+    def hash_chunk(chunk):
+        offset, length = chunk
+        return hashlib.md5(os.pread(fd, length, offset)).digest()
+
+    try:
+        chunks = get_md5_chunks(os.fstat(fd).st_size, chunksize)
+        if len(chunks) == 1:
+            return join_md5_digests([hash_chunk(chunks[0])]), None
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) \
+                    as own_executor:
+                digests = list(own_executor.map(hash_chunk, chunks))
+        else:
+            digests = list(executor.map(hash_chunk, chunks))
+
+        return join_md5_digests(digests), None
+    except OSError as os_error:
+        return None, str(os_error)
+    finally:
+        os.close(fd)
+
+
 def get_file_path(path):
     """Determine if path is within the awsbot directory.
 
@@ -449,6 +642,14 @@ def remove_duplicates_from_list(input_list):
     return output_list, None
 
 
+def get_batches(values, batch_size):
+    """Split a sequence into lists of up to 'batch_size' values."""
+    values = list(values)
+    batch_size = max(1, batch_size)
+    return [values[index:index + batch_size]
+            for index in range(0, len(values), batch_size)]
+
+
 def get_dict_from_list(keys, values, def_value_func,
                        remove_duplicates=False,
                        valid_values=None, delimiter=','):
@@ -484,5 +685,138 @@ def get_dict_from_list(keys, values, def_value_func,
     return key_value_dict, None
 
 
+def load_json_cache(cache_file, ttl):
+    """Load a json cache file written by save_json_cache.
+
+    returns the (data, created) of the cache, or (None, None) if the
+    file is missing, invalid or was created more than 'ttl' seconds ago.
+    """
+    try:
+        with Path(cache_file).expanduser().open() as file:
+            cache = json.load(file)
+        created = float(cache['created'])
+        if time.time() - created > ttl:
+            return None, None
+        return cache['data'], created
+    except (OSError, ValueError, TypeError, KeyError):
+        return None, None
+
+
+def save_json_cache(cache_file, data, created=None):
+    """Save data (json serializable) to a json cache file.
+
+    'created' (defaults to now) is the time the ttl of the cache is
+    counted from. the file is replaced atomically.
+    """
+    path = Path(cache_file).expanduser()
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with temp_path.open('w') as file:
+            json.dump({'created': created or time.time(), 'data': data},
+                      file)
+        os.replace(temp_path, path)
+        return True, None
+    except (OSError, TypeError, ValueError) as cache_err:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        return False, f'Cannot save cache {path} : {cache_err}'
+
+
+class RateLimiter():
+    """Thread safe rate limiter (token bucket).
+
+    allows up to 'rate' calls a second on average, with bursts of up to
+    'burst' calls (defaults to rate). a rate of 0 or None disables it.
+    """
+
+    def __init__(self, rate, burst=None):
+        """Initialize the rate limiter."""
+        self.rate = rate
+        self.burst = max(1, burst or rate or 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a call is allowed."""
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class AdaptiveLimiter():
+    """Thread safe adaptive concurrency limiter (AIMD).
+
+    allows up to 'limit' concurrent calls, starting at 'max_limit'.
+    the limit is halved each time a call is throttled and raised by one
+    (up to 'max_limit') once 'limit' calls in a row succeed.
+    """
+
+    def __init__(self, max_limit):
+        """Initialize the adaptive limiter."""
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.successes = 0
+        self.throttled_count = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Wait until a call is allowed."""
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        """Release a call, adapting the limit to its outcome."""
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled_count += 1
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and \
+                        self.limit < self.max_limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+def get_backoff_delay(attempt, base=0.5, cap=20):
+    """Get the delay before retrying a call (exponential, full jitter)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def get_percentiles(values, percentiles=(50, 90, 99)):
+    """Get the (nearest rank) percentiles of values.
+
+    returns {percentile: value}, empty if there are no values.
+    """
+    values = sorted(values)
+    if not values:
+        return {}
+
+    return {percentile: values[max(0, math.ceil(percentile *
+                                                len(values) / 100) - 1)]
+            for percentile in percentiles}
+
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,66 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Base class of the unit tests run against moto mocked aws services."""
+
+import os
+import unittest
+from unittest import mock
+
+import boto3
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+try:
+    from awsbot.session import SessionManager
+except ImportError:
+    from session import SessionManager
+
+
+@unittest.skipIf(mock_aws is None, 'moto is not installed')
+class MotoTestCase(unittest.TestCase):
+    """Base class of the unit tests run against moto mocked aws services.
+
+    each test gets a fresh mocked account, a SessionManager bound to it
+    ('session') and the count of the api calls made, by operation
+    name ('api_calls').
+    """
+
+    REGION_NAME = 'us-east-1'
+    # never talk to a real account, whatever the environment says.
+    ENVIRON = {'AWS_ACCESS_KEY_ID': 'awsbot-test',
+               'AWS_SECRET_ACCESS_KEY': 'awsbot-test',
+               'AWS_SESSION_TOKEN': 'awsbot-test',
+               'AWS_DEFAULT_REGION': REGION_NAME}
+
+    def setUp(self):
+        """Start the aws mocks and create the session."""
+        environ = mock.patch.dict(os.environ, self.ENVIRON)
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop('AWS_PROFILE', None)
+
+        aws_mock = mock_aws()
+        aws_mock.start()
+        self.addCleanup(aws_mock.stop)
+
+        self.session = SessionManager(profile_name=None)
+        self.session.session = boto3.Session(region_name=self.REGION_NAME)
+        self.api_calls = {}
+        self.session.get_session().events.register('before-call',
+                                                   self.count_api_call)
+
+    def count_api_call(self, model, **kwargs):
+        """Count an api call."""
+        self.api_calls[model.name] = self.api_calls.get(model.name, 0) + 1
+
+    def get_client(self, service_name):
+        """Get a client of the mocked account."""
+        return self.session.get_session().client(service_name)
+
+
+if __name__ == '__main__':
+    pass
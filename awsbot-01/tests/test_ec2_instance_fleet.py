@@ -0,0 +1,164 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance fleet launch unit tests."""
+
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+try:
+    from awsbot.ec2_instance_fleet import EC2InstanceFleet
+    from awsbot.ec2_session import EC2SessionManager
+except ImportError:
+    from ec2_instance_fleet import EC2InstanceFleet
+    from ec2_session import EC2SessionManager
+
+from tests.moto_session import MotoTestCase
+
+
+def make_client_error(code):
+    """Make a ClientError of an error code."""
+    return ClientError({'Error': {'Code': code, 'Message': code}},
+                       'CreateTags')
+
+
+class EC2InstanceFleetPlanTest(unittest.TestCase):
+    """EC2InstanceFleet planning unit tests."""
+
+    def test_instance_names(self):
+        """Names are listed or generated from a pattern."""
+        get_names = EC2InstanceFleet.get_instance_names
+        self.assertEqual(get_names(instance_names='a,b'), (['a', 'b'], None))
+        self.assertEqual(get_names(3), ([None, None, None], None))
+        self.assertEqual(get_names(2, '{project}-{index:02d}',
+                                   project_name='web'),
+                         (['web-01', 'web-02'], None))
+        self.assertIn('for 3 instances',
+                      get_names(3, instance_names=['a', 'b'])[1])
+        self.assertIn('Invalid name pattern', get_names(2, '{name}')[1])
+        self.assertIn('Require count', get_names()[1])
+
+    def test_plan_launches(self):
+        """Instances sharing a subnet and user data share a launch."""
+        names = ['web-1', 'web-2', 'web-3', 'web-4', 'web-5']
+        shared = EC2InstanceFleet.compile_user_data('echo $NAME')
+        self.assertEqual(
+            EC2InstanceFleet.plan_launches(names, ['subnet-1', 'subnet-2'],
+                                           shared),
+            [('subnet-1', 'echo $NAME', ['web-1', 'web-3', 'web-5']),
+             ('subnet-2', 'echo $NAME', ['web-2', 'web-4'])])
+
+        rendered = EC2InstanceFleet.compile_user_data('echo %s; echo %s')
+        plan = EC2InstanceFleet.plan_launches(names[:2], None, rendered)
+        self.assertEqual(plan, [(None, 'echo web-1; echo web-1', ['web-1']),
+                                (None, 'echo web-2; echo web-2', ['web-2'])])
+        self.assertEqual(EC2InstanceFleet.plan_launches(
+            names[:2], None, EC2InstanceFleet.compile_user_data(None)),
+                         [(None, None, ['web-1', 'web-2'])])
+
+
+class EC2InstanceFleetLaunchTest(MotoTestCase):
+    """EC2InstanceFleet launch unit tests."""
+
+    def setUp(self):
+        """Create the fleet launcher."""
+        super().setUp()
+        self.ec2_client = self.get_client('ec2')
+        self.image_id = self.ec2_client.describe_images(
+            Owners=['amazon'])['Images'][0]['ImageId']
+        self.subnet_ids = sorted(
+            subnet['SubnetId'] for subnet in
+            self.ec2_client.describe_subnets()['Subnets'])[:2]
+        self.ec2_session = EC2SessionManager(self.session)
+        self.fleet = EC2InstanceFleet(self.ec2_session)
+        backoff = mock.patch('awsbot.util.get_backoff_delay',
+                             return_value=0)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+        self.api_calls.clear()
+
+    def get_instance_names(self, instance_ids):
+        """Get the {instance_id: name} of instances."""
+        return {instance['InstanceId']: tag['Value']
+                for reservation in self.ec2_client.describe_instances(
+                    InstanceIds=instance_ids)['Reservations']
+                for instance in reservation['Instances']
+                for tag in instance.get('Tags', [])
+                if tag['Key'] == 'Name'}
+
+    def test_launch(self):
+        """Shared user data launches one group per subnet, then tags."""
+        names = [f'web-{index}' for index in range(1, 6)]
+        statuses = []
+        instance_ids, failed_count = self.fleet.launch(
+            {'ImageId': self.image_id, 'InstanceType': 't2.micro'}, names,
+            self.subnet_ids, 'echo $NAME', sfunc=statuses.append)
+
+        self.assertEqual(failed_count, 0)
+        self.assertEqual(self.api_calls['RunInstances'], 2)
+        self.assertEqual(self.api_calls['CreateTags'], 5)
+        self.assertEqual(sorted(self.get_instance_names(instance_ids).
+                                values()), names)
+
+    def test_single_instances_are_named_at_launch(self):
+        """Per instance user data launches named instances."""
+        instance_ids, failed_count = self.fleet.launch(
+            {'ImageId': self.image_id, 'InstanceType': 't2.micro'},
+            ['web-1', 'web-2'], user_data='echo %s',
+            sfunc=lambda status: None)
+
+        self.assertEqual(failed_count, 0)
+        self.assertEqual(self.api_calls['RunInstances'], 2)
+        self.assertNotIn('CreateTags', self.api_calls)
+        self.assertEqual(sorted(self.get_instance_names(instance_ids).
+                                values()), ['web-1', 'web-2'])
+
+    def test_tag_retries(self):
+        """Throttled and not yet visible instances are tagged again."""
+        instance_id = self.ec2_client.run_instances(
+            ImageId=self.image_id, MinCount=1,
+            MaxCount=1)['Instances'][0]['InstanceId']
+        client = self.ec2_session.get_ec2_client()
+        create_tags = client.create_tags
+        errors = [make_client_error('RequestLimitExceeded'),
+                  make_client_error('InvalidInstanceID.NotFound')]
+
+        def flaky_create_tags(**kwargs):
+            if errors:
+                raise errors.pop(0)
+            return create_tags(**kwargs)
+
+        statuses = []
+        with mock.patch.object(client, 'create_tags', flaky_create_tags):
+            untagged = self.fleet.tag_instances({instance_id: 'web-1'},
+                                                statuses.append)
+
+        self.assertEqual(untagged, [])
+        self.assertEqual(self.get_instance_names([instance_id]),
+                         {instance_id: 'web-1'})
+        self.assertTrue(statuses[-1].startswith('1 throttled calls'))
+
+    def test_tag_failures(self):
+        """Instances that cannot be tagged are reported."""
+        client = self.ec2_session.get_ec2_client()
+        statuses = []
+        with mock.patch.object(client, 'create_tags', side_effect=(
+                make_client_error('UnauthorizedOperation'))) as create_tags:
+            untagged = self.fleet.tag_instances({'i-1': 'web-1'},
+                                                statuses.append)
+        self.assertEqual(untagged, ['i-1'])
+        self.assertEqual(create_tags.call_count, 1)
+
+        with mock.patch.object(client, 'create_tags', side_effect=(
+                make_client_error('Throttling'))) as create_tags:
+            untagged = self.fleet.tag_instances({'i-1': 'web-1'},
+                                                statuses.append,
+                                                max_attempts=3)
+        self.assertEqual(untagged, ['i-1'])
+        self.assertEqual(create_tags.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
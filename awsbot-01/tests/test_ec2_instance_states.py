@@ -0,0 +1,74 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 instance state change unit tests."""
+
+import unittest
+
+try:
+    from awsbot.ec2_instance import EC2InstanceManager
+    from awsbot.ec2_session import EC2SessionManager
+except ImportError:
+    from ec2_instance import EC2InstanceManager
+    from ec2_session import EC2SessionManager
+
+from tests.moto_session import MotoTestCase
+
+
+class EC2InstanceStatesTest(MotoTestCase):
+    """Batched start, stop and terminate unit tests."""
+
+    def setUp(self):
+        """Launch the instances, changed 2 a call."""
+        super().setUp()
+        self.ec2_client = self.get_client('ec2')
+        image_id = self.ec2_client.describe_images(
+            Owners=['amazon'])['Images'][0]['ImageId']
+        self.instance_ids = sorted(
+            instance['InstanceId'] for instance in
+            self.ec2_client.run_instances(ImageId=image_id, MinCount=5,
+                                          MaxCount=5)['Instances'])
+        self.ec2_session = EC2SessionManager(self.session)
+        self.ec2_session.INSTANCE_BATCH_SIZE = 2
+        self.statuses = []
+        self.api_calls.clear()
+
+    def get_states(self):
+        """Get the {instance_id: state} of the instances."""
+        return self.ec2_session.get_instance_states(self.instance_ids)
+
+    def test_batches(self):
+        """Instances are changed with one call a batch."""
+        changed, failed = self.ec2_session.change_instance_states(
+            'stop', self.instance_ids, self.statuses.append)
+        self.assertEqual((changed, failed), (self.instance_ids, []))
+        self.assertEqual(self.api_calls['StopInstances'], 3)
+        self.assertEqual(set(self.get_states().values()), {'stopped'})
+
+    def test_failed_batches_are_retried_per_instance(self):
+        """One bad instance does not fail the rest of its batch."""
+        instance_ids = self.instance_ids[:3] + ['i-00000000000000000']
+        changed, failed = self.ec2_session.change_instance_states(
+            'terminate', instance_ids, self.statuses.append)
+        self.assertEqual(changed, self.instance_ids[:3])
+        self.assertEqual(failed, ['i-00000000000000000'])
+        # a good batch of 2, then a failed batch retried one at a time
+        self.assertEqual(self.api_calls['TerminateInstances'], 4)
+        self.assertTrue(self.statuses[-1].startswith(
+            'couldnot terminate i-00000000000000000'))
+
+    def test_manager_selects_instances(self):
+        """Terminated instances are not selected again."""
+        instance_manager = EC2InstanceManager(self.ec2_session)
+        self.ec2_session.change_instance_states(
+            'terminate', self.instance_ids[:1], self.statuses.append)
+        self.assertEqual(
+            instance_manager.stop_instances(sfunc=self.statuses.append),
+            (True, 'Success'))
+        states = self.get_states()
+        self.assertEqual(states.pop(self.instance_ids[0]), 'terminated')
+        self.assertEqual(set(states.values()), {'stopped'})
+
+
+if __name__ == '__main__':
+    unittest.main()
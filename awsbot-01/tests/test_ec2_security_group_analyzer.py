@@ -0,0 +1,148 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 security group analyzer and interval tree unit tests."""
+
+import random
+import unittest
+
+try:
+    from awsbot.ec2_security_group_analyzer import EC2SecurityGroupAnalyzer
+    from awsbot.interval_tree import IntervalTree
+except ImportError:
+    from ec2_security_group_analyzer import EC2SecurityGroupAnalyzer
+    from interval_tree import IntervalTree
+
+
+def make_group(group_id, ingress, vpc_id='vpc-1'):
+    """Make a 'DescribeSecurityGroups' group.
+
+    'ingress' is a list of (protocol, from_port, to_port, sources)
+    rules, sources being cidr blocks or group ids.
+    """
+    rules = []
+    for protocol, from_port, to_port, sources in ingress:
+        rule = {'IpProtocol': protocol,
+                'IpRanges': [{'CidrIp': source} for source in sources
+                             if '.' in source],
+                'Ipv6Ranges': [],
+                'UserIdGroupPairs': [{'GroupId': source}
+                                     for source in sources
+                                     if source.startswith('sg-')]}
+        if from_port is not None:
+            rule['FromPort'] = from_port
+            rule['ToPort'] = to_port
+        rules.append(rule)
+
+    return {'GroupId': group_id, 'GroupName': group_id, 'VpcId': vpc_id,
+            'IpPermissions': rules, 'IpPermissionsEgress': []}
+
+
+class IntervalTreeTest(unittest.TestCase):
+    """IntervalTree unit tests."""
+
+    def test_empty(self):
+        """An empty tree has no overlapping intervals."""
+        self.assertEqual(IntervalTree().get_overlapping(0, 65535), [])
+
+    def test_closed_intervals(self):
+        """Intervals sharing an endpoint overlap."""
+        tree = IntervalTree([(22, 22, 'ssh'), (80, 443, 'web'),
+                             (443, 443, 'https'), (0, 65535, 'all')])
+        self.assertEqual(len(tree), 4)
+        self.assertEqual(sorted(tree.get_overlapping(443, 443)),
+                         ['all', 'https', 'web'])
+        self.assertEqual(sorted(tree.get_overlapping(23, 79)), ['all'])
+        self.assertEqual(sorted(tree.get_overlapping(10, 80)),
+                         ['all', 'ssh', 'web'])
+
+    def test_matches_brute_force(self):
+        """Queries return the intervals a linear scan finds."""
+        generator = random.Random(42)
+        intervals = []
+        for index in range(500):
+            lo = generator.randrange(0, 1000)
+            intervals.append((lo, lo + generator.randrange(0, 100), index))
+        tree = IntervalTree(intervals)
+
+        for _ in range(200):
+            lo = generator.randrange(0, 1100)
+            hi = lo + generator.randrange(0, 50)
+            self.assertEqual(sorted(tree.get_overlapping(lo, hi)),
+                             sorted(value for i_lo, i_hi, value in intervals
+                                    if i_lo <= hi and lo <= i_hi))
+
+
+class EC2SecurityGroupAnalyzerTest(unittest.TestCase):
+    """EC2SecurityGroupAnalyzer unit tests."""
+
+    def analyze(self, *groups):
+        """Get the sorted (kind, group_id, rule) findings."""
+        return sorted((finding['kind'], finding['group_id'],
+                       finding['rule']) for finding in
+                      EC2SecurityGroupAnalyzer(groups).analyze())
+
+    def test_clean_group(self):
+        """Disjoint entries have no findings."""
+        self.assertEqual(self.analyze(make_group('sg-1', [
+            ('tcp', 22, 22, ['10.0.0.0/8']),
+            ('tcp', 443, 443, ['192.168.0.0/16'])])), [])
+
+    def test_redundant(self):
+        """Entries allowed by another entry are redundant."""
+        findings = self.analyze(make_group('sg-1', [
+            ('tcp', 0, 1024, ['10.0.0.0/8']),
+            ('tcp', 443, 443, ['10.1.0.0/16'])]))
+        self.assertEqual([finding[0] for finding in findings],
+                         ['redundant'])
+        self.assertIn('10.1.0.0/16', findings[0][2])
+
+    def test_same_entries_are_reported_once(self):
+        """Of two identical entries, only the later one is redundant."""
+        findings = self.analyze(make_group('sg-1', [
+            ('tcp', 443, 443, ['10.0.0.0/8']),
+            ('tcp', 443, 443, ['10.0.0.0/8'])]))
+        self.assertEqual([finding[0] for finding in findings
+                          if finding[0] != 'aggregate'], ['redundant'])
+
+    def test_shadowed(self):
+        """Group entries allowed by an open cidr entry are shadowed."""
+        findings = self.analyze(make_group('sg-1', [
+            ('-1', None, None, ['0.0.0.0/0']),
+            ('tcp', 22, 22, ['sg-2'])]))
+        self.assertEqual([finding[0] for finding in findings],
+                         ['shadowed'])
+
+    def test_overlapping(self):
+        """Entries partially overlapping are reported."""
+        findings = self.analyze(make_group('sg-1', [
+            ('tcp', 0, 500, ['10.0.0.0/8']),
+            ('tcp', 400, 1000, ['10.1.0.0/16'])]))
+        self.assertEqual([finding[0] for finding in findings],
+                         ['overlapping'])
+
+    def test_icmp_does_not_overlap_tcp(self):
+        """Entries of different protocols never overlap."""
+        self.assertEqual(self.analyze(make_group('sg-1', [
+            ('icmp', -1, -1, ['10.0.0.0/8']),
+            ('tcp', 0, 65535, ['10.0.0.0/8'])])), [])
+
+    def test_duplicates(self):
+        """Entries found in several groups of a vpc are duplicates."""
+        rule = ('tcp', 22, 22, ['10.0.0.0/8'])
+        self.assertEqual(
+            [finding[:2] for finding in self.analyze(
+                make_group('sg-1', [rule]), make_group('sg-2', [rule]),
+                make_group('sg-3', [rule], vpc_id='vpc-2'))],
+            [('duplicate', 'sg-1')])
+
+    def test_aggregate(self):
+        """Adjacent cidr blocks of the same ports can be aggregated."""
+        findings = self.analyze(make_group('sg-1', [
+            ('tcp', 443, 443, ['10.0.0.0/24', '10.0.1.0/24'])]))
+        self.assertEqual([finding[0] for finding in findings],
+                         ['aggregate'])
+
+
+if __name__ == '__main__':
+    unittest.main()
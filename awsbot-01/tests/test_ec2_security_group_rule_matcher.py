@@ -0,0 +1,177 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 security group rule matcher and cidr trie unit tests."""
+
+import unittest
+
+try:
+    from awsbot.cidr_trie import CidrTrie, parse_cidr
+    from awsbot.ec2_security_group_rule_matcher import \
+        EC2SecurityGroupRuleMatcher
+except ImportError:
+    from cidr_trie import CidrTrie, parse_cidr
+    from ec2_security_group_rule_matcher import EC2SecurityGroupRuleMatcher
+
+
+def make_rule(ip_protocol='tcp', from_port=None, to_port=None,
+              ipv4_cidrs=(), ipv6_cidrs=(), group_ids=()):
+    """Make a 'DescribeSecurityGroups' rule."""
+    rule = {'IpProtocol': ip_protocol,
+            'IpRanges': [{'CidrIp': cidr} for cidr in ipv4_cidrs],
+            'Ipv6Ranges': [{'CidrIpv6': cidr} for cidr in ipv6_cidrs],
+            'UserIdGroupPairs': [{'GroupId': group_id}
+                                 for group_id in group_ids]}
+    if from_port is not None:
+        rule['FromPort'] = from_port
+        rule['ToPort'] = to_port
+    return rule
+
+
+class CidrTrieTest(unittest.TestCase):
+    """CidrTrie unit tests."""
+
+    def setUp(self):
+        """Create the trie."""
+        self.trie = CidrTrie()
+        for cidr in ('10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24',
+                     '192.168.0.0/16', '2001:db8::/32'):
+            self.trie.add(cidr, cidr)
+
+    def test_parse_cidr(self):
+        """Host bits are ignored and invalid blocks are None."""
+        self.assertEqual(parse_cidr('10.1.2.3/8'), (4, 10 << 24, 8))
+        self.assertEqual(parse_cidr('10.1.2.3'), (4, 0x0a010203, 32))
+        self.assertIsNone(parse_cidr('10.1.2.300/8'))
+        self.assertIsNone(parse_cidr(None))
+        self.assertFalse(self.trie.add('not-a-cidr'))
+        self.assertEqual(len(self.trie), 5)
+
+    def test_contains(self):
+        """A block is in the trie if a prefix contains it."""
+        self.assertIn('10.200.0.0/16', self.trie)
+        self.assertIn('10.0.0.0/8', self.trie)
+        self.assertIn('2001:db8:1::/48', self.trie)
+        self.assertNotIn('11.0.0.0/8', self.trie)
+        self.assertNotIn('10.0.0.0/7', self.trie)
+        self.assertNotIn('2001:db9::/32', self.trie)
+        self.assertNotIn('invalid', self.trie)
+        self.assertIn('1.2.3.4/32', CidrTrie(['0.0.0.0/0']))
+        self.assertNotIn('::/0', CidrTrie(['0.0.0.0/0']))
+
+    def test_containing_and_contained(self):
+        """Prefixes containing, contained by or overlapping a block."""
+        self.assertEqual(self.trie.get_containing('10.1.2.128/25'),
+                         ['10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24'])
+        self.assertEqual(sorted(self.trie.get_contained('10.0.0.0/8')),
+                         ['10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24'])
+        self.assertEqual(sorted(self.trie.get_contained('10.0.0.0/8',
+                                                        strict=True)),
+                         ['10.1.0.0/16', '10.1.2.0/24'])
+        self.assertEqual(self.trie.get_contained('172.16.0.0/12'), [])
+        self.assertEqual(sorted(self.trie.get_overlapping('10.1.0.0/16')),
+                         ['10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24'])
+
+
+class EC2SecurityGroupRuleMatcherTest(unittest.TestCase):
+    """EC2SecurityGroupRuleMatcher unit tests."""
+
+    WEB_RULE = make_rule('tcp', 400, 500,
+                         ipv4_cidrs=['10.1.0.0/16', '192.168.1.0/24'],
+                         ipv6_cidrs=['2001:db8:1::/48'],
+                         group_ids=['sg-1', 'sg-2'])
+
+    def test_any_criteria(self):
+        """A matcher without criteria matches the rules with entries."""
+        matcher = EC2SecurityGroupRuleMatcher()
+        self.assertEqual(matcher.match(self.WEB_RULE), self.WEB_RULE)
+        self.assertIsNone(matcher.match(make_rule()))
+        self.assertIsNone(matcher.match(None))
+
+    def test_protocols(self):
+        """Protocols are matched by name or number."""
+        self.assertTrue(EC2SecurityGroupRuleMatcher(['6']).
+                        match(self.WEB_RULE))
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(['udp', 'icmp']).
+                          match(self.WEB_RULE))
+        self.assertTrue(EC2SecurityGroupRuleMatcher(['any']).match(
+            make_rule('-1', ipv4_cidrs=['0.0.0.0/0'])))
+
+    def test_port_containment(self):
+        """A rule matches if its port range contains the ports."""
+        def match(from_port, to_port, rule=self.WEB_RULE):
+            return EC2SecurityGroupRuleMatcher(
+                from_port=from_port, to_port=to_port).match(rule)
+
+        self.assertTrue(match(443, None))
+        self.assertTrue(match(None, 443))
+        self.assertTrue(match(400, 500))
+        self.assertTrue(match(420, 450))
+        self.assertIsNone(match(300, 450))
+        self.assertIsNone(match(80, None))
+        # rules without ports (or -1) are open on all ports
+        self.assertTrue(match(22, None, make_rule(
+            '-1', ipv4_cidrs=['0.0.0.0/0'])))
+        self.assertTrue(match(22, 80, make_rule(
+            'tcp', -1, -1, ipv4_cidrs=['0.0.0.0/0'])))
+
+    def test_exact_ports(self):
+        """With exact_port, the rule ports must be the same."""
+        def match(from_port, to_port):
+            return EC2SecurityGroupRuleMatcher(
+                from_port=from_port, to_port=to_port,
+                exact_port=True).match(self.WEB_RULE)
+
+        self.assertTrue(match(400, 500))
+        self.assertTrue(match(400, None))
+        self.assertIsNone(match(420, 450))
+        self.assertIsNone(match(443, None))
+
+    def test_icmp(self):
+        """Icmp type / code match the rule ports, other rules do not."""
+        echo_rule = make_rule('icmp', 8, -1, ipv4_cidrs=['0.0.0.0/0'])
+        self.assertTrue(EC2SecurityGroupRuleMatcher(
+            icmp_type='8', icmp_code='any').match(echo_rule))
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(
+            icmp_type='0').match(echo_rule))
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(
+            icmp_type='8').match(self.WEB_RULE))
+
+    def test_cidr_containment(self):
+        """Cidr criteria keep the rule entries they contain."""
+        matched = EC2SecurityGroupRuleMatcher(
+            ipv4_cidrs=['10.0.0.0/8']).match(self.WEB_RULE)
+        self.assertEqual(matched['IpRanges'], [{'CidrIp': '10.1.0.0/16'}])
+        self.assertEqual(matched['Ipv6Ranges'], [])
+        self.assertEqual(matched['UserIdGroupPairs'], [])
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(
+            ipv4_cidrs=['10.1.2.0/24']).match(self.WEB_RULE))
+        self.assertEqual(EC2SecurityGroupRuleMatcher(
+            ipv6_cidrs=['2001:db8::/32']).match(
+                self.WEB_RULE)['Ipv6Ranges'],
+                         [{'CidrIpv6': '2001:db8:1::/48'}])
+
+    def test_exact_cidrs(self):
+        """With exact_cidr, the rule blocks must be the same."""
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(
+            ipv4_cidrs=['10.0.0.0/8'], exact_cidr=True).
+                          match(self.WEB_RULE))
+        self.assertEqual(EC2SecurityGroupRuleMatcher(
+            ipv4_cidrs=['10.1.0.1/16'], exact_cidr=True).
+                         match(self.WEB_RULE)['IpRanges'],
+                         [{'CidrIp': '10.1.0.0/16'}])
+
+    def test_groups(self):
+        """Group criteria keep the rule group entries."""
+        matched = EC2SecurityGroupRuleMatcher(
+            group_ids=['sg-2', 'sg-3'],
+            ipv4_cidrs=['192.168.0.0/16']).match(self.WEB_RULE)
+        self.assertEqual(matched['UserIdGroupPairs'], [{'GroupId': 'sg-2'}])
+        self.assertEqual(matched['IpRanges'],
+                         [{'CidrIp': '192.168.1.0/24'}])
+        self.assertIsNone(EC2SecurityGroupRuleMatcher(
+            group_ids=['sg-3']).match(self.WEB_RULE))
+
+
+if __name__ == '__main__':
+    unittest.main()
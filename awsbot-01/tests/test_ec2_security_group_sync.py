@@ -0,0 +1,186 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 security group desired state sync unit tests."""
+
+import json
+import os
+import tempfile
+import unittest
+
+try:
+    from awsbot.ec2_security_group import EC2SecurityGroupManager
+    from awsbot.ec2_security_group_sync import EC2SecurityGroupSync
+    from awsbot.ec2_session import EC2SessionManager
+except ImportError:
+    from ec2_security_group import EC2SecurityGroupManager
+    from ec2_security_group_sync import EC2SecurityGroupSync
+    from ec2_session import EC2SessionManager
+
+from tests.moto_session import MotoTestCase
+
+
+class EC2SecurityGroupSyncTest(MotoTestCase):
+    """EC2SecurityGroupSync unit tests."""
+
+    def setUp(self):
+        """Create the web and app groups.
+
+        web allows ssh from 10.0.0.0/8 and https from anywhere, app
+        has no ingress rules.
+        """
+        super().setUp()
+        self.ec2_client = self.get_client('ec2')
+        self.vpc_id = self.ec2_client.describe_vpcs(
+            Filters=[{'Name': 'is-default',
+                      'Values': ['true']}])['Vpcs'][0]['VpcId']
+        self.web_id = self.create_group('web')
+        self.app_id = self.create_group('app')
+        self.ec2_client.authorize_security_group_ingress(
+            GroupId=self.web_id, IpPermissions=[
+                {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22,
+                 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]},
+                {'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}])
+        self.sync = EC2SecurityGroupSync(EC2SecurityGroupManager(
+            EC2SessionManager(self.session)))
+        self.api_calls.clear()
+
+    def create_group(self, name):
+        """Create a group of the default vpc, returns its id."""
+        return self.ec2_client.create_security_group(
+            GroupName=name, Description=name, VpcId=self.vpc_id)['GroupId']
+
+    def plan(self, security_groups):
+        """Plan the sync, returns {(group name, direction): (add, remove)}."""
+        changes, err = self.sync.plan({'security_groups': security_groups})
+        self.assertIsNone(err)
+        return {(change['group']['GroupName'], change['direction']):
+                (change['add'], change['remove']) for change in changes}
+
+    def get_plan_error(self, security_groups):
+        """Get the error of a plan expected to fail."""
+        changes, err = self.sync.plan(security_groups)
+        self.assertIsNone(changes)
+        return err
+
+    def test_plan(self):
+        """Only the added and removed entries are planned."""
+        self.assertEqual(self.plan({
+            'web': {'ingress': [
+                {'ip_protocol': 'tcp', 'port_range': '443',
+                 'ipv4_cidr': '0.0.0.0/0'},
+                {'ip_protocol': 'tcp', 'port_range': '80',
+                 'ipv4_cidr': ['0.0.0.0/0']}]},
+            self.app_id: {'vpc_id': self.vpc_id, 'ingress': [
+                {'ip_protocol': 'tcp', 'port_range': '8080-8081',
+                 'security_groups': 'web'}]}}),
+            {('web', 'ingress'):
+                ([('tcp', 80, 80, 'IpRanges', '0.0.0.0/0')],
+                 [('tcp', 22, 22, 'IpRanges', '10.0.0.0/8')]),
+             ('app', 'ingress'):
+                ([('tcp', 8080, 8081, 'UserIdGroupPairs', self.web_id)],
+                 [])})
+
+    def test_plan_without_changes(self):
+        """Equivalent cidr blocks and absent directions are not changed."""
+        self.assertEqual(self.plan({
+            'web': {'ingress': [
+                {'ip_protocol': 'tcp', 'port_range': '22',
+                 'ipv4_cidr': '10.1.2.3/8'},
+                {'ip_protocol': '6', 'port_range': '443-443',
+                 'ipv4_cidr': '0.0.0.0/0'}]},
+            'app': {}}), {})
+
+    def test_plan_removes_all(self):
+        """An empty direction removes all its entries."""
+        self.assertEqual(self.plan({'web': {'ingress': []}}),
+                         {('web', 'ingress'): (
+                             [], [('tcp', 22, 22, 'IpRanges', '10.0.0.0/8'),
+                                  ('tcp', 443, 443, 'IpRanges',
+                                   '0.0.0.0/0')])})
+
+    def test_plan_errors(self):
+        """Invalid desired states are reported, not planned."""
+        self.assertIn('security_groups mapping',
+                      self.get_plan_error({'groups': {}}))
+        self.assertIn('Invalid Group : missing', self.get_plan_error(
+            {'security_groups': {'missing': {'ingress': []}}}))
+        self.assertIn('Invalid rule keys', self.get_plan_error(
+            {'security_groups': {'web': {'ingress': [
+                {'ipv4_cidr': '0.0.0.0/0', 'ports': '80'}]}}}))
+        self.assertIn('Invalid port range', self.get_plan_error(
+            {'security_groups': {'web': {'ingress': [
+                {'ip_protocol': 'tcp', 'port_range': '80-x',
+                 'ipv4_cidr': '0.0.0.0/0'}]}}}))
+        self.assertIn('Invalid ipv4_cidr', self.get_plan_error(
+            {'security_groups': {'web': {'ingress': [
+                {'ipv4_cidr': '10.0.0.300/8'}]}}}))
+        self.assertIn('No cidr blocks or groups', self.get_plan_error(
+            {'security_groups': {'web': {'ingress': [
+                {'ip_protocol': 'tcp'}]}}}))
+
+    def apply(self, security_groups, dry_run=False):
+        """Apply a desired state file, returns (aok, status, printed)."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_file = os.path.join(tmp_dir, 'state.json')
+            with open(state_file, 'w') as file:
+                json.dump({'security_groups': security_groups}, file)
+            printed = []
+            aok, status = self.sync.apply(
+                state_file, dry_run=dry_run,
+                pfunc=lambda action, change, entry: printed.append(
+                    (action, self.sync.get_entry_label(entry))),
+                sfunc=lambda status: None)
+        return aok, status, printed
+
+    def test_dry_run(self):
+        """Dry runs print the changes and apply nothing."""
+        aok, status, printed = self.apply(
+            {'web': {'ingress': [{'ip_protocol': 'any',
+                                  'ipv4_cidr': '10.0.0.0/8'}]}},
+            dry_run=True)
+        self.assertTrue(aok)
+        self.assertEqual(status, '1 rule entries to add, 2 to remove ' +
+                         'in 1 groups')
+        self.assertEqual(sorted(printed),
+                         [('+', 'Any-Protocol | Any-Port | 10.0.0.0/8'),
+                          ('-', 'tcp | 22 | 10.0.0.0/8'),
+                          ('-', 'tcp | 443 | 0.0.0.0/0')])
+        self.assertEqual(len(self.plan({'web': {'ingress': []}})), 1)
+        self.assertNotIn('AuthorizeSecurityGroupIngress', self.api_calls)
+
+    def test_apply(self):
+        """Each group direction gets one authorize and one revoke call."""
+        desired = {
+            'web': {
+                'ingress': [{'ip_protocol': 'tcp', 'port_range': '443',
+                             'ipv4_cidr': '0.0.0.0/0'},
+                            {'ip_protocol': 'tcp', 'port_range': '80',
+                             'ipv4_cidr': '0.0.0.0/0',
+                             'description': 'http'},
+                            {'ip_protocol': 'icmp', 'icmp_type': 8,
+                             'ipv4_cidr': '10.0.0.0/8'}],
+                'egress': [{'ip_protocol': 'tcp', 'port_range': '5432',
+                            'security_groups': 'app'}]},
+            'app': {'ingress': [{'ip_protocol': 'tcp',
+                                 'port_range': '8080',
+                                 'security_groups': self.web_id}]}}
+        aok, status, _ = self.apply(desired)
+        self.assertTrue(aok, status)
+        self.assertEqual(self.api_calls['AuthorizeSecurityGroupIngress'], 2)
+        self.assertEqual(self.api_calls['RevokeSecurityGroupIngress'], 1)
+        self.assertEqual(self.api_calls['AuthorizeSecurityGroupEgress'], 1)
+        self.assertEqual(self.api_calls['RevokeSecurityGroupEgress'], 1)
+        self.assertEqual(self.plan(desired), {})
+
+        web = self.ec2_client.describe_security_groups(
+            GroupIds=[self.web_id])['SecurityGroups'][0]
+        http = [rule for rule in web['IpPermissions']
+                if rule.get('FromPort') == 80][0]
+        self.assertEqual(http['IpRanges'],
+                         [{'CidrIp': '0.0.0.0/0', 'Description': 'http'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
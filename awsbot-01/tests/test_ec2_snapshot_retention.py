@@ -0,0 +1,237 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""EC2 snapshot retention and pruning unit tests."""
+
+import datetime
+import unittest
+
+try:
+    from awsbot.ec2_session import EC2SessionManager
+    from awsbot.ec2_snapshot import EC2SnapshotManager
+    from awsbot.ec2_snapshot_record import EC2SnapshotRecord
+    from awsbot.ec2_snapshot_retention import EC2SnapshotRetention
+    from awsbot.ec2_volume_record import EC2VolumeRecord
+except ImportError:
+    from ec2_session import EC2SessionManager
+    from ec2_snapshot import EC2SnapshotManager
+    from ec2_snapshot_record import EC2SnapshotRecord
+    from ec2_snapshot_retention import EC2SnapshotRetention
+    from ec2_volume_record import EC2VolumeRecord
+
+from tests.moto_session import MotoTestCase
+
+NOW = datetime.datetime(2024, 3, 31, 12, tzinfo=datetime.timezone.utc)
+
+
+def make_snapshots(volume_id, hours, state='completed'):
+    """Get snapshots of volume taken 'hours' before NOW, newest first."""
+    return [EC2SnapshotRecord({
+        'SnapshotId': f'snap-{volume_id}-{hour}',
+        'VolumeId': volume_id,
+        'State': state,
+        'StartTime': NOW - datetime.timedelta(hours=hour)})
+            for hour in sorted(hours)]
+
+
+def get_ids(snapshots):
+    """Get the sorted ids of snapshots."""
+    return sorted(snapshot.id for snapshot in snapshots)
+
+
+class EC2SnapshotRetentionTest(unittest.TestCase):
+    """EC2SnapshotRetention unit tests."""
+
+    # 4 snapshots a day (every 6 hours) for 60 days
+    SNAPSHOTS = make_snapshots('vol-1', range(0, 24 * 60, 6))
+
+    def get_kept(self, **kwargs):
+        """Get the ids of the snapshots kept by a policy."""
+        expired = EC2SnapshotRetention(**kwargs).\
+            get_expired_snapshots(self.SNAPSHOTS, NOW)
+        return sorted(set(get_ids(self.SNAPSHOTS)) - set(get_ids(expired)))
+
+    def test_validate(self):
+        """A policy needs at least one keep rule."""
+        self.assertFalse(EC2SnapshotRetention(max_age=7).validate()[0])
+        self.assertTrue(EC2SnapshotRetention(weekly=2).validate()[0])
+
+    def test_no_keep_rule_expires_nothing(self):
+        """A policy without keep rules never expires snapshots."""
+        self.assertEqual(EC2SnapshotRetention(max_age=1).
+                         get_expired_snapshots(self.SNAPSHOTS, NOW), [])
+
+    def test_keep_last(self):
+        """The newest keep_last snapshots are kept."""
+        self.assertEqual(self.get_kept(keep_last=3),
+                         ['snap-vol-1-0', 'snap-vol-1-12', 'snap-vol-1-6'])
+
+    def test_daily(self):
+        """The newest snapshot of each of the newest days is kept."""
+        # NOW is at noon: 0 to 12 hours ago are today, 18 is yesterday
+        self.assertEqual(self.get_kept(daily=3),
+                         ['snap-vol-1-0', 'snap-vol-1-18', 'snap-vol-1-42'])
+
+    def test_weekly_and_monthly(self):
+        """Weekly and monthly buckets use iso weeks and months."""
+        # NOW is on sunday the 31st of march 2024, the week started
+        # 156 hours ago and the month 732 hours ago
+        self.assertEqual(self.get_kept(weekly=2),
+                         ['snap-vol-1-0', 'snap-vol-1-162'])
+        self.assertEqual(self.get_kept(monthly=3),
+                         ['snap-vol-1-0', 'snap-vol-1-1434',
+                          'snap-vol-1-738'])
+
+    def test_rules_are_combined(self):
+        """A snapshot kept by any rule is kept."""
+        self.assertEqual(self.get_kept(keep_last=2, daily=2),
+                         ['snap-vol-1-0', 'snap-vol-1-18', 'snap-vol-1-6'])
+
+    def test_max_age(self):
+        """Max age limits the bucket rules but not keep_last."""
+        self.assertEqual(self.get_kept(monthly=3, max_age=40),
+                         ['snap-vol-1-0', 'snap-vol-1-738'])
+        self.assertEqual(self.get_kept(keep_last=2, daily=5, max_age=1),
+                         ['snap-vol-1-0', 'snap-vol-1-18', 'snap-vol-1-6'])
+
+    def test_pending_snapshots_are_never_expired(self):
+        """Only completed snapshots are expired or counted."""
+        snapshots = make_snapshots('vol-2', [0, 6], state='pending') + \
+            make_snapshots('vol-2', [12, 18])
+        expired = EC2SnapshotRetention(keep_last=1).\
+            get_expired_snapshots(snapshots, NOW)
+        self.assertEqual(get_ids(expired), ['snap-vol-2-18'])
+
+
+class StubEC2Session():
+    """EC2 session stub serving fixed snapshots and images."""
+
+    def __init__(self, index, image_snapshot_ids=()):
+        """Initialize the stub with {volume_id: snapshots}."""
+        self.index = index
+        self.image_snapshot_ids = set(image_snapshot_ids)
+
+    def get_snapshot_index(self, volume_ids):
+        """Get the snapshots of volumes (all volumes if None)."""
+        return {volume_id: list(snapshots)
+                for volume_id, snapshots in self.index.items()
+                if volume_ids is None or volume_id in volume_ids}
+
+    def get_volume_snapshots(self, instance_ids=None, project_name=None):
+        """Get the snapshots of the volumes (not of the copies)."""
+        for volume_id, snapshots in self.index.items():
+            if volume_id != EC2SnapshotManager.UNKNOWN_VOLUME_ID:
+                yield None, EC2VolumeRecord({'VolumeId': volume_id}), \
+                    list(snapshots)
+
+    def get_image_snapshot_ids(self):
+        """Get the ids of the snapshots backing images."""
+        return self.image_snapshot_ids
+
+
+class EC2SnapshotPruningPlanTest(unittest.TestCase):
+    """EC2SnapshotManager.plan_snapshot_pruning unit tests."""
+
+    def setUp(self):
+        """Create the snapshots of two volumes and copied snapshots."""
+        self.index = {
+            'vol-1': make_snapshots('vol-1', [1, 2, 3]),
+            'vol-2': make_snapshots('vol-2', [1, 2]),
+            EC2SnapshotManager.UNKNOWN_VOLUME_ID:
+                make_snapshots(EC2SnapshotManager.UNKNOWN_VOLUME_ID,
+                               [1, 2, 3])}
+        self.retention = EC2SnapshotRetention(keep_last=1)
+
+    def plan(self, image_snapshot_ids=(), all_snapshots=False):
+        """Get the ids of the expired snapshots and the total count."""
+        expired, total = EC2SnapshotManager(
+            StubEC2Session(self.index, image_snapshot_ids)).\
+            plan_snapshot_pruning(self.retention,
+                                  all_snapshots=all_snapshots)
+        return get_ids(expired), total
+
+    def test_volume_snapshots(self):
+        """Snapshots are expired volume by volume."""
+        self.assertEqual(self.plan(),
+                         (['snap-vol-1-2', 'snap-vol-1-3',
+                           'snap-vol-2-2'], 5))
+
+    def test_copied_snapshots_are_never_expired(self):
+        """Snapshots without a volume are left out of all snapshots."""
+        self.assertEqual(self.plan(all_snapshots=True),
+                         (['snap-vol-1-2', 'snap-vol-1-3',
+                           'snap-vol-2-2'], 5))
+
+    def test_image_snapshots_are_never_expired(self):
+        """Snapshots backing images are neither expired nor counted."""
+        self.assertEqual(self.plan(['snap-vol-1-1', 'snap-vol-2-2'],
+                                   all_snapshots=True),
+                         (['snap-vol-1-3'], 3))
+
+
+class EC2SnapshotPruningTest(MotoTestCase):
+    """EC2SnapshotManager.prune_volume_snapshots unit tests."""
+
+    def setUp(self):
+        """Create an instance and an unattached volume with snapshots."""
+        super().setUp()
+        self.ec2_client = self.get_client('ec2')
+        image_id = self.ec2_client.describe_images(
+            Owners=['amazon'])['Images'][0]['ImageId']
+        instance = self.ec2_client.run_instances(
+            ImageId=image_id, MinCount=1, MaxCount=1)['Instances'][0]
+        self.instance_id = instance['InstanceId']
+        self.volume_id = instance['BlockDeviceMappings'][0]['Ebs']['VolumeId']
+        self.other_volume_id = self.ec2_client.create_volume(
+            Size=1, AvailabilityZone='us-east-1a')['VolumeId']
+        for volume_id in (self.volume_id, self.volume_id,
+                          self.volume_id, self.other_volume_id,
+                          self.other_volume_id):
+            self.ec2_client.create_snapshot(VolumeId=volume_id)
+        self.snapshot_manager = \
+            EC2SnapshotManager(EC2SessionManager(self.session))
+
+    def get_snapshot_count(self, volume_id):
+        """Get the number of snapshots of a volume."""
+        return len(self.ec2_client.describe_snapshots(
+            Filters=[{'Name': 'volume-id',
+                      'Values': [volume_id]}])['Snapshots'])
+
+    def prune(self, **kwargs):
+        """Prune the snapshots, returns (aok, status, printed snapshots)."""
+        printed = []
+        statuses = []
+        aok, status = self.snapshot_manager.prune_volume_snapshots(
+            pfunc=printed.append, sfunc=statuses.append, **kwargs)
+        return aok, status or statuses[-1], printed
+
+    def test_dry_run(self):
+        """Dry runs report the expired snapshots and delete nothing."""
+        aok, status, printed = self.prune(instance_ids=self.instance_id,
+                                          keep_last=1, dry_run=True)
+        self.assertTrue(aok)
+        self.assertEqual(status, '2 of 3 snapshots would be deleted')
+        self.assertEqual({snapshot.volume_id for snapshot in printed},
+                         {self.volume_id})
+        self.assertEqual(self.get_snapshot_count(self.volume_id), 3)
+
+    def test_prune_selected_instances(self):
+        """Only the snapshots of the selected instance volumes are pruned."""
+        aok, _, printed = self.prune(instance_ids=self.instance_id,
+                                     keep_last=1)
+        self.assertTrue(aok)
+        self.assertEqual(len(printed), 2)
+        self.assertEqual(self.get_snapshot_count(self.volume_id), 1)
+        self.assertEqual(self.get_snapshot_count(self.other_volume_id), 2)
+
+    def test_invalid_requests(self):
+        """Policies without keep rules and scoped all snapshots fail."""
+        self.assertFalse(self.prune(max_age=1)[0])
+        self.assertFalse(self.prune(all_snapshots=True,
+                                    instance_ids=self.instance_id,
+                                    keep_last=1)[0])
+        self.assertEqual(self.get_snapshot_count(self.volume_id), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
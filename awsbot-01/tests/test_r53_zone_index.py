@@ -0,0 +1,110 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Route 53 hosted zone index unit tests."""
+
+import unittest
+
+try:
+    from awsbot.r53_domain import R53DomainManager
+    from awsbot.r53_session import R53SessionManager
+    from awsbot.r53_zone_index import R53HostedZoneIndex
+except ImportError:
+    from r53_domain import R53DomainManager
+    from r53_session import R53SessionManager
+    from r53_zone_index import R53HostedZoneIndex
+
+from tests.moto_session import MotoTestCase
+
+
+def make_zone(zone_id, name, private_zone=False):
+    """Make a 'ListHostedZones' zone."""
+    return {'Id': zone_id, 'Name': name,
+            'Config': {'PrivateZone': private_zone}}
+
+
+class R53HostedZoneIndexTest(unittest.TestCase):
+    """R53HostedZoneIndex unit tests."""
+
+    def setUp(self):
+        """Create the index."""
+        self.index = R53HostedZoneIndex([
+            make_zone('Z1', 'example.com.'),
+            make_zone('Z2', 'sub.example.com.'),
+            make_zone('Z3', 'sub.example.com.', private_zone=True),
+            make_zone('Z4', 'internal.example.com.', private_zone=True),
+            make_zone('Z5', 'example.org.')])
+
+    def find(self, domain_name, private_zone=None):
+        """Get the id of the zone found for domain_name."""
+        zone = self.index.find(domain_name, private_zone)
+        return zone['Id'] if zone else None
+
+    def test_longest_match(self):
+        """The zone with the longest matching name is found."""
+        self.assertEqual(self.find('example.com'), 'Z1')
+        self.assertEqual(self.find('www.example.com.'), 'Z1')
+        self.assertEqual(self.find('a.b.sub.example.com'), 'Z2')
+        self.assertEqual(self.find('WWW.Example.ORG'), 'Z5')
+        self.assertIsNone(self.find('example.net'))
+        self.assertIsNone(self.find('com'))
+        self.assertIsNone(self.find('notexample.com'))
+
+    def test_visibility(self):
+        """Public and private zones are selected on request."""
+        self.assertEqual(self.find('www.sub.example.com', True), 'Z3')
+        self.assertEqual(self.find('www.sub.example.com', False), 'Z2')
+        self.assertEqual(self.find('db.internal.example.com'), 'Z4')
+        self.assertEqual(self.find('db.internal.example.com', False), 'Z1')
+        self.assertIsNone(self.find('example.org', True))
+
+    def test_add_replaces_same_zone(self):
+        """Zones are indexed once by id."""
+        self.assertEqual(len(self.index), 5)
+        self.index.add(make_zone('Z1', 'example.com.'))
+        self.index.add(make_zone('Z6', 'example.com.'))
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(sorted(zone['Id'] for zone in
+                                self.index.get_zones()),
+                         ['Z1', 'Z2', 'Z3', 'Z4', 'Z5', 'Z6'])
+
+
+class R53DomainManagerTest(MotoTestCase):
+    """R53DomainManager hosted zone lookup unit tests."""
+
+    def setUp(self):
+        """Create the hosted zones."""
+        super().setUp()
+        r53_client = self.get_client('route53')
+        for index, name in enumerate(('example.com', 'sub.example.com',
+                                      'example.org')):
+            r53_client.create_hosted_zone(Name=name,
+                                          CallerReference=str(index))
+        self.domain_manager = \
+            R53DomainManager(R53SessionManager(self.session))
+        self.api_calls.clear()
+
+    def test_zones_are_listed_once(self):
+        """Lookups share one listing of the hosted zones."""
+        for domain_name, zone_name in (('www.example.com', 'example.com.'),
+                                       ('a.sub.example.com',
+                                        'sub.example.com.'),
+                                       ('example.org', 'example.org.')):
+            self.assertEqual(self.domain_manager.
+                             find_hosted_zone(domain_name)['Name'],
+                             zone_name)
+        self.assertIsNone(self.domain_manager.find_hosted_zone('example.net'))
+        self.assertEqual(self.api_calls, {'ListHostedZones': 1})
+
+    def test_created_zones_are_indexed(self):
+        """Created zones are found without listing the zones again."""
+        self.domain_manager.find_hosted_zone('example.com')
+        self.domain_manager.create_hosted_zone('example.net')
+        self.assertEqual(self.domain_manager.
+                         find_hosted_zone('www.example.net')['Name'],
+                         'example.net.')
+        self.assertEqual(self.api_calls['ListHostedZones'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""S3 bucket sync unit tests."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+try:
+    from awsbot.s3_bucket import S3BucketManager
+    from awsbot.s3_region import S3RegionConfig
+    from awsbot.s3_session import S3SessionManager
+except ImportError:
+    from s3_bucket import S3BucketManager
+    from s3_region import S3RegionConfig
+    from s3_session import S3SessionManager
+
+from tests.moto_session import MotoTestCase
+
+
+class S3BucketSyncTest(MotoTestCase):
+    """S3BucketManager.sync_fs_to_bucket unit tests."""
+
+    BUCKET_NAME = 'awsbot-test-site'
+    FILES = {'index.txt': 'index',
+             'docs/a.txt': 'a',
+             'docs/b.txt': 'b' * 4096}
+
+    def setUp(self):
+        """Create the bucket and the fs tree to sync."""
+        super().setUp()
+        self.session.set_s3_region_config(
+            S3RegionConfig('resources/config/s3_region.csv'))
+        self.s3_client = self.get_client('s3')
+        self.s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+        self.bucket_manager = S3BucketManager(S3SessionManager(self.session))
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name)
+        for rel_path, content in self.FILES.items():
+            self.write_file(rel_path, content)
+
+    def write_file(self, rel_path, content):
+        """Write a file of the fs tree."""
+        path = self.root.joinpath(rel_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def get_objects(self):
+        """Get the {key: content} of the bucket objects."""
+        return {meta['Key']: self.s3_client.get_object(
+            Bucket=self.BUCKET_NAME,
+            Key=meta['Key'])['Body'].read().decode()
+                for meta in self.s3_client.list_objects_v2(
+                    Bucket=self.BUCKET_NAME).get('Contents', [])}
+
+    @staticmethod
+    def unreadable_dir(dir_name):
+        """Make the directories named dir_name unreadable to the walker."""
+        scandir = os.scandir
+
+        def failing_scandir(path):
+            if os.path.basename(path) == dir_name:
+                raise PermissionError(13, 'Permission denied', path)
+            return scandir(path)
+
+        return mock.patch('os.scandir', failing_scandir)
+
+    def sync(self, **kwargs):
+        """Sync the fs tree, returns (url, err, status messages)."""
+        statuses = []
+        kwargs.setdefault('concurrency', 4)
+        url, err = self.bucket_manager.sync_fs_to_bucket(
+            self.root, self.BUCKET_NAME, False, sfunc=statuses.append,
+            **kwargs)
+        return url, err, statuses
+
+    def test_sync(self):
+        """All the files are uploaded to their relative path keys."""
+        url, err, statuses = self.sync()
+        self.assertIsNone(err)
+        self.assertIn(self.BUCKET_NAME, url)
+        self.assertTrue(statuses[-1].startswith('Uploaded 3 of 3 files'))
+        self.assertEqual(self.get_objects(), self.FILES)
+
+    def test_only_changed_files_are_uploaded(self):
+        """Files whose digest matches their object etag are skipped."""
+        self.sync()
+        self.write_file('docs/a.txt', 'changed')
+        _, err, statuses = self.sync(concurrency=1)
+        self.assertIsNone(err)
+        self.assertTrue(statuses[-1].startswith('Uploaded 1 of 3 files'))
+        self.assertEqual(self.get_objects(),
+                         dict(self.FILES, **{'docs/a.txt': 'changed'}))
+
+    def test_prefix_and_filters(self):
+        """Files are synced under the prefix, through the filters."""
+        _, err, _ = self.sync(prefix='/site/', exclude=['docs/b*'])
+        self.assertIsNone(err)
+        self.assertEqual(self.get_objects(),
+                         {'site/index.txt': 'index', 'site/docs/a.txt': 'a'})
+
+    def test_dry_run(self):
+        """Dry runs report what would be uploaded, and upload nothing."""
+        _, err, statuses = self.sync(dry_run=True)
+        self.assertIsNone(err)
+        self.assertEqual(statuses[-1], 'Would upload 3 of 3 files (0.00 MB)')
+        self.assertFalse([status for status in statuses
+                          if 'files/s' in status])
+        self.assertEqual(len([status for status in statuses
+                              if status.startswith('(dry run) upload')]), 3)
+        self.assertEqual(self.get_objects(), {})
+
+    def test_delete_stale_objects(self):
+        """Objects of removed files are deleted, filtered ones are kept."""
+        for key in ('stale.txt', 'docs/stale.txt', 'skip/kept.txt',
+                    '.hidden', 'other/kept.txt'):
+            self.s3_client.put_object(Bucket=self.BUCKET_NAME, Key=key,
+                                      Body=b'old')
+
+        _, err, statuses = self.sync(delete=True, dry_run=True,
+                                     exclude=['skip', 'other/*'])
+        self.assertIsNone(err)
+        self.assertEqual(statuses[-1],
+                         '(dry run) 2 objects would be deleted')
+        self.assertEqual(len(self.get_objects()), 5)
+
+        _, err, statuses = self.sync(delete=True,
+                                     exclude=['skip', 'other/*'])
+        self.assertIsNone(err)
+        self.assertEqual(statuses[-1], 'Deleted 2 of 2 stale objects')
+        self.assertEqual(sorted(self.get_objects()),
+                         ['.hidden', 'docs/a.txt', 'docs/b.txt',
+                          'index.txt', 'other/kept.txt', 'skip/kept.txt'])
+
+    def test_no_delete_after_walk_errors(self):
+        """Stale objects are kept if the fs tree could not be read."""
+        self.s3_client.put_object(Bucket=self.BUCKET_NAME,
+                                  Key='docs/a.txt', Body=b'a')
+        with self.unreadable_dir('docs'):
+            _, err, statuses = self.sync(delete=True)
+        self.assertEqual(err, '1 fs tree read errors')
+        self.assertIn('Stale objects not deleted : the fs tree could not ' +
+                      'be fully read', statuses)
+        self.assertIn('docs/a.txt', self.get_objects())
+
+    def test_manifest(self):
+        """Unchanged files are not re-hashed with a manifest."""
+        manifest_path = self.root.parent.joinpath('manifest.sqlite3')
+        self.sync(use_manifest=True, manifest_path=manifest_path)
+        _, err, statuses = self.sync(use_manifest=True,
+                                     manifest_path=manifest_path)
+        self.assertIsNone(err)
+        self.assertIn('Manifest : 0 cached, 3 hashed', statuses)
+        _, err, statuses = self.sync(use_manifest=True,
+                                     manifest_path=manifest_path)
+        self.assertIn('Manifest : 3 cached, 0 hashed', statuses)
+
+    def test_manifest_is_not_pruned_after_walk_errors(self):
+        """Entries of the subtrees that could not be read are kept."""
+        manifest_path = self.root.parent.joinpath('manifest.sqlite3')
+        self.sync()
+        self.sync(use_manifest=True, manifest_path=manifest_path)
+        with self.unreadable_dir('docs'):
+            _, err, statuses = self.sync(use_manifest=True,
+                                         manifest_path=manifest_path)
+        self.assertEqual(err, '1 fs tree read errors')
+        self.assertIn('Manifest : 1 cached, 0 hashed', statuses)
+
+        _, err, statuses = self.sync(use_manifest=True,
+                                     manifest_path=manifest_path)
+        self.assertIsNone(err)
+        self.assertIn('Manifest : 3 cached, 0 hashed', statuses)
+
+    def test_invalid_sync(self):
+        """Missing buckets or directories and bad concurrency fail."""
+        _, err = self.bucket_manager.sync_fs_to_bucket(
+            self.root, 'awsbot-missing-bucket', False)
+        self.assertIn('Bucket Doesnot Exist', err)
+        self.assertIn('Invalid concurrency', self.sync(concurrency=0)[1])
+        _, err = self.bucket_manager.sync_fs_to_bucket(
+            self.root.joinpath('missing'), self.BUCKET_NAME, False)
+        self.assertIn('Not a readable directory', err)
+        self.assertEqual(self.get_objects(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""S3 sync manifest unit tests."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+try:
+    from awsbot.s3_manifest import S3SyncManifest
+    from awsbot import util
+except ImportError:
+    from s3_manifest import S3SyncManifest
+    import util
+
+
+class S3SyncManifestTest(unittest.TestCase):
+    """S3SyncManifest unit tests."""
+
+    CHUNK_SIZE = 1024
+
+    def setUp(self):
+        """Create the synced tree and the manifest path."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name, 'site')
+        self.root.mkdir()
+        self.manifest_path = Path(tmp_dir.name, 'manifest.sqlite3')
+        for name in ('a.txt', 'b.txt'):
+            self.root.joinpath(name).write_text(name * 1000)
+
+    def open_manifest(self):
+        """Open the manifest."""
+        manifest = S3SyncManifest(self.root, self.manifest_path)
+        self.assertEqual(manifest.open(), (True, None))
+        return manifest
+
+    def hash_files(self, manifest, names=('a.txt', 'b.txt')):
+        """Get the {name: digest} of files, through the manifest."""
+        digests = {}
+        for name in names:
+            digest, err = manifest.md5digest(self.root.joinpath(name),
+                                             name, self.CHUNK_SIZE)
+            self.assertIsNone(err)
+            digests[name] = digest
+        return digests
+
+    def test_default_path_is_outside_the_tree(self):
+        """Manifests are kept per bucket and root, out of the tree."""
+        manifest = S3SyncManifest(self.root, bucket_name='bucket')
+        self.assertNotIn(self.root, manifest.get_manifest_path().parents)
+        self.assertTrue(manifest.get_manifest_path().name.
+                        startswith('bucket-'))
+        self.assertNotEqual(
+            manifest.get_manifest_path(),
+            S3SyncManifest(self.root, bucket_name='other').
+            get_manifest_path())
+
+    def test_unchanged_files_are_not_hashed(self):
+        """Digests are cached until the file changes."""
+        manifest = self.open_manifest()
+        digests = self.hash_files(manifest)
+        self.assertEqual(digests['a.txt'], util.md5digest(
+            self.root.joinpath('a.txt'), self.CHUNK_SIZE)[0])
+        manifest.close()
+
+        manifest = self.open_manifest()
+        self.assertEqual(self.hash_files(manifest), digests)
+        self.assertEqual((manifest.hit_count, manifest.miss_count), (2, 0))
+
+        path = self.root.joinpath('a.txt')
+        path.write_text('changed')
+        os.utime(path, ns=(0, 0))
+        digest, _ = manifest.md5digest(path, 'a.txt', self.CHUNK_SIZE)
+        self.assertEqual(digest, util.md5digest(path, self.CHUNK_SIZE)[0])
+        self.assertEqual(manifest.miss_count, 1)
+        manifest.close()
+
+    def test_chunk_size_change_rehashes(self):
+        """Digests of another chunk size are not reused."""
+        manifest = self.open_manifest()
+        self.hash_files(manifest)
+        digest, _ = manifest.md5digest(self.root.joinpath('a.txt'),
+                                       'a.txt', 2 * self.CHUNK_SIZE)
+        self.assertEqual(digest, util.md5digest(self.root.joinpath('a.txt'),
+                                                2 * self.CHUNK_SIZE)[0])
+        self.assertEqual(manifest.hit_count, 0)
+        manifest.close()
+
+    def test_prune(self):
+        """Entries not looked up are only removed when pruning."""
+        manifest = self.open_manifest()
+        self.hash_files(manifest)
+        manifest.close()
+
+        manifest = self.open_manifest()
+        self.hash_files(manifest, ['a.txt'])
+        manifest.close(prune=False)
+
+        manifest = self.open_manifest()
+        self.hash_files(manifest, ['b.txt'])
+        self.assertEqual(manifest.hit_count, 1)
+        manifest.close(prune=True)
+
+        manifest = self.open_manifest()
+        self.hash_files(manifest)
+        self.assertEqual((manifest.hit_count, manifest.miss_count), (1, 1))
+        manifest.close()
+
+    def test_missing_file(self):
+        """Missing files are errors, not exceptions."""
+        manifest = self.open_manifest()
+        digest, err = manifest.md5digest(self.root.joinpath('missing'),
+                                         'missing', self.CHUNK_SIZE)
+        self.assertIsNone(digest)
+        self.assertTrue(err)
+        manifest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
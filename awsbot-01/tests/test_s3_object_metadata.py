@@ -0,0 +1,131 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""S3 object metadata and bucket listing unit tests."""
+
+import hashlib
+import unittest
+
+try:
+    from awsbot.s3_metadata import S3ObjectMetadata
+    from awsbot.s3_session import S3SessionManager
+except ImportError:
+    from s3_metadata import S3ObjectMetadata
+    from s3_session import S3SessionManager
+
+from tests.moto_session import MotoTestCase
+
+
+class S3ObjectMetadataTest(unittest.TestCase):
+    """S3ObjectMetadata unit tests."""
+
+    ETAG = hashlib.md5(b'awsbot').hexdigest()
+
+    def test_etag_encoding(self):
+        """Md5 etags are stored as bytes and returned unquoted."""
+        for etag in (self.ETAG, f'{self.ETAG}-12'):
+            encoded = S3ObjectMetadata.encode_etag(f'"{etag}"')
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(S3ObjectMetadata.decode_etag(encoded), etag)
+
+    def test_other_etags_are_kept(self):
+        """Etags that are not md5 digests are kept as strings."""
+        for etag in ('not-an-md5', self.ETAG + '-x', self.ETAG + '-99999'):
+            self.assertEqual(S3ObjectMetadata.decode_etag(
+                S3ObjectMetadata.encode_etag(etag)), etag)
+
+    def test_map(self):
+        """Keys map to their (last) etag."""
+        metadata = S3ObjectMetadata()
+        metadata.update([('a/b/c.txt', f'"{self.ETAG}"'),
+                         ('a/b/d.txt', '"other"'),
+                         ('top.txt', f'"{self.ETAG}-2"')])
+        metadata.add('a/b/d.txt', f'"{self.ETAG}"')
+
+        self.assertEqual(len(metadata), 3)
+        self.assertEqual(sorted(metadata),
+                         ['a/b/c.txt', 'a/b/d.txt', 'top.txt'])
+        self.assertEqual(metadata.get('a/b/d.txt'), self.ETAG)
+        self.assertEqual(metadata.get('top.txt'), f'{self.ETAG}-2')
+        self.assertIn('a/b/c.txt', metadata)
+        self.assertNotIn('a/b/c', metadata)
+        self.assertIsNone(metadata.get('missing'))
+
+
+class S3ObjectListingTest(MotoTestCase):
+    """S3SessionManager.get_s3_object_metadata unit tests."""
+
+    BUCKET_NAME = 'awsbot-test-bucket'
+
+    def setUp(self):
+        """Create the bucket."""
+        super().setUp()
+        self.s3_session = S3SessionManager(self.session)
+        self.s3_client = self.get_client('s3')
+        self.s3_client.create_bucket(Bucket=self.BUCKET_NAME)
+
+    def put_objects(self, keys):
+        """Put objects named after their key, returns {key: etag}."""
+        etags = {}
+        for key in keys:
+            response = self.s3_client.put_object(Bucket=self.BUCKET_NAME,
+                                                 Key=key, Body=key.encode())
+            etags[key] = response['ETag'].strip('"')
+        return etags
+
+    def list_objects(self, **kwargs):
+        """List the bucket, returns ({key: etag}, listing call count)."""
+        self.api_calls.clear()
+        metadata, err = self.s3_session.\
+            get_s3_object_metadata(self.BUCKET_NAME, **kwargs)
+        self.assertIsNone(err)
+        return {key: metadata.get(key) for key in metadata}, \
+            self.api_calls.get('ListObjectsV2', 0)
+
+    def test_small_bucket_is_listed_with_one_call(self):
+        """A listing that fits a page is not split, whatever the prefixes."""
+        etags = self.put_objects(f'dir-{index:03}/file' for index in
+                                 range(300))
+        objects, call_count = self.list_objects(concurrency=8)
+        self.assertEqual(objects, etags)
+        self.assertEqual(call_count, 1)
+
+    def test_partitioned_listing_is_complete(self):
+        """Split listings return every key once, at most concurrency ranges.
+
+        keys equal to a range bound (a common prefix) must be listed.
+        """
+        keys = [f'dir-{index:02}/' for index in range(0, 24, 3)] + \
+            [f'dir-{index:02}/sub-{sub}/file-{file:02}'
+             for index in range(24) for sub in range(2)
+             for file in range(24)] + ['top-file']
+        etags = self.put_objects(keys)
+
+        for concurrency in (1, 2, 4, 16):
+            objects, call_count = self.list_objects(concurrency=concurrency)
+            self.assertEqual(objects, etags)
+            # the first page, one common prefix listing per level
+            # entry (at most 24 + 48) and the (2 page) ranges.
+            self.assertLessEqual(call_count, 1 + 24 + 48 + 2 * concurrency)
+
+    def test_prefixed_listing(self):
+        """Only the keys starting with prefix are listed."""
+        etags = self.put_objects(f'a/dir-{index:02}/file-{file:02}'
+                                 for index in range(30)
+                                 for file in range(35))
+        etags.update(self.put_objects(f'b/file-{file:02}'
+                                      for file in range(30)))
+        objects, _ = self.list_objects(prefix='a/', concurrency=4)
+        self.assertEqual(objects, {key: etag for key, etag in etags.items()
+                                   if key.startswith('a/')})
+
+    def test_missing_bucket(self):
+        """Listing a missing bucket is an error, not an exception."""
+        metadata, err = self.s3_session.\
+            get_s3_object_metadata('awsbot-missing-bucket', concurrency=4)
+        self.assertIsNone(metadata)
+        self.assertIn('NoSuchBucket', err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Session manager unit tests."""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import boto3
+from botocore.config import Config
+
+try:
+    from awsbot.session import SessionManager
+except ImportError:
+    from session import SessionManager
+
+
+def make_session():
+    """Make a session manager (no aws call is made)."""
+    session = SessionManager(profile_name=None)
+    session.session = boto3.Session(aws_access_key_id='awsbot-test',
+                                    aws_secret_access_key='awsbot-test',
+                                    region_name='us-east-1')
+    return session
+
+
+class SessionCacheTest(unittest.TestCase):
+    """SessionManager client and resource cache unit tests."""
+
+    def setUp(self):
+        """Create the session."""
+        self.session = make_session()
+
+    def test_clients_are_shared(self):
+        """Clients are created once per service, region and config."""
+        client = self.session.get_client('s3')
+        self.assertIs(self.session.get_client('s3'), client)
+        self.assertIs(self.session.get_client('s3', 'us-east-1'), client)
+        self.assertIsNot(self.session.get_client('s3', 'eu-west-1'), client)
+        self.assertIsNot(self.session.get_client('ec2'), client)
+
+        other_threads = []
+        thread = threading.Thread(target=lambda: other_threads.append(
+            self.session.get_client('s3')))
+        thread.start()
+        thread.join()
+        self.assertIs(other_threads[0], client)
+
+    def test_configured_clients(self):
+        """Clients of equal configs are shared."""
+        client = self.session.get_client(
+            's3', config=Config(max_pool_connections=50))
+        self.assertIs(self.session.get_client(
+            's3', config=Config(max_pool_connections=50)), client)
+        self.assertIsNot(self.session.get_client(
+            's3', config=Config(max_pool_connections=60)), client)
+        self.assertIsNot(self.session.get_client('s3'), client)
+        self.assertEqual(client.meta.config.max_pool_connections, 50)
+
+    def test_resources_are_per_thread(self):
+        """Resources are cached per thread."""
+        resource = self.session.get_resource('ec2')
+        self.assertIs(self.session.get_resource('ec2'), resource)
+
+        other_threads = []
+        thread = threading.Thread(target=lambda: other_threads.append(
+            self.session.get_resource('ec2')))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_threads[0], resource)
+
+    def test_invalidate_cache(self):
+        """Invalidated clients and resources are created again."""
+        s3_client = self.session.get_client('s3')
+        ec2_client = self.session.get_client('ec2')
+        resource = self.session.get_resource('ec2')
+
+        self.session.invalidate_cache('s3')
+        self.assertIsNot(self.session.get_client('s3'), s3_client)
+        self.assertIs(self.session.get_client('ec2'), ec2_client)
+        self.assertIsNot(self.session.get_resource('ec2'), resource)
+
+        self.session.invalidate_cache()
+        self.assertIsNot(self.session.get_client('ec2'), ec2_client)
+
+
+class SessionBotocoreConfigTest(unittest.TestCase):
+    """SessionManager botocore config unit tests."""
+
+    def setUp(self):
+        """Create the session."""
+        self.session = make_session()
+
+    def test_create_botocore_config(self):
+        """Only the options that are set are configured."""
+        self.assertIsNone(SessionManager.create_botocore_config())
+        config = SessionManager.create_botocore_config(
+            max_pool_connections=32, retry_mode='adaptive', max_attempts=5,
+            read_timeout=0)
+        self.assertEqual(config.max_pool_connections, 32)
+        self.assertEqual(config.retries, {'mode': 'adaptive',
+                                          'total_max_attempts': 5})
+        self.assertEqual(config.read_timeout, 0)
+
+    def test_load_botocore_options(self):
+        """Config files hold a json object of known options."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            def load(content):
+                path = os.path.join(tmp_dir, 'config.json')
+                with open(path, 'w') as file:
+                    file.write(content)
+                return SessionManager.load_botocore_options('test', path)
+
+            self.assertEqual(load(json.dumps({'max_attempts': 3})),
+                             ({'max_attempts': 3}, None))
+            self.assertIn('unknown options', load('{"retries": 3}')[1])
+            self.assertIn('expected a json object', load('[1]')[1])
+            self.assertIn('Cannot load', load('{')[1])
+            self.assertIn('Cannot load', SessionManager.load_botocore_options(
+                'test', os.path.join(tmp_dir, 'missing.json'))[1])
+
+    def test_session_config_is_applied(self):
+        """The session config is merged into every client config."""
+        client = self.session.get_client('s3')
+        self.session.set_botocore_config(Config(retries={'mode': 'standard'},
+                                                max_pool_connections=20))
+        self.assertEqual(self.session.get_max_pool_connections(), 20)
+        self.assertIsNone(self.session.get_pool_config(20))
+        self.assertEqual(self.session.get_pool_config(40).
+                         max_pool_connections, 40)
+
+        configured = self.session.get_client('s3')
+        self.assertIsNot(configured, client)
+        self.assertEqual(configured.meta.config.max_pool_connections, 20)
+        pooled = self.session.get_client(
+            's3', config=self.session.get_pool_config(40))
+        self.assertEqual(pooled.meta.config.max_pool_connections, 40)
+        self.assertEqual(pooled.meta.config.retries['mode'], 'standard')
+
+
+if __name__ == '__main__':
+    unittest.main()
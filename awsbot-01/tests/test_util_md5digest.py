@@ -0,0 +1,84 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""util md5 digest unit tests."""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from awsbot import util
+except ImportError:
+    import util
+
+
+class MD5DigestTest(unittest.TestCase):
+    """util md5 digest unit tests."""
+
+    CHUNK_SIZE = 1024
+
+    def setUp(self):
+        """Create the directory of the files to hash."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the files."""
+        self.tmp_dir.cleanup()
+
+    def make_file(self, size):
+        """Create a file of 'size' pseudo random bytes."""
+        path = os.path.join(self.tmp_dir.name, f'file-{size}')
+        with open(path, 'wb') as file:
+            file.write(bytes((index * 7) % 251 for index in range(size)))
+        return path
+
+    def test_get_md5_chunks(self):
+        """Files are cut in chunksize chunks, the last one being shorter."""
+        self.assertEqual(util.get_md5_chunks(10), [(0, 10)])
+        self.assertEqual(util.get_md5_chunks(10, 10), [(0, 10)])
+        self.assertEqual(util.get_md5_chunks(25, 10),
+                         [(0, 10), (10, 10), (20, 5)])
+        self.assertEqual(util.get_md5_chunks(0, 10), [(0, 0)])
+
+    def test_join_md5_digests(self):
+        """Multi chunk digests are the s3 multipart etag."""
+        first = hashlib.md5(b'a').digest()
+        second = hashlib.md5(b'b').digest()
+        self.assertEqual(util.join_md5_digests([first]), first.hex())
+        self.assertEqual(util.join_md5_digests([first, second]),
+                         hashlib.md5(first + second).hexdigest() + '-2')
+
+    def test_concurrent_matches_md5digest(self):
+        """md5digest_concurrent returns the md5digest digests."""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for size in (0, 1, self.CHUNK_SIZE, self.CHUNK_SIZE + 1,
+                         5 * self.CHUNK_SIZE, 5 * self.CHUNK_SIZE + 3):
+                path = self.make_file(size)
+                for chunk_size in (None, self.CHUNK_SIZE):
+                    expected = util.md5digest(path, chunk_size)
+                    self.assertEqual(
+                        util.md5digest_concurrent(path, chunk_size), expected)
+                    self.assertEqual(
+                        util.md5digest_concurrent(path, chunk_size,
+                                                  executor), expected)
+
+    def test_multipart_etag(self):
+        """Multi chunk files get a '<md5>-<n>' digest."""
+        digest, err = util.md5digest_concurrent(
+            self.make_file(3 * self.CHUNK_SIZE), self.CHUNK_SIZE)
+        self.assertIsNone(err)
+        self.assertTrue(digest.endswith('-3'))
+
+    def test_missing_file(self):
+        """A missing file is an error, not an exception."""
+        digest, err = util.md5digest_concurrent(
+            os.path.join(self.tmp_dir.name, 'missing'), self.CHUNK_SIZE)
+        self.assertIsNone(digest)
+        self.assertTrue(err)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""util.scan_fs_tree unit tests."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+try:
+    from awsbot import util
+except ImportError:
+    import util
+
+
+class ScanFsTreeTest(unittest.TestCase):
+    """util.scan_fs_tree unit tests."""
+
+    def setUp(self):
+        """Create the tree to scan.
+
+        root/
+          a.txt, .hidden.txt, .dir/b.txt, skip/c.txt,
+          real/d.txt, real/sub/e.txt, real/sub/up -> real,
+          alias1 -> real, alias2 -> real,
+          file-link.txt -> a.txt, dangling.txt -> missing.txt
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        for rel_path in ('a.txt', '.hidden.txt', '.dir/b.txt',
+                         'skip/c.txt', 'real/d.txt', 'real/sub/e.txt'):
+            path = self.root.joinpath(rel_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel_path)
+        self.root.joinpath('real/sub/up').symlink_to('..')
+        self.root.joinpath('alias1').symlink_to('real')
+        self.root.joinpath('alias2').symlink_to('real')
+        self.root.joinpath('file-link.txt').symlink_to('a.txt')
+        self.root.joinpath('dangling.txt').symlink_to('missing.txt')
+
+    def tearDown(self):
+        """Remove the tree."""
+        self.tmp_dir.cleanup()
+
+    def scan(self, **kwargs):
+        """Get the sorted relative paths found by scan_fs_tree."""
+        return sorted(rel_path for _, rel_path, _ in
+                      util.scan_fs_tree(self.root, **kwargs))
+
+    def test_follow_links(self):
+        """Directories reached through several links are walked each time."""
+        self.assertEqual(self.scan(),
+                         ['.dir/b.txt', 'a.txt',
+                          'alias1/d.txt', 'alias1/sub/e.txt',
+                          'alias2/d.txt', 'alias2/sub/e.txt',
+                          'file-link.txt',
+                          'real/d.txt', 'real/sub/e.txt', 'skip/c.txt'])
+
+    def test_link_loops_are_cut(self):
+        """Links back to an ancestor directory are not descended into."""
+        self.assertFalse([rel_path for rel_path in self.scan()
+                          if '/up/' in rel_path])
+
+    def test_files_links_only(self):
+        """Links to directories are ignored with symlinks='files'."""
+        self.assertEqual(self.scan(symlinks='files'),
+                         ['.dir/b.txt', 'a.txt', 'file-link.txt',
+                          'real/d.txt', 'real/sub/e.txt', 'skip/c.txt'])
+
+    def test_skip_links(self):
+        """All links are ignored with symlinks='skip'."""
+        self.assertEqual(self.scan(symlinks='skip'),
+                         ['.dir/b.txt', 'a.txt',
+                          'real/d.txt', 'real/sub/e.txt', 'skip/c.txt'])
+
+    def test_invalid_symlinks_policy(self):
+        """An unknown symlinks policy is rejected."""
+        with self.assertRaises(ValueError):
+            self.scan(symlinks='loop')
+
+    def test_hidden_files_and_dirs(self):
+        """Hidden files and directories are filtered on request."""
+        rel_paths = self.scan(symlinks='skip', ignore_hidden_files=False,
+                              ignore_hidden_dirs=True)
+        self.assertIn('.hidden.txt', rel_paths)
+        self.assertNotIn('.dir/b.txt', rel_paths)
+
+    def test_include_exclude(self):
+        """Excluded directories are pruned, include filters the files."""
+        self.assertEqual(self.scan(symlinks='skip', exclude=['skip']),
+                         ['.dir/b.txt', 'a.txt',
+                          'real/d.txt', 'real/sub/e.txt'])
+        self.assertEqual(self.scan(symlinks='skip', include=['real/*']),
+                         ['real/d.txt', 'real/sub/e.txt'])
+
+    def test_dangling_links_are_not_errors(self):
+        """Dangling links are skipped without calling onerror."""
+        errors = []
+        self.assertNotIn('dangling.txt', self.scan(onerror=errors.append))
+        self.assertEqual(errors, [])
+
+    def test_scan_errors_are_reported(self):
+        """Directories that cannot be scanned are reported to onerror."""
+        scandir = os.scandir
+
+        def failing_scandir(path):
+            if os.path.basename(path) == 'skip':
+                raise PermissionError(13, 'Permission denied', path)
+            return scandir(path)
+
+        errors = []
+        with mock.patch('os.scandir', failing_scandir):
+            rel_paths = self.scan(symlinks='skip', onerror=errors.append)
+
+        self.assertNotIn('skip/c.txt', rel_paths)
+        self.assertEqual([error.filename for error in errors],
+                         [str(self.root.joinpath('skip'))])
+
+    def test_relative_root(self):
+        """Relative roots are resolved against the current directory."""
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        try:
+            found = list(util.scan_fs_tree('real', symlinks='skip'))
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(sorted(rel_path for _, rel_path, _ in found),
+                         ['d.txt', 'sub/e.txt'])
+        self.assertTrue(all(os.path.isabs(path) for path, _, _ in found))
+
+
+if __name__ == '__main__':
+    unittest.main()
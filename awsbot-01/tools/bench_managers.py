@@ -0,0 +1,503 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Benchmark the awsbot managers against a local aws stand-in.
+
+seeds an in-process aws stand-in (moto, pip install moto) with a
+synthetic inventory of configurable size, runs the hot paths of every
+manager against it and reports, for each operation, the number of aws
+api calls made (by operation name), the wall time and the peak python
+memory used (tracemalloc). no network access or aws account is
+needed, so regressions in the number of api calls or in the time
+spent in awsbot itself can be caught before they reach a real
+account.
+
+the wall time includes the time moto takes to answer the calls, so
+compare the call counts and the times between runs of the same
+inventory only. tracemalloc slows python code down, use '--no-memory'
+for the most accurate wall times.
+
+usage: python tools/bench_managers.py [--instances N] [--objects N]
+                                      [--security-groups N] ...
+                                      [--only NAME ...] [--json FILE]
+
+e.g. python tools/bench_managers.py --instances 10000 --objects 1000000
+        --security-groups 5000 --only ec2 s3.list
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+REGION_NAME = 'us-east-1'
+PROJECT_NAME = 'awsbot-bench'
+BUCKET_NAME = 'awsbot-bench'
+ZONE_NAME = 'awsbot-bench.com'
+
+
+class ApiCallCounter():
+    """Count the aws api calls made by the clients of a boto3 session."""
+
+    def __init__(self, boto3_session):
+        """Initialize the api call counter class."""
+        self.calls = Counter()
+        boto3_session.events.register('before-call', self.count)
+
+    def count(self, event_name, **kwargs):
+        """Count an api call ('before-call.<service>.<operation>')."""
+        self.calls[event_name.split('.', 1)[1]] += 1
+
+    def reset(self):
+        """Reset the api call counts."""
+        self.calls = Counter()
+
+    def get_total(self):
+        """Get the total number of api calls."""
+        return sum(self.calls.values())
+
+
+class Inventory():
+    """Synthetic aws inventory used by the benchmarks."""
+
+    def __init__(self, session, args):
+        """Initialize the inventory class."""
+        self.session = session
+        self.args = args
+        self.instance_ids = []
+        self.group_names = []
+        self.zone_ids = []
+        self.distribution_domains = []
+        self.local_tree = None
+
+    def get_client(self, name):
+        """Get a client of the benchmark session."""
+        return self.session.get_client(name)
+
+    @staticmethod
+    def run_concurrently(func, items, concurrency=16):
+        """Call func on every item using a thread pool."""
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(func, items))
+
+    def seed_ec2(self):
+        """Create instances (with volumes and snapshots) and groups."""
+        ec2_client = self.get_client('ec2')
+        image_ids = [image['ImageId'] for image in
+                     ec2_client.describe_images(
+                         Owners=['amazon'])['Images'][:self.args.images]]
+
+        remaining = self.args.instances
+        while remaining > 0:
+            count = min(remaining, 500)
+            image_id = image_ids[remaining % len(image_ids)]
+            reservation = ec2_client.run_instances(
+                ImageId=image_id, InstanceType='t2.micro',
+                MinCount=count, MaxCount=count,
+                TagSpecifications=[{
+                    'ResourceType': 'instance',
+                    'Tags': [{'Key': 'Project', 'Value': PROJECT_NAME}]}])
+            self.instance_ids.extend(inst['InstanceId']
+                                     for inst in reservation['Instances'])
+            remaining -= count
+
+        volume_ids = [volume['VolumeId'] for volume in
+                      ec2_client.describe_volumes()['Volumes']]
+        self.run_concurrently(
+            lambda volume_id: ec2_client.create_snapshot(
+                VolumeId=volume_id, Description='awsbot bench'),
+            volume_ids[:self.args.snapshots])
+
+        def create_group(index):
+            group_name = f'awsbot-bench-{index:05d}'
+            group_id = ec2_client.create_security_group(
+                GroupName=group_name,
+                Description='awsbot bench')['GroupId']
+            ec2_client.authorize_security_group_ingress(
+                GroupId=group_id,
+                IpPermissions=[{
+                    'IpProtocol': 'tcp',
+                    'FromPort': 8000 + rule_index,
+                    'ToPort': 8000 + rule_index,
+                    'IpRanges': [{'CidrIp': f'10.{index % 256}.'
+                                            f'{rule_index % 256}.0/24'}]}
+                               for rule_index in
+                               range(self.args.rules_per_group)])
+            return group_name
+
+        self.group_names = self.run_concurrently(
+            create_group, range(self.args.security_groups))
+
+    def seed_s3(self):
+        """Create a bucket with objects and a local tree to sync."""
+        s3_client = self.get_client('s3')
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+
+        self.run_concurrently(
+            lambda index: s3_client.put_object(
+                Bucket=BUCKET_NAME, Key=self.get_object_key(index),
+                Body=b'<html></html>'),
+            range(self.args.objects), concurrency=32)
+
+        self.local_tree = tempfile.TemporaryDirectory(prefix='awsbot-bench-')
+        for index in range(self.args.files):
+            path = Path(self.local_tree.name).\
+                joinpath(self.get_object_key(index))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(f'<html>{index}</html>'.encode('utf-8'))
+
+    @staticmethod
+    def get_object_key(index):
+        """Get the key of a synthetic s3 object (or local file)."""
+        return f'dir{index % 100:03d}/sub{index % 7}/page{index:07d}.html'
+
+    def seed_r53(self):
+        """Create hosted zones and the record sets of one zone."""
+        r53_client = self.get_client('route53')
+
+        def create_zone(index):
+            name = ZONE_NAME if index == 0 else f'zone{index:05d}.{ZONE_NAME}'
+            return r53_client.create_hosted_zone(
+                Name=name, CallerReference=name)['HostedZone']['Id']
+
+        self.zone_ids = self.run_concurrently(create_zone,
+                                              range(self.args.hosted_zones))
+
+        for start in range(0, self.args.record_sets, 100):
+            r53_client.change_resource_record_sets(
+                HostedZoneId=self.zone_ids[0],
+                ChangeBatch={'Changes': [{
+                    'Action': 'CREATE',
+                    'ResourceRecordSet': {
+                        'Name': f'host{index:06d}.{ZONE_NAME}',
+                        'Type': 'A', 'TTL': 300,
+                        'ResourceRecords': [{'Value': '10.0.0.1'}]}}
+                    for index in range(start,
+                                       min(start + 100,
+                                           self.args.record_sets))]})
+
+    def seed_acm(self):
+        """Request certificates."""
+        acm_client = self.get_client('acm')
+        self.run_concurrently(
+            lambda index: acm_client.request_certificate(
+                DomainName=f'site{index:05d}.{ZONE_NAME}',
+                SubjectAlternativeNames=[f'*.site{index:05d}.{ZONE_NAME}']),
+            range(self.args.certificates))
+
+    def seed_cf(self):
+        """Create distributions."""
+        try:
+            from awsbot.cf_session import CFSessionManager
+        except ImportError:
+            from cf_session import CFSessionManager
+
+        cf_client = self.get_client('cloudfront')
+
+        def create_distribution(index):
+            domain_name = f'cdn{index:05d}.{ZONE_NAME}'
+            cf_client.create_distribution(
+                DistributionConfig=CFSessionManager.
+                create_cf_distribution_config(
+                    domain_name, f'{BUCKET_NAME}.s3.amazonaws.com',
+                    'arn:aws:acm:us-east-1:123456789012:certificate/bench'))
+            return domain_name
+
+        self.distribution_domains = self.run_concurrently(
+            create_distribution, range(self.args.distributions))
+
+    def seed_cw(self):
+        """Create metric alarms."""
+        cw_client = self.get_client('cloudwatch')
+        self.run_concurrently(
+            lambda index: cw_client.put_metric_alarm(
+                AlarmName=f'awsbot-bench-{index:05d}',
+                MetricName='CPUUtilization', Namespace='AWS/EC2',
+                Statistic='Average', Period=300, EvaluationPeriods=1,
+                Threshold=80.0,
+                ComparisonOperator='GreaterThanThreshold',
+                AlarmActions=['arn:aws:sns:us-east-1:123456789012:bench']),
+            range(self.args.alarms))
+
+    def seed(self, groups):
+        """Seed the inventory used by the benchmark groups."""
+        seed_funcs = {'ec2': self.seed_ec2, 'sg': self.seed_ec2,
+                      's3': self.seed_s3, 'r53': self.seed_r53,
+                      'acm': self.seed_acm, 'cf': self.seed_cf,
+                      'cw': self.seed_cw}
+        for seed_func in dict.fromkeys(seed_funcs[group]
+                                       for group in groups):
+            start_time = time.perf_counter()
+            seed_func()
+            print(f'{seed_func.__doc__[:-1].lower()} : ' +
+                  f'{time.perf_counter() - start_time:.1f}s',
+                  file=sys.stderr)
+
+
+def get_benchmarks(session, inventory):
+    """Get the (name, func) benchmarks in the order they are run.
+
+    each func returns the (aok, err) status of the manager call.
+    """
+    try:
+        from awsbot.s3_session import S3SessionManager
+        from awsbot.s3_bucket import S3BucketManager
+        from awsbot.ec2_session import EC2SessionManager
+        from awsbot.ec2_instance import EC2InstanceManager
+        from awsbot.ec2_volume import EC2VolumeManager
+        from awsbot.ec2_snapshot import EC2SnapshotManager
+        from awsbot.ec2_security_group import EC2SecurityGroupManager
+        from awsbot.r53_session import R53SessionManager
+        from awsbot.r53_domain import R53DomainManager
+        from awsbot.acm_session import ACMSessionManager
+        from awsbot.acm_cert import ACMCertificateManager
+        from awsbot.cf_session import CFSessionManager
+        from awsbot.cf_distribution import CFDistributionManager
+        from awsbot.cw_session import CWSessionManager
+        from awsbot.cw_alarm import CWAlarmManager
+    except ImportError:
+        from s3_session import S3SessionManager
+        from s3_bucket import S3BucketManager
+        from ec2_session import EC2SessionManager
+        from ec2_instance import EC2InstanceManager
+        from ec2_volume import EC2VolumeManager
+        from ec2_snapshot import EC2SnapshotManager
+        from ec2_security_group import EC2SecurityGroupManager
+        from r53_session import R53SessionManager
+        from r53_domain import R53DomainManager
+        from acm_session import ACMSessionManager
+        from acm_cert import ACMCertificateManager
+        from cf_session import CFSessionManager
+        from cf_distribution import CFDistributionManager
+        from cw_session import CWSessionManager
+        from cw_alarm import CWAlarmManager
+
+    s3_session = S3SessionManager(session)
+    ec2_session = EC2SessionManager(session)
+    s3_manager = S3BucketManager(s3_session)
+    instance_manager = EC2InstanceManager(ec2_session)
+    sg_manager = EC2SecurityGroupManager(ec2_session)
+    r53_manager = R53DomainManager(R53SessionManager(session))
+    acm_manager = ACMCertificateManager(ACMSessionManager(session))
+    cf_manager = CFDistributionManager(CFSessionManager(session))
+    cw_manager = CWAlarmManager(CWSessionManager(session))
+
+    def get_object_metadata():
+        metadata, err = s3_session.\
+            get_s3_object_metadata(BUCKET_NAME, concurrency=8)
+        return metadata is not None, err
+
+    def sync_bucket():
+        return s3_manager.sync_fs_to_bucket(inventory.local_tree.name,
+                                            BUCKET_NAME, False,
+                                            concurrency=8)
+
+    def find_group_names():
+        groups, err = sg_manager.validate_and_get_security_groups(
+            inventory.group_names[-10:])
+        return groups is not None, err
+
+    def find_zone():
+        return r53_manager.find_hosted_zone(f'www.{ZONE_NAME}') is not None, \
+            None
+
+    def find_cert():
+        _, err = acm_manager.find_cert(f'www.site00000.{ZONE_NAME}')
+        return True, err
+
+    def find_distribution():
+        if not inventory.distribution_domains:
+            return True, None
+        dist, err = cf_manager.\
+            find_distribution(inventory.distribution_domains[-1])
+        return dist is not None, err
+
+    def list_distributions():
+        err = cf_manager.list_all_distributions()
+        return err is None, err
+
+    return (
+        ('s3.list-buckets', s3_manager.list_buckets),
+        ('s3.list-bucket-objects',
+         lambda: s3_manager.list_bucket_objects(BUCKET_NAME)),
+        ('s3.object-metadata', get_object_metadata),
+        ('s3.sync-bucket', sync_bucket),
+        ('s3.sync-bucket-unchanged', sync_bucket),
+        ('ec2.list-instances',
+         lambda: instance_manager.list_instances(project_name=PROJECT_NAME)),
+        ('ec2.list-volumes',
+         lambda: EC2VolumeManager(ec2_session).
+         list_volumes(project_name=PROJECT_NAME)),
+        ('ec2.list-snapshots',
+         lambda: EC2SnapshotManager(ec2_session).
+         list_volume_snapshots(None, PROJECT_NAME, True)),
+        ('ec2.stop-instances',
+         lambda: instance_manager.stop_instances(project_name=PROJECT_NAME)),
+        ('ec2.start-instances',
+         lambda: instance_manager.start_instances(project_name=PROJECT_NAME)),
+        ('ec2.terminate-instances',
+         lambda: instance_manager.
+         terminate_instances(project_name=PROJECT_NAME)),
+        ('sg.list-security-groups',
+         lambda: sg_manager.list_security_groups(long_version=True)),
+        ('sg.validate-security-groups', find_group_names),
+        ('r53.list-hosted-zones', r53_manager.list_hosted_zones),
+        ('r53.list-record-sets',
+         lambda: r53_manager.list_resource_record_sets(inventory.zone_ids[0],
+                                                       'A')),
+        ('r53.find-hosted-zone', find_zone),
+        ('acm.list-certs', acm_manager.list_certs),
+        ('acm.find-cert', find_cert),
+        ('cf.list-distributions', list_distributions),
+        ('cf.find-distribution', find_distribution),
+        ('cw.list-metric-alarms',
+         lambda: cw_manager.list_metric_alarms(long_version=True)))
+
+
+def run_benchmark(name, func, counter, trace_memory):
+    """Run a benchmark, return its result dict.
+
+    the output of the manager is discarded (but still produced).
+    """
+    counter.reset()
+    if trace_memory:
+        tracemalloc.start()
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        aok, err = func()
+    wall_time = time.perf_counter() - start_time
+
+    peak_memory = None
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'name': name,
+            'aok': bool(aok),
+            'err': err if isinstance(err, str) else None,
+            'api_calls': counter.get_total(),
+            'api_calls_by_operation': dict(counter.calls.most_common()),
+            'wall_time': wall_time,
+            'peak_memory': peak_memory}
+
+
+def print_result(result):
+    """Print a benchmark result."""
+    peak_memory = 'n/a' if result['peak_memory'] is None else \
+        f'{result["peak_memory"] / (1024 * 1024):.1f}'
+    top_calls = ', '.join(f'{operation}={count}'
+                          for operation, count in
+                          list(result['api_calls_by_operation'].
+                               items())[:3])
+    print(f'{result["name"]:<28} {result["api_calls"]:>9} ' +
+          f'{result["wall_time"]:>9.3f} {peak_memory:>9}  {top_calls}')
+    if not result['aok']:
+        print(f'{"":<28} FAILED : {result["err"]}')
+
+
+def get_args():
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sizes = (('instances', 200, 'ec2 instances'),
+             ('images', 5, 'distinct amis used by the instances'),
+             ('snapshots', 50, 'volumes with a snapshot'),
+             ('security-groups', 200, 'security groups'),
+             ('rules-per-group', 2, 'ingress rules per security group'),
+             ('objects', 2000, 'objects in the s3 bucket'),
+             ('files', 500, 'files in the local tree synced to s3'),
+             ('hosted-zones', 50, 'route 53 hosted zones'),
+             ('record-sets', 500, 'record sets in one hosted zone'),
+             ('certificates', 50, 'acm certificates'),
+             ('distributions', 20, 'cloud front distributions'),
+             ('alarms', 200, 'cloudwatch metric alarms'))
+    for option, default, label in sizes:
+        parser.add_argument(f'--{option}', type=int, default=default,
+                            help=f'number of {label} (default {default})')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='run the benchmarks whose name starts with '
+                             'any of these prefixes (e.g. ec2 s3.list)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='do not trace the peak memory')
+    parser.add_argument('--json', default=None,
+                        help='write the results to this json file')
+    return parser.parse_args()
+
+
+def main():
+    """Run the manager benchmarks."""
+    args = get_args()
+
+    try:
+        import boto3
+        from moto import mock_aws
+    except ImportError as import_error:
+        sys.exit(f'bench_managers requires moto : {import_error}')
+
+    try:
+        from awsbot.session import SessionManager
+        from awsbot.s3_region import S3RegionConfig
+    except ImportError:
+        from session import SessionManager
+        from s3_region import S3RegionConfig
+
+    # never talk to a real account, whatever the environment says.
+    os.environ.update({'AWS_ACCESS_KEY_ID': 'awsbot-bench',
+                       'AWS_SECRET_ACCESS_KEY': 'awsbot-bench',
+                       'AWS_SESSION_TOKEN': 'awsbot-bench',
+                       'AWS_DEFAULT_REGION': REGION_NAME})
+    os.environ.pop('AWS_PROFILE', None)
+
+    # the managers load their resources relative to the package dir.
+    json_path = Path(args.json).resolve() if args.json else None
+    os.chdir(PACKAGE_ROOT.joinpath('awsbot'))
+
+    with mock_aws():
+        session = SessionManager(profile_name=None)
+        session.session = boto3.Session(region_name=REGION_NAME)
+        session.set_s3_region_config(
+            S3RegionConfig('resources/config/s3_region.csv'))
+        counter = ApiCallCounter(session.get_session())
+
+        inventory = Inventory(session, args)
+        benchmarks = [(name, func) for name, func in
+                      get_benchmarks(session, inventory)
+                      if not args.only or
+                      name.startswith(tuple(args.only))]
+        inventory.seed({name.split('.')[0] for name, _ in benchmarks})
+
+        print(f'{"operation":<28} {"api calls":>9} {"wall s":>9} ' +
+              f'{"peak MB":>9}  top api calls')
+        results = []
+        for name, func in benchmarks:
+            result = run_benchmark(name, func, counter, not args.no_memory)
+            print_result(result)
+            results.append(result)
+
+    if json_path:
+        with open(json_path, 'w') as json_file:
+            json.dump({'sizes': {name: value for name, value in
+                                 vars(args).items()
+                                 if isinstance(value, int) and
+                                 not isinstance(value, bool)},
+                       'results': results}, json_file, indent=2)
+
+    if inventory.local_tree:
+        inventory.local_tree.cleanup()
+
+    return 0 if all(result['aok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
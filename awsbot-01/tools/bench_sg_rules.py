@@ -0,0 +1,211 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Benchmark the security group rule matcher on synthetic rule sets.
+
+generates a synthetic set of security groups ('DescribeSecurityGroups'
+results) and of delete criteria, then times the compiled rule matcher
+(EC2SecurityGroupRuleMatcher) against a reference linear matcher that
+re-parses every cidr and scans every criterion for each rule entry.
+both must select the same entries. everything runs in memory, no aws
+account (or aws stand-in) is needed.
+
+usage: python tools/bench_sg_rules.py [--groups N] [--rules N]
+                                      [--cidrs N] [--criteria N]
+                                      [--seed N] [--json FILE]
+
+the defaults run in a few seconds, the reference linear matcher
+taking most of the time (it grows with groups x criteria). larger
+sizes are best run with --no-linear, e.g.
+python tools/bench_sg_rules.py --groups 5000 --criteria 1000 --no-linear
+"""
+
+import argparse
+import ipaddress
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_ROOT))
+
+PROTOCOLS = ('tcp', 'udp', 'icmp', '-1')
+PORTS = (22, 80, 443, 3306, 5432, 6379, 8080)
+
+
+def get_random_cidr(rand, version=4):
+    """Get a random cidr block."""
+    if version == 4:
+        prefixlen = rand.choice((8, 16, 24, 28, 32))
+        address = rand.getrandbits(32)
+        return str(ipaddress.ip_network((address, prefixlen), strict=False))
+
+    prefixlen = rand.choice((32, 48, 56, 64, 128))
+    address = rand.getrandbits(128)
+    return str(ipaddress.ip_network((address, prefixlen), strict=False))
+
+
+def get_security_groups(rand, args):
+    """Get a synthetic list of security groups."""
+    group_ids = [f'sg-{index:017x}' for index in range(args.groups)]
+    security_groups = []
+    for group_id in group_ids:
+        rules = []
+        for _ in range(args.rules):
+            protocol = rand.choice(PROTOCOLS)
+            rule = {'IpProtocol': protocol,
+                    'IpRanges': [{'CidrIp': get_random_cidr(rand)}
+                                 for _ in range(args.cidrs)],
+                    'Ipv6Ranges': [{'CidrIpv6': get_random_cidr(rand, 6)}
+                                   for _ in range(args.cidrs // 2)],
+                    'UserIdGroupPairs': [{'GroupId': rand.choice(group_ids)}],
+                    'PrefixListIds': []}
+            if protocol == 'icmp':
+                rule['FromPort'], rule['ToPort'] = 8, -1
+            elif protocol != '-1':
+                rule['FromPort'] = rule['ToPort'] = rand.choice(PORTS)
+            rules.append(rule)
+        security_groups.append({'GroupId': group_id, 'IpPermissions': rules})
+
+    return security_groups
+
+
+def get_criteria(rand, args, security_groups):
+    """Get synthetic delete criteria."""
+    return {'ip_protocols': ['tcp', '-1'],
+            'from_port': None,
+            'to_port': None,
+            'ipv4_cidrs': [get_random_cidr(rand)
+                           for _ in range(args.criteria)],
+            'ipv6_cidrs': [get_random_cidr(rand, 6)
+                           for _ in range(args.criteria)],
+            'group_ids': [security_group['GroupId'] for security_group in
+                          rand.sample(security_groups,
+                                      min(args.criteria,
+                                          len(security_groups)))]}
+
+
+def match_linear(rule, criteria):
+    """Match a rule (reference implementation, linear scans)."""
+    if rule['IpProtocol'] not in criteria['ip_protocols']:
+        return None
+
+    def contained(cidr, cidrs):
+        network = ipaddress.ip_network(cidr, strict=False)
+        for criterion in cidrs:
+            criterion = ipaddress.ip_network(criterion, strict=False)
+            if network.version == criterion.version and \
+                    network.subnet_of(criterion):
+                return True
+        return False
+
+    ipv4_ranges = [ip_range for ip_range in rule['IpRanges']
+                   if contained(ip_range['CidrIp'], criteria['ipv4_cidrs'])]
+    ipv6_ranges = [ip_range for ip_range in rule['Ipv6Ranges']
+                   if contained(ip_range['CidrIpv6'],
+                                criteria['ipv6_cidrs'])]
+    group_pairs = [group_pair for group_pair in rule['UserIdGroupPairs']
+                   if group_pair['GroupId'] in criteria['group_ids']]
+    if not (ipv4_ranges or ipv6_ranges or group_pairs):
+        return None
+
+    return dict(rule, IpRanges=ipv4_ranges, Ipv6Ranges=ipv6_ranges,
+                UserIdGroupPairs=group_pairs, PrefixListIds=[])
+
+
+def run_matcher(name, match, security_groups):
+    """Match all the rules of the security groups, return the result."""
+    start_time = time.perf_counter()
+    matched = [match(rule) for security_group in security_groups
+               for rule in security_group['IpPermissions']]
+    elapsed = time.perf_counter() - start_time
+    rule_count = len(matched)
+    matched = [rule for rule in matched if rule]
+    return {'name': name,
+            'rules': rule_count,
+            'matched_rules': len(matched),
+            'matched_entries': sum(len(rule['IpRanges']) +
+                                   len(rule['Ipv6Ranges']) +
+                                   len(rule['UserIdGroupPairs'])
+                                   for rule in matched),
+            'wall_s': round(elapsed, 4),
+            'rules_per_s': round(rule_count / max(elapsed, 1e-9))}, matched
+
+
+def get_args():
+    """Get the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--groups', type=int, default=200,
+                        help='number of security groups (default: 200)')
+    parser.add_argument('--rules', type=int, default=10,
+                        help='rules per security group (default: 10)')
+    parser.add_argument('--cidrs', type=int, default=4,
+                        help='ipv4 cidr blocks per rule (default: 4)')
+    parser.add_argument('--criteria', type=int, default=50,
+                        help='cidr blocks and groups in the criteria '
+                             '(default: 50)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed (default: 0)')
+    parser.add_argument('--no-linear', action='store_true',
+                        help='do not run the reference linear matcher')
+    parser.add_argument('--json', default=None,
+                        help='write the results to a json file')
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmark."""
+    from awsbot.ec2_security_group_rule_matcher import \
+        EC2SecurityGroupRuleMatcher
+
+    args = get_args()
+    rand = random.Random(args.seed)
+    security_groups = get_security_groups(rand, args)
+    criteria = get_criteria(rand, args, security_groups)
+
+    start_time = time.perf_counter()
+    matcher = EC2SecurityGroupRuleMatcher(**criteria)
+    compile_time = time.perf_counter() - start_time
+
+    results = []
+    compiled, compiled_rules = run_matcher('compiled', matcher.match,
+                                           security_groups)
+    compiled['compile_s'] = round(compile_time, 4)
+    results.append(compiled)
+
+    aok = True
+    if not args.no_linear:
+        linear_criteria = dict(criteria,
+                               group_ids=list(criteria['group_ids']))
+        linear, linear_rules = run_matcher(
+            'linear', lambda rule: match_linear(rule, linear_criteria),
+            security_groups)
+        results.append(linear)
+        aok = compiled_rules == linear_rules
+
+    print(f'{"matcher":<10} {"rules":>9} {"matched":>9} {"entries":>9} ' +
+          f'{"wall s":>9} {"rules/s":>11}')
+    for result in results:
+        print(f'{result["name"]:<10} {result["rules"]:>9} ' +
+              f'{result["matched_rules"]:>9} ' +
+              f'{result["matched_entries"]:>9} {result["wall_s"]:>9.3f} ' +
+              f'{result["rules_per_s"]:>11}')
+    print(f'compile time : {compile_time:.4f}s' +
+          ('' if args.no_linear else
+           f', same matches : {"yes" if aok else "NO"}'))
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'sizes': {name: value for name, value in
+                                 vars(args).items()
+                                 if isinstance(value, int) and
+                                 not isinstance(value, bool)},
+                       'results': results}, json_file, indent=2)
+
+    return 0 if aok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
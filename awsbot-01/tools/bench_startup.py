@@ -0,0 +1,91 @@
+#! /usr/bin/python
+# -*- coding:utf-8 -*-
+
+"""Measure the cold start time of the awsbot cli.
+
+runs each command line 'repeat' times in a fresh interpreter
+(python -m awsbot.awsbot ...) and reports the min, median and max
+wall time. '--importtime' also reports the slowest imports of the
+first command using 'python -X importtime'.
+
+usage: python tools/bench_startup.py [--repeat N] [--importtime]
+                                     [command line ...]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_COMMANDS = ('--help',
+                    's3 --help',
+                    'ec2 --help',
+                    'ec2 region list --help',
+                    'ec2 instance list --help')
+
+
+def run_command(args, python_args=()):
+    """Run awsbot in a fresh interpreter, return (seconds, stderr)."""
+    start_time = time.perf_counter()
+    proc = subprocess.run([sys.executable, *python_args,
+                           '-m', 'awsbot.awsbot', *args],
+                          cwd=PACKAGE_ROOT, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, check=False,
+                          universal_newlines=True)
+    return time.perf_counter() - start_time, proc.stderr
+
+
+def bench_command(command, repeat):
+    """Time a command line, return (min, median, max) in ms."""
+    timings = [run_command(command.split())[0] * 1000
+               for _ in range(repeat)]
+    return min(timings), statistics.median(timings), max(timings)
+
+
+def print_import_times(command, count=15):
+    """Print the slowest (cumulative) imports of a command line."""
+    _, stderr = run_command(command.split(), ('-X', 'importtime'))
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    print()
+    print(f'slowest imports : awsbot {command}')
+    for cumulative_us, self_us, name in sorted(imports)[-count:]:
+        print(f'{cumulative_us / 1000:9.1f} ms {self_us / 1000:9.1f} ms' +
+              f'  {name}')
+
+
+def main():
+    """Run the startup benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of runs per command line')
+    parser.add_argument('--importtime', action='store_true',
+                        help='report the slowest imports')
+    parser.add_argument('commands', nargs='*',
+                        help='awsbot command lines (quoted)')
+    args = parser.parse_args()
+
+    commands = args.commands or DEFAULT_COMMANDS
+
+    print(f'{"min":>9} {"median":>9} {"max":>9}  command ' +
+          f'({args.repeat} runs, python {sys.version.split()[0]})')
+    for command in commands:
+        min_ms, median_ms, max_ms = bench_command(command, args.repeat)
+        print(f'{min_ms:6.1f} ms {median_ms:6.1f} ms {max_ms:6.1f} ms' +
+              f'  awsbot {command}')
+
+    if args.importtime:
+        print_import_times(commands[0])
+
+
+if __name__ == '__main__':
+    main()